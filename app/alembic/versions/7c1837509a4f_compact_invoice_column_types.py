@@ -0,0 +1,190 @@
+"""compact invoice column types
+
+Revision ID: 7c1837509a4f
+Revises: dbd630419e58
+Create Date: 2026-10-19 13:07:09.490348
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+import sqlmodel
+
+# revision identifiers, used by Alembic.
+revision: str = '7c1837509a4f'
+down_revision: Union[str, None] = 'dbd630419e58'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Data is converted in batches, each committed on its own, so large tables
+# are never locked by one huge UPDATE.
+BATCH_SIZE = 5000
+
+# Codes are the 1-based positions of app.models.InvoiceStatus / PaymentMode,
+# frozen here so the migration does not change with the application.
+STATUS_CODES = {
+    "Pending": 1,
+    "Paid": 2,
+    "Partially Paid": 3,
+    "Overdue": 4,
+    "Cancelled": 5,
+    "Refunded": 6,
+    "Void": 7,
+    "Draft": 8,
+}
+PAYMENT_MODE_CODES = {
+    "Cash": 1,
+    "Card": 2,
+    "Bank Transfer": 3,
+    "Online": 4,
+    "Cheque": 5,
+    "Other": 6,
+}
+
+INVOICE_TABLES = ["invoicecreate", "invoicearchive"]
+ITEM_TABLES = ["invoiceitems", "invoiceitemsarchive"]
+
+
+def _normalized(column: str) -> str:
+    return f"lower(trim(replace({column}, '_', ' ')))"
+
+
+def _to_code(column: str, codes: dict[str, int], unknown: str) -> str:
+    whens = " ".join(
+        f"WHEN '{name.lower()}' THEN {code}" for name, code in codes.items()
+    )
+    return (
+        f"CASE WHEN {column} IS NULL THEN NULL "
+        f"ELSE CASE {_normalized(column)} {whens} "
+        f"ELSE {unknown} END END"
+    )
+
+
+def _check_statuses() -> None:
+    """
+    Refuse to upgrade while an invoice has a status that is not in
+    STATUS_CODES: it has no code, and would lose its status.
+    """
+    conn = op.get_bind()
+    known = ", ".join(f"'{name.lower()}'" for name in STATUS_CODES)
+    unknown = {
+        table: conn.execute(
+            sa.text(
+                f"SELECT DISTINCT status FROM {table} WHERE status IS NOT NULL "
+                f"AND {_normalized('status')} NOT IN ({known})"
+            )
+        ).scalars().all()
+        for table in INVOICE_TABLES
+    }
+    unknown = {table: values for table, values in unknown.items() if values}
+    if unknown:
+        listed = "; ".join(
+            f"{table}: {', '.join(repr(value) for value in values)}"
+            for table, values in unknown.items()
+        )
+        raise RuntimeError(
+            f"Unknown invoice statuses ({listed}). Update them to one of "
+            f"{', '.join(STATUS_CODES)} and run the upgrade again."
+        )
+
+
+def _to_name(column: str, codes: dict[str, int]) -> str:
+    whens = " ".join(f"WHEN {code} THEN '{name}'" for name, code in codes.items())
+    return f"CASE {column} {whens} ELSE NULL END"
+
+
+def _convert(table: str, assignments: dict[str, str], pending: str) -> None:
+    """
+    Fill the new columns of `table` batch by batch until no row is left
+    where `pending` is NULL.
+    """
+    conn = op.get_bind()
+    values = ", ".join(f"{column} = {expr}" for column, expr in assignments.items())
+    statement = sa.text(
+        f"UPDATE {table} SET {values} WHERE id IN "
+        f"(SELECT id FROM {table} WHERE {pending} IS NULL LIMIT :batch_size)"
+    )
+    with op.get_context().autocommit_block():
+        while conn.execute(statement, {"batch_size": BATCH_SIZE}).rowcount:
+            pass
+
+
+def _swap(table: str, columns: dict[str, tuple[str, bool]]) -> None:
+    """
+    Replace each old column by its converted copy: {old: (new, nullable)}.
+    """
+    with op.batch_alter_table(table) as batch_op:
+        for old, (new, nullable) in columns.items():
+            batch_op.drop_column(old)
+            batch_op.alter_column(new, new_column_name=old, nullable=nullable)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    _check_statuses()
+    for table in INVOICE_TABLES:
+        op.add_column(table, sa.Column('total_cents', sa.BigInteger(), nullable=True))
+        op.add_column(table, sa.Column('status_code', sa.SmallInteger(), nullable=True))
+        op.add_column(table, sa.Column('payment_mode_code', sa.SmallInteger(), nullable=True))
+        _convert(
+            table,
+            {
+                "total_cents": "CAST(ROUND(total_price * 100) AS BIGINT)",
+                # _check_statuses made sure every status has a code
+                "status_code": _to_code("status", STATUS_CODES, "NULL"),
+                "payment_mode_code": _to_code(
+                    "payment_mode", PAYMENT_MODE_CODES, str(PAYMENT_MODE_CODES["Other"])
+                ),
+            },
+            pending="total_cents",
+        )
+        _swap(
+            table,
+            {
+                "total_price": ("total_cents", False),
+                "status": ("status_code", True),
+                "payment_mode": ("payment_mode_code", True),
+            },
+        )
+    for table in ITEM_TABLES:
+        op.add_column(table, sa.Column('total_cents', sa.BigInteger(), nullable=True))
+        _convert(
+            table,
+            {"total_cents": "CAST(ROUND(total_price * 100) AS BIGINT)"},
+            pending="total_cents",
+        )
+        _swap(table, {"total_price": ("total_cents", False)})
+    op.create_index('ix_invoicecreate_seller_status', 'invoicecreate', ['seller_id', 'status'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_invoicecreate_seller_status', table_name='invoicecreate')
+    for table in ITEM_TABLES:
+        op.add_column(table, sa.Column('total_float', sa.Float(), nullable=True))
+        _convert(table, {"total_float": "total_price / 100.0"}, pending="total_float")
+        _swap(table, {"total_price": ("total_float", False)})
+    for table in INVOICE_TABLES:
+        op.add_column(table, sa.Column('total_float', sa.Float(), nullable=True))
+        op.add_column(table, sa.Column('status_name', sqlmodel.sql.sqltypes.AutoString(), nullable=True))
+        op.add_column(table, sa.Column('payment_mode_name', sqlmodel.sql.sqltypes.AutoString(), nullable=True))
+        _convert(
+            table,
+            {
+                "total_float": "total_price / 100.0",
+                "status_name": _to_name("status", STATUS_CODES),
+                "payment_mode_name": _to_name("payment_mode", PAYMENT_MODE_CODES),
+            },
+            pending="total_float",
+        )
+        _swap(
+            table,
+            {
+                "total_price": ("total_float", False),
+                "status": ("status_name", True),
+                "payment_mode": ("payment_mode_name", True),
+            },
+        )
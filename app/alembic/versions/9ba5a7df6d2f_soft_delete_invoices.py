@@ -0,0 +1,51 @@
+"""soft delete invoices
+
+Revision ID: 9ba5a7df6d2f
+Revises: c038bd45c8cd
+Create Date: 2026-10-19 13:36:31.688789
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+import sqlmodel
+
+# revision identifiers, used by Alembic.
+revision: str = '9ba5a7df6d2f'
+down_revision: Union[str, None] = 'c038bd45c8cd'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# The listing indexes are rebuilt as partial indexes over live invoices.
+LISTING_INDEXES = {
+    'ix_invoicecreate_seller_created': ['seller_id', 'created_date', 'status', 'payment_mode', 'total_price'],
+    'ix_invoicecreate_seller_status': ['seller_id', 'status', 'created_date'],
+    'ix_invoicecreate_seller_payment': ['seller_id', 'payment_mode', 'created_date'],
+}
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('invoicecreate', sa.Column('deleted_at', sa.DateTime(), nullable=True))
+    op.create_index('ix_invoicecreate_deleted_at', 'invoicecreate', ['deleted_at'], unique=False, sqlite_where=sa.text('deleted_at IS NOT NULL'), postgresql_where=sa.text('deleted_at IS NOT NULL'))
+    for name, columns in LISTING_INDEXES.items():
+        op.drop_index(name, table_name='invoicecreate')
+        op.create_index(name, 'invoicecreate', columns, unique=False, sqlite_where=sa.text('deleted_at IS NULL'), postgresql_where=sa.text('deleted_at IS NULL'))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # tombstoned invoices would come back to life without the column
+    op.execute(
+        "DELETE FROM invoiceitems WHERE invoice_id IN "
+        "(SELECT id FROM invoicecreate WHERE deleted_at IS NOT NULL)"
+    )
+    op.execute("DELETE FROM invoicecreate WHERE deleted_at IS NOT NULL")
+    for name, columns in LISTING_INDEXES.items():
+        op.drop_index(name, table_name='invoicecreate')
+        op.create_index(name, 'invoicecreate', columns, unique=False)
+    op.drop_index('ix_invoicecreate_deleted_at', table_name='invoicecreate')
+    op.drop_column('invoicecreate', 'deleted_at')
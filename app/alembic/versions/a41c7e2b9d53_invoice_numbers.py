@@ -0,0 +1,37 @@
+"""invoice numbers
+
+Revision ID: a41c7e2b9d53
+Revises: 9ba5a7df6d2f
+Create Date: 2026-10-19 14:20:41.518302
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+import sqlmodel
+
+# revision identifiers, used by Alembic.
+revision: str = 'a41c7e2b9d53'
+down_revision: Union[str, None] = '9ba5a7df6d2f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # invoices created before keep a NULL number
+    op.add_column('invoicecreate', sa.Column('number', sqlmodel.sql.sqltypes.AutoString(length=32), nullable=True))
+    op.create_index('ix_invoicecreate_seller_number', 'invoicecreate', ['seller_id', 'number'], unique=True)
+    op.add_column('invoicearchive', sa.Column('number', sqlmodel.sql.sqltypes.AutoString(length=32), nullable=True))
+    op.create_index('ix_invoicearchive_seller_number', 'invoicearchive', ['seller_id', 'number'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_invoicearchive_seller_number', table_name='invoicearchive')
+    op.drop_column('invoicearchive', 'number')
+    op.drop_index('ix_invoicecreate_seller_number', table_name='invoicecreate')
+    op.drop_column('invoicecreate', 'number')
+    op.execute("DELETE FROM sellercounter WHERE name LIKE 'invoice_numbers:%'")
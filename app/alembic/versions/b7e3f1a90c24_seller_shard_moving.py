@@ -0,0 +1,31 @@
+"""seller shard moving flag
+
+Revision ID: b7e3f1a90c24
+Revises: e5d2a9c41f07
+Create Date: 2026-10-19 18:10:41.532907
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7e3f1a90c24'
+down_revision: Union[str, None] = 'e5d2a9c41f07'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column(
+        'sellershard',
+        sa.Column('moving', sa.Boolean(), nullable=False, server_default=sa.false()),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('sellershard', 'moving')
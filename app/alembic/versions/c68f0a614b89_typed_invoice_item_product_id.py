@@ -0,0 +1,114 @@
+"""typed invoice item product id
+
+Revision ID: c68f0a614b89
+Revises: 32d2055c4936
+Create Date: 2026-10-19 13:18:34.147475
+
+"""
+import uuid
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+import sqlmodel
+
+# revision identifiers, used by Alembic.
+revision: str = 'c68f0a614b89'
+down_revision: Union[str, None] = '32d2055c4936'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Rows are converted in batches of ids, each committed on its own, so large
+# tables are never locked by one huge UPDATE.
+BATCH_SIZE = 5000
+
+
+def _as_uuid(column: str, dialect: str) -> str:
+    """
+    SQL converting the old text product id, with or without dashes, to the
+    storage form of a UUID. Values that are not UUIDs become NULL.
+    """
+    if dialect == "postgresql":
+        return (
+            f"CASE WHEN {column} ~* '^[0-9a-f]{{8}}-?([0-9a-f]{{4}}-?){{3}}[0-9a-f]{{12}}$' "
+            f"THEN CAST({column} AS UUID) END"
+        )
+    hex_id = f"lower(replace({column}, '-', ''))"
+    return (
+        f"CASE WHEN length({hex_id}) = 32 AND {hex_id} NOT GLOB '*[^0-9a-f]*' "
+        f"THEN {hex_id} END"
+    )
+
+
+def _as_text(column: str, dialect: str) -> str:
+    if dialect == "postgresql":
+        return f"CAST({column} AS TEXT)"
+    return (
+        f"substr({column}, 1, 8) || '-' || substr({column}, 9, 4) || '-' || "
+        f"substr({column}, 13, 4) || '-' || substr({column}, 17, 4) || '-' || "
+        f"substr({column}, 21)"
+    )
+
+
+def _convert(table: str, column: str, expr: str) -> None:
+    """
+    Fill `column` of every row of `table` with `expr`, walking the primary
+    key in batches.
+    """
+    conn = op.get_bind()
+    select_ids = sa.text(
+        f"SELECT id FROM {table} WHERE id > :after ORDER BY id LIMIT :batch_size"
+    ).bindparams(sa.bindparam("after", type_=sa.Uuid())).columns(id=sa.Uuid())
+    statement = sa.text(
+        f"UPDATE {table} SET {column} = {expr} WHERE id IN :ids"
+    ).bindparams(sa.bindparam("ids", expanding=True, type_=sa.Uuid()))
+    after = uuid.UUID(int=0)
+    with op.get_context().autocommit_block():
+        while True:
+            ids = conn.execute(
+                select_ids, {"after": after, "batch_size": BATCH_SIZE}
+            ).scalars().all()
+            if not ids:
+                break
+            conn.execute(statement, {"ids": ids})
+            after = ids[-1]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    dialect = op.get_bind().dialect.name
+    for table in ["invoiceitems", "invoiceitemsarchive"]:
+        op.add_column(table, sa.Column('product_uuid', sa.Uuid(), nullable=True))
+        expr = _as_uuid("product_id", dialect)
+        if table == "invoiceitems":
+            # the column gets a real foreign key, drop ids of missing products
+            expr = f"(SELECT id FROM product WHERE product.id = {expr})"
+        _convert(table, "product_uuid", expr)
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.drop_column('product_id')
+            batch_op.alter_column('product_uuid', new_column_name='product_id')
+    with op.batch_alter_table('invoiceitems') as batch_op:
+        batch_op.create_foreign_key(
+            'fk_invoiceitems_product_id_product', 'product', ['product_id'], ['id']
+        )
+    op.create_index('ix_invoiceitems_product_invoice', 'invoiceitems', ['product_id', 'invoice_id'], unique=False)
+    op.create_index('ix_invoiceitemsarchive_product_invoice', 'invoiceitemsarchive', ['product_id', 'invoice_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    dialect = op.get_bind().dialect.name
+    op.drop_index('ix_invoiceitemsarchive_product_invoice', table_name='invoiceitemsarchive')
+    op.drop_index('ix_invoiceitems_product_invoice', table_name='invoiceitems')
+    # the text column goes back without its foreign key, which could only
+    # ever be created where types are not checked (SQLite)
+    for table in ["invoiceitems", "invoiceitemsarchive"]:
+        op.add_column(table, sa.Column('product_text', sqlmodel.sql.sqltypes.AutoString(), nullable=True))
+        _convert(table, "product_text", _as_text("product_id", dialect))
+        with op.batch_alter_table(table) as batch_op:
+            if table == "invoiceitems":
+                batch_op.drop_constraint('fk_invoiceitems_product_id_product', type_='foreignkey')
+            batch_op.drop_column('product_id')
+            batch_op.alter_column('product_text', new_column_name='product_id')
@@ -0,0 +1,29 @@
+"""export job lease
+
+Revision ID: e5d2a9c41f07
+Revises: a41c7e2b9d53
+Create Date: 2026-10-19 16:05:12.204117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5d2a9c41f07'
+down_revision: Union[str, None] = 'a41c7e2b9d53'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # running jobs get a lease on their next claim, once they have stalled
+    op.add_column('exportjob', sa.Column('lease', sa.Uuid(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('exportjob', 'lease')
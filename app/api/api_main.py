@@ -1,9 +1,11 @@
 from fastapi import APIRouter
 
-from app.api.routers import login, signup, users
+from app.api.routers import batch, events, login, signup, users
 
 
 api_routers = APIRouter()
 api_routers.include_router(login.router)
 api_routers.include_router(signup.router)
-api_routers.include_router(users.router)
\ No newline at end of file
+api_routers.include_router(users.router)
+api_routers.include_router(events.router)
+api_routers.include_router(batch.router)
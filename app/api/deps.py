@@ -1,23 +1,143 @@
-from typing import Annotated
-from fastapi import Depends, HTTPException, status
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Annotated, AsyncIterator, Callable, Iterator
+from fastapi import Depends, HTTPException, Request, status
+from fastapi.concurrency import run_in_threadpool
+from starlette.requests import HTTPConnection
+from sqlalchemy import Engine, event
 from sqlmodel import SQLModel, Session
 from app.models import CreateSeller
+from app.utils.limiter import QueueTimeout, get_limiter
 from app.utils.security import decode_access_token
+from app.utils.tracing import span
 from sqlalchemy.exc import SQLAlchemyError
 from uuid import UUID
 from jwt.exceptions import InvalidTokenError
 from fastapi.security import OAuth2PasswordBearer
-from app.db import engine
+from app.db import database
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl=f"/login/access-token")
+optional_oauth2_scheme = OAuth2PasswordBearer(
+    tokenUrl="/login/access-token", auto_error=False
+)
 
 
 def create_db_and_tables():
-    SQLModel.metadata.create_all(engine)
+    for engine in database.router.engines:
+        SQLModel.metadata.create_all(engine)
 
 
-def get_session():
-    with Session(engine) as session:
+class RequestSession(Session):
+    """
+    Session of a request. Like any session it only checks a connection out
+    of the pool on its first statement; `release` also gives it back once a
+    read is over, instead of holding it until the end of the request.
+    """
+
+    def release(self) -> None:
+        """
+        End a read-only transaction, keeping the loaded objects as they are.
+        A transaction that wrote is left to the caller to commit.
+        """
+        if not self.in_transaction() or self.info.get("wrote"):
+            return
+        if self.new or self.dirty or self.deleted:
+            return
+        expire_on_commit, self.expire_on_commit = self.expire_on_commit, False
+        try:
+            self.commit()
+        finally:
+            self.expire_on_commit = expire_on_commit
+
+
+@event.listens_for(RequestSession, "after_flush")
+def _wrote(session: Session, flush_context: object) -> None:
+    session.info["wrote"] = True
+
+
+@event.listens_for(RequestSession, "after_transaction_end")
+def _transaction_end(session: Session, transaction: object) -> None:
+    if not session.in_transaction():
+        session.info.pop("wrote", None)
+
+
+class BatchContext:
+    """
+    What the sub-requests of one `/batch` call share: the user resolved from
+    its token and one session per engine. A shared session is used by one
+    sub-request at a time, the others wait for it without holding a thread.
+    """
+
+    def __init__(self, user: CreateSeller | None) -> None:
+        self.user = user
+        self._sessions: dict[Engine, tuple[Session, asyncio.Lock]] = {}
+        self._owners: dict[Engine, asyncio.Task | None] = {}
+
+    @asynccontextmanager
+    async def session(self, engine: Engine) -> AsyncIterator[Session]:
+        if engine not in self._sessions:
+            self._sessions[engine] = (RequestSession(engine), asyncio.Lock())
+        session, lock = self._sessions[engine]
+        task = asyncio.current_task()
+        if self._owners.get(engine) is task:
+            # a sub-request depending on two sessions of the same engine
+            yield session
+            return
+        async with lock:
+            self._owners[engine] = task
+            try:
+                yield session
+            except Exception:
+                # leave the session clean for the next sub-request
+                await run_in_threadpool(session.rollback)
+                raise
+            finally:
+                self._owners[engine] = None
+
+    def close(self) -> None:
+        for session, _ in self._sessions.values():
+            session.close()
+
+
+def batch_context(request: Request) -> BatchContext | None:
+    return getattr(request.state, "batch", None)
+
+
+@asynccontextmanager
+async def _engine_session(
+    request: Request, engine: Engine, open_session: Callable[[], Session] | None = None
+) -> AsyncIterator[Session]:
+    batch = batch_context(request)
+    if batch is not None:
+        async with batch.session(engine) as shared:
+            yield shared
+        return
+    session = open_session() if open_session else RequestSession(engine)
+    try:
+        yield session
+    finally:
+        if session.in_transaction():
+            await run_in_threadpool(session.close)
+        else:
+            # nothing to give back to the pool, skip the thread hop
+            session.close()
+
+
+def _primary_session(request: Request) -> RequestSession:
+    """
+    The request's session on the primary database, opened on first use and
+    shared by the current user lookup and `SessionDep`.
+    """
+    session = getattr(request.state, "session", None)
+    if session is None:
+        session = request.state.session = RequestSession(database.engine)
+    return session
+
+
+async def get_session(request: Request) -> AsyncIterator[Session]:
+    async with _engine_session(
+        request, database.engine, lambda: _primary_session(request)
+    ) as session:
         yield session
 
 
@@ -25,9 +145,10 @@ SessionDep = Annotated[Session, Depends(get_session)]
 TokenDep = Annotated[str, Depends(oauth2_scheme)]
 
 
-def _get_current_user(
-    token: Annotated[str, Depends(oauth2_scheme)], session: SessionDep
-):
+def load_user(session: Session, token: str) -> CreateSeller:
+    """
+    Resolve a bearer token to its seller, raising 401 or 404 otherwise.
+    """
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -54,4 +175,96 @@ def _get_current_user(
         )
 
 
+def _get_current_user(request: Request, token: TokenDep) -> Iterator[CreateSeller]:
+    batch = batch_context(request)
+    if batch is not None and batch.user is not None:
+        yield batch.user
+        return
+    session = _primary_session(request)
+    try:
+        with span("current_user"):
+            user = load_user(session, token)
+            # the handler may never need the database again, or only later
+            session.release()
+        yield user
+    finally:
+        session.close()
+
+
 CurrentUser = Annotated[CreateSeller, Depends(_get_current_user)]
+
+
+async def seller_slot(request: Request, current_user: CurrentUser) -> AsyncIterator[None]:
+    """
+    Hold the current user's share of the limiter for the cost of the route,
+    waiting for its turn behind the seller's other expensive requests.
+    """
+    limiter = get_limiter()
+    route = request.scope.get("route")
+    cost = limiter.cost(getattr(route, "name", ""))
+    if not cost:
+        yield
+        return
+    try:
+        await limiter.acquire(current_user.id, cost)
+    except QueueTimeout:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many concurrent requests, retry later",
+            headers={"Retry-After": str(int(limiter.queue_seconds))},
+        )
+    try:
+        yield
+    finally:
+        limiter.release(current_user.id, cost)
+
+
+def connection_user(connection: HTTPConnection) -> CreateSeller:
+    """
+    Seller of a long-lived connection (event stream, WebSocket). Browsers
+    cannot set headers on those, so the token may also come in the `token`
+    query parameter.
+    """
+    scheme, _, token = connection.headers.get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        token = connection.query_params.get("token", "")
+    with Session(database.engine) as session:
+        return load_user(session, token)
+
+
+StreamUser = Annotated[CreateSeller, Depends(connection_user)]
+
+
+async def get_shard_session(
+    request: Request, current_user: CurrentUser
+) -> AsyncIterator[Session]:
+    """
+    Session on the shard holding the current user's products and invoices.
+    Writes are turned away while the seller is being moved to another shard.
+    """
+    router = database.router
+    if request.method not in ("GET", "HEAD") and router.is_moving(current_user.id):
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Your data is being moved, retry shortly",
+            headers={"Retry-After": str(max(int(router.directory_ttl), 1))},
+        )
+    engine = router.engine_for_seller(current_user.id)
+    async with _engine_session(request, engine) as session:
+        yield session
+
+
+def get_invoice_session(id: str):
+    """
+    Session on the shard holding the invoice requested by the public link.
+    """
+    try:
+        invoice_id = UUID(id)
+    except ValueError:
+        raise HTTPException(status_code=404, detail="Invoice not found")
+    with Session(database.router.engine_for_invoice(invoice_id)) as session:
+        yield session
+
+
+ShardSessionDep = Annotated[Session, Depends(get_shard_session)]
+InvoiceSessionDep = Annotated[Session, Depends(get_invoice_session)]
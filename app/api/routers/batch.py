@@ -0,0 +1,172 @@
+import asyncio
+import json
+from typing import Annotated, Any, List
+from urllib.parse import urlencode
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.encoders import jsonable_encoder
+from starlette.exceptions import HTTPException as StarletteHTTPException
+from sqlmodel import Session
+from app.api.deps import BatchContext, load_user, optional_oauth2_scheme
+from app.config import get_settings
+from app.db import database
+from app.models import BatchItem, BatchResult
+from app.utils.load_shedding import get_load_shedder
+
+router = APIRouter(tags=["batch"])
+
+# copied from the batch request into every sub-request
+_SCOPE_KEYS = (
+    "type",
+    "asgi",
+    "http_version",
+    "scheme",
+    "server",
+    "client",
+    "root_path",
+    "app",
+    "starlette.exception_handlers",
+)
+
+
+async def _dispatch(
+    request: Request, context: BatchContext, item: BatchItem
+) -> BatchResult:
+    """
+    Run one sub-request through the application's routes, in-process, and
+    capture its response.
+    """
+    path, _, query = item.path.partition("?")
+    if path == request.scope["path"]:
+        return BatchResult(
+            status=400, headers={}, body={"detail": "Batches cannot be nested"}
+        )
+    # sub-requests skip the middleware, shed them as if sent alone
+    shedder = get_load_shedder()
+    if shedder.enabled and not shedder.admit(path):
+        return BatchResult(
+            status=503,
+            headers={"retry-after": str(shedder.retry_after)},
+            body={"detail": "Server overloaded, retry later"},
+        )
+    if item.query:
+        query = "&".join(filter(None, [query, urlencode(item.query, doseq=True)]))
+    body = b"" if item.body is None else json.dumps(jsonable_encoder(item.body)).encode()
+    headers = [
+        (b"content-type", b"application/json"),
+        (b"content-length", str(len(body)).encode()),
+    ]
+    if "authorization" in request.headers:
+        headers.append((b"authorization", request.headers["authorization"].encode()))
+    scope = {key: request.scope[key] for key in _SCOPE_KEYS if key in request.scope}
+    scope.update(
+        method=item.method,
+        path=path,
+        raw_path=path.encode(),
+        query_string=query.encode(),
+        headers=headers,
+        state={**request.scope.get("state", {}), "batch": context},
+    )
+
+    finished = asyncio.Event()
+    received = False
+
+    async def receive() -> dict[str, Any]:
+        nonlocal received
+        if not received:
+            received = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        await finished.wait()
+        return {"type": "http.disconnect"}
+
+    response: dict[str, Any] = {"status": 500, "headers": [], "body": b""}
+
+    async def send(message: dict[str, Any]) -> None:
+        if message["type"] == "http.response.start":
+            response["status"] = message["status"]
+            response["headers"] = message.get("headers", [])
+        elif message["type"] == "http.response.body":
+            response["body"] += message.get("body", b"")
+
+    try:
+        await request.app.router(scope, receive, send)
+    except StarletteHTTPException as error:
+        # unknown paths and methods, raised by the router itself
+        return BatchResult(
+            status=error.status_code,
+            headers=dict(error.headers or {}),
+            body={"detail": error.detail},
+        )
+    except Exception:
+        return BatchResult(
+            status=500, headers={}, body={"detail": "Internal Server Error"}
+        )
+    finally:
+        finished.set()
+
+    result_headers = {
+        name.decode("latin-1"): value.decode("latin-1")
+        for name, value in response["headers"]
+        if name.lower() != b"content-length"
+    }
+    content = response["body"]
+    if result_headers.get("content-type", "").startswith("application/json"):
+        content = json.loads(content) if content else None
+    else:
+        content = content.decode(errors="replace")
+    return BatchResult(status=response["status"], headers=result_headers, body=content)
+
+
+def _load_user(token: str):
+    with Session(database.engine) as session:
+        user = load_user(session, token)
+        # loaded once here rather than by every sub-request returning the user
+        user.products
+        return user
+
+
+@router.post("/batch", response_model=List[BatchResult])
+async def batch(
+    items: List[BatchItem],
+    request: Request,
+    token: Annotated[str | None, Depends(optional_oauth2_scheme)],
+):
+    """
+    Run several API calls in one request. Every sub-request gets the caller's
+    token and the results come back in order. The user is resolved once and
+    sub-requests share one session per database. Consecutive GETs run
+    concurrently; any other method waits for the calls before it and is
+    waited for by the calls after it, so later calls see its writes.
+    """
+    if len(items) > get_settings().batch_max_requests:
+        raise HTTPException(
+            status_code=400,
+            detail=f"A batch holds at most {get_settings().batch_max_requests} requests",
+        )
+    user = None
+    if token:
+        try:
+            user = await run_in_threadpool(_load_user, token)
+        except HTTPException:
+            # every sub-request answers the bad token on its own
+            pass
+    context = BatchContext(user)
+
+    results: list[BatchResult] = []
+    reads: list[BatchItem] = []
+    try:
+        for item in items:
+            if item.method == "GET":
+                reads.append(item)
+                continue
+            results += await asyncio.gather(
+                *(_dispatch(request, context, read) for read in reads)
+            )
+            reads = []
+            results.append(await _dispatch(request, context, item))
+        results += await asyncio.gather(
+            *(_dispatch(request, context, read) for read in reads)
+        )
+    finally:
+        await run_in_threadpool(context.close)
+    return results
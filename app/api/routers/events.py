@@ -0,0 +1,63 @@
+import anyio
+from fastapi import APIRouter, HTTPException, WebSocket, WebSocketDisconnect, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from app.api.deps import StreamUser, connection_user
+from app.utils.events import Subscription, get_event_hub, sse_stream
+
+router = APIRouter(prefix="/user", tags=["live events"])
+
+
+@router.get("/events")
+async def invoice_events(current_user: StreamUser):
+    """
+    Server-sent events for the current user's invoice writes, made from any
+    device. Authenticate with the bearer token, in the Authorization header
+    or the `token` query parameter
+    """
+    return StreamingResponse(
+        sse_stream(get_event_hub(), current_user.id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def _forward(
+    websocket: WebSocket, subscription: Subscription, scope: anyio.CancelScope
+) -> None:
+    try:
+        async for data in subscription:
+            await websocket.send_text(data)
+    except (WebSocketDisconnect, RuntimeError):
+        # the client went away while we were sending
+        pass
+    scope.cancel()
+
+
+async def _until_disconnect(websocket: WebSocket, scope: anyio.CancelScope) -> None:
+    # messages from the client are ignored
+    while (await websocket.receive())["type"] != "websocket.disconnect":
+        pass
+    scope.cancel()
+
+
+@router.websocket("/events/ws")
+async def invoice_events_ws(websocket: WebSocket):
+    """
+    The invoice events of `/user/events` over a WebSocket.
+    """
+    try:
+        user = await run_in_threadpool(connection_user, websocket)
+    except HTTPException as error:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason=error.detail)
+        return
+    subscription = get_event_hub().subscribe(user.id)
+    await websocket.accept()
+    with subscription:
+        async with anyio.create_task_group() as tasks:
+            tasks.start_soon(_forward, websocket, subscription, tasks.cancel_scope)
+            tasks.start_soon(_until_disconnect, websocket, tasks.cancel_scope)
+        if subscription.dropped:
+            await websocket.close(
+                code=status.WS_1013_TRY_AGAIN_LATER, reason="Too far behind"
+            )
@@ -1,8 +1,11 @@
 from typing import Any
+from uuid import UUID
 from fastapi import APIRouter, HTTPException, status
 
 from app.models import InputSellers, PublicSeller, InvoicePublic
-from app.api.deps import SessionDep
+from app.api.deps import InvoiceSessionDep, SessionDep
+from app.config import get_settings
+from app.utils.cache import get_cache
 from app import crud
 
 router = APIRouter()
@@ -30,6 +33,16 @@ def signup_user(inputseller: InputSellers, session: SessionDep) -> Any:
 
 
 @router.get("/invoice", tags=["Direct Lint to Invoice"], response_model=InvoicePublic)
-def get_invoice(id: str, session: SessionDep) -> Any:
-
-    return crud.get_invoice_by_id(session=session, invoice_id=id)
+def get_invoice(id: str, session: InvoiceSessionDep) -> Any:
+
+    invoice_id = str(UUID(id))
+    invoice = get_cache().get_or_set(
+        f"invoice:{invoice_id}",
+        "",
+        lambda: crud.get_invoice_by_id(session=session, invoice_id=invoice_id),
+        get_settings().public_invoice_ttl_seconds,
+        InvoicePublic,
+    )
+    if invoice is None:
+        raise HTTPException(status_code=404, detail="Invoice not found")
+    return invoice
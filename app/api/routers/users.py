@@ -1,56 +1,98 @@
-from typing import Any, List
-from fastapi import APIRouter, HTTPException, Query
+from typing import Annotated, Any, List
+from uuid import UUID
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, UploadFile
+from fastapi.responses import FileResponse
 from app import crud
-from app.api.deps import SessionDep, CurrentUser
+from app.api.deps import SessionDep, ShardSessionDep, CurrentUser, seller_slot
 from app.models import (
+    Dashboard,
+    ExportJobPublic,
+    ExportRequest,
+    ExportStatus,
+    ImportResult,
+    InvoiceFilter,
     InvoiceInput,
     InvoicePublic,
+    InvoiceStatusResult,
+    InvoiceStatusUpdate,
+    InvoiceUpdate,
     BaseSeller,
     InputProduct,
     PublicSeller,
     PublicProduct,
+    ProductSales,
+    ProductSalesFilter,
+    SellerCounts,
 )
+from app.utils import csv_import
+from app.utils.dashboard import get_dashboard
+from app.utils.catalog import get_catalog_cache
+from app.utils.exports import export_path
 from app.utils.security import get_password_hash, verify_password
 
 
-router = APIRouter(prefix="/user", tags=["user operations"])
+# the expensive routes wait for their turn, see LIMITER_ROUTE_COSTS
+router = APIRouter(
+    prefix="/user", tags=["user operations"], dependencies=[Depends(seller_slot)]
+)
 
 
 @router.post("/newproduct", response_model=List[PublicProduct])
 def create_product(
-    products: List[InputProduct], session: SessionDep, current_user: CurrentUser
+    products: List[InputProduct], session: ShardSessionDep, current_user: CurrentUser
 ):
     """
     Create a new product for the current user
     """
     # trun it into set to avoid duplicates
     products = set(products)  # type: ignore[assignment]
-    seller_products = crud.get_seller_product(
-        session=session, seller_id=current_user.id
-    )
-    if len(seller_products) > 0:
-        seller_products_names = [p.name for p in seller_products]  # type: ignore
-
-        # trun it into set for faster lookup
-        seller_products_names = set(seller_products_names)  # type: ignore[assignment]
+    catalog_cache = get_catalog_cache()
+    catalog = catalog_cache.get(session, current_user.id)
+    if len(catalog) > 0:
         products = [
-            product for product in products if product.name not in seller_products_names
+            product for product in products if product.name not in catalog.by_name
         ]
         if products == []:
             raise HTTPException(
                 status_code=400, detail=f"All Products already exist for this seller."
             )
     crud.create_product(session=session, products=products, user_id=current_user.id)
-    seller_products = crud.get_seller_product(
-        session=session, seller_id=current_user.id
+    return catalog_cache.get(session, current_user.id).products
+
+
+ProgressKey = Annotated[str | None, Query(max_length=64)]
+
+
+def _progress(current_user: CurrentUser, key: str | None) -> csv_import.Progress | None:
+    if key is None:
+        return None
+    return csv_import.progress_reporter(current_user.id, key)
+
+
+@router.post("/import/products", response_model=ImportResult)
+def import_products(
+    file: UploadFile,
+    session: ShardSessionDep,
+    current_user: CurrentUser,
+    progress: ProgressKey = None,
+) -> Any:
+    """
+    Create products from a CSV upload (columns name, price, description),
+    committed in chunks. Rows that fail are reported and skipped. With a
+    `progress` key, the result so far can be polled at /import/progress/{key}
+    """
+    return csv_import.import_products(
+        session=session,
+        seller_id=current_user.id,
+        file=file.file,
+        progress=_progress(current_user, progress),
     )
-    return list(seller_products)
 
 
 @router.post("/createInvoice", response_model=InvoicePublic)
 def create_invoice(
     invoice: InvoiceInput,
-    session: SessionDep,
+    session: ShardSessionDep,
     current_user: CurrentUser,
 ) -> InvoicePublic:
     """
@@ -62,30 +104,186 @@ def create_invoice(
     return new_invoice
 
 
+@router.post("/import/invoices", response_model=ImportResult)
+def import_invoices(
+    file: UploadFile,
+    session: ShardSessionDep,
+    current_user: CurrentUser,
+    progress: ProgressKey = None,
+) -> Any:
+    """
+    Create invoices from a CSV upload with one row per line item, rows of
+    the same invoice sharing its `invoice` reference. Committed in chunks;
+    invoices that fail are reported and skipped. With a `progress` key, the
+    result so far can be polled at /import/progress/{key}
+    """
+    return csv_import.import_invoices(
+        session=session,
+        seller_id=current_user.id,
+        file=file.file,
+        progress=_progress(current_user, progress),
+    )
+
+
+@router.get("/import/progress/{key}", response_model=ImportResult)
+def get_import_progress(key: str, current_user: CurrentUser) -> Any:
+    """
+    Result so far of an import started with this `progress` key, `done`
+    once it finished
+    """
+    result = csv_import.get_progress(current_user.id, key)
+    if result is None:
+        raise HTTPException(status_code=404, detail="Unknown import")
+    return result
+
+
 @router.get("/get_invoices", response_model=List[InvoicePublic])
 def get_invoices(
-    session: SessionDep,
+    session: ShardSessionDep,
     current_user: CurrentUser,
+    response: Response,
+    filters: Annotated[InvoiceFilter, Depends()],
     offset: int = 0,
     limit: int = Query(default=10, le=10),
 ) -> Any:
     """
-    Get all invoices for the current user
+    Get all invoices for the current user, optionally filtered by status,
+    payment mode, creation date range and total. The total number of
+    matching invoices is returned in the X-Total-Count header
     """
     invoices = crud.get_seller_invoices(
-        session=session, user_id=current_user.id, offset=offset, limit=limit
+        session=session,
+        user_id=current_user.id,
+        offset=offset,
+        limit=limit,
+        filters=filters,
     )
     if not invoices:
         raise HTTPException(status_code=404, detail="No invoices found")
+    total = crud.count_seller_invoices(
+        session=session, user_id=current_user.id, filters=filters
+    )
+    response.headers["X-Total-Count"] = str(total)
     return list(invoices)
 
 
+@router.get("/get_product_invoices", response_model=List[InvoicePublic])
+def get_product_invoices(
+    product_id: UUID,
+    session: ShardSessionDep,
+    current_user: CurrentUser,
+    offset: int = 0,
+    limit: int = Query(default=10, le=10),
+) -> Any:
+    """
+    Get the invoices of the current user that contain a product
+    """
+    invoices = crud.get_product_invoices(
+        session=session,
+        user_id=current_user.id,
+        product_id=product_id,
+        offset=offset,
+        limit=limit,
+    )
+    if not invoices:
+        raise HTTPException(status_code=404, detail="No invoices found")
+    return list(invoices)
+
+
+@router.get("/invoices/number/{number}", response_model=InvoicePublic)
+def get_invoice_by_number(
+    number: str, session: ShardSessionDep, current_user: CurrentUser
+) -> Any:
+    """
+    Get an invoice of the current user by its number, such as INV-2026-000123
+    """
+    invoice = crud.get_invoice_by_number(
+        session=session, seller_id=current_user.id, number=number
+    )
+    if invoice is None:
+        raise HTTPException(status_code=404, detail="Invoice not found")
+    return invoice
+
+
+@router.get("/reports/products", response_model=List[ProductSales])
+def get_product_sales(
+    session: ShardSessionDep,
+    current_user: CurrentUser,
+    filters: Annotated[ProductSalesFilter, Depends()],
+) -> Any:
+    """
+    Top products of the current user by quantity or revenue over a date
+    range (days of invoice creation, both ends included)
+    """
+    return crud.get_product_sales(
+        session=session, seller_id=current_user.id, filters=filters
+    )
+
+
+@router.post("/exports", response_model=ExportJobPublic, status_code=202)
+def create_export(
+    request: ExportRequest, session: ShardSessionDep, current_user: CurrentUser
+) -> Any:
+    """
+    Queue an export of the current user's invoices with their items, as
+    gzipped CSV or JSON Lines. Poll its status, then download the file
+    """
+    return crud.create_export_job(
+        session=session, request=request, user_id=current_user.id
+    )
+
+
+@router.get("/exports/{job_id}", response_model=ExportJobPublic)
+def get_export(
+    job_id: UUID, session: ShardSessionDep, current_user: CurrentUser
+) -> Any:
+    """
+    Status and progress (exported out of total invoices) of an export
+    """
+    return crud.get_export_job(session=session, job_id=job_id, user_id=current_user.id)
+
+
+@router.get("/exports/{job_id}/download")
+def download_export(
+    job_id: UUID, session: ShardSessionDep, current_user: CurrentUser
+) -> FileResponse:
+    """
+    The file of a finished export. Range requests are supported, so broken
+    downloads can be resumed
+    """
+    job = crud.get_export_job(session=session, job_id=job_id, user_id=current_user.id)
+    path = export_path(job)
+    if job.status != ExportStatus.DONE or not path.exists():
+        raise HTTPException(status_code=409, detail="Export is not finished")
+    return FileResponse(
+        path, media_type="application/gzip", filename=f"invoices-{path.name}"
+    )
+
+
+@router.get("/counts", response_model=SellerCounts)
+def get_counts(session: ShardSessionDep, current_user: CurrentUser) -> Any:
+    """
+    Invoice (overall and by status) and product counts of the current user
+    """
+    return crud.get_seller_counts(session=session, seller_id=current_user.id)
+
+
+@router.get("/dashboard", response_model=Dashboard)
+async def dashboard(current_user: CurrentUser) -> Any:
+    """
+    Profile, counts by status, this month's totals and the latest invoices
+    of the current user, cached for a few seconds
+    """
+    return await get_dashboard(current_user)
+
+
 @router.patch("/update_invoice", response_model=InvoicePublic)
 def update_invoice(
-    up_invoice: InvoicePublic, session: SessionDep, current_user: CurrentUser
+    up_invoice: InvoiceUpdate, session: ShardSessionDep, current_user: CurrentUser
 ):
     """
-    Update an existing invoice for the current user
+    Partially update an existing invoice for the current user, only the sent
+    fields and line items are changed
     """
     new_invoice = crud.update_invoice(
         session=session, up_invoice=up_invoice, user_id=current_user.id
@@ -93,6 +291,41 @@ def update_invoice(
     return new_invoice
 
 
+@router.delete("/invoices/{invoice_id}", status_code=204)
+def delete_invoice(
+    invoice_id: UUID,
+    session: ShardSessionDep,
+    current_user: CurrentUser,
+    permanent: bool = False,
+) -> None:
+    """
+    Delete an invoice of the current user. It disappears at once and is
+    purged after the retention period, or right away when `permanent`
+    """
+    crud.delete_invoice(
+        session=session,
+        invoice_id=invoice_id,
+        user_id=current_user.id,
+        permanent=permanent,
+    )
+
+
+@router.patch("/invoices/status", response_model=InvoiceStatusResult)
+def update_invoices_status(
+    status_update: InvoiceStatusUpdate,
+    session: ShardSessionDep,
+    current_user: CurrentUser,
+) -> Any:
+    """
+    Change the status (and payment mode) of many invoices of the current user
+    at once, selected by ids and/or filters
+    """
+    updated = crud.update_invoices_status(
+        session=session, status_update=status_update, user_id=current_user.id
+    )
+    return InvoiceStatusResult(updated=updated)
+
+
 @router.post("/new_password")
 def update_user_password(
     session: SessionDep,
@@ -133,9 +366,4 @@ def update_user_me(
             raise HTTPException(
                 status_code=409, detail="User with this email already exists"
             )
-    user_data = user_in.model_dump(exclude_unset=True)  # type: ignore
-    current_user.sqlmodel_update(user_data)  # type: ignore
-    session.add(current_user)
-    session.commit()
-    session.refresh(current_user)
-    return current_user
+    return crud.update_user(session=session, user_id=current_user.id, user_data=user_in)
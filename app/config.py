@@ -0,0 +1,163 @@
+from functools import lru_cache, reduce
+from operator import mul
+from os import getenv
+
+
+def _int(value: str) -> int:
+    """
+    Parse an integer setting, allowing products such as `60 * 24 * 5`.
+    """
+    return reduce(mul, (int(part) for part in value.split("*")), 1)
+
+
+def _bool(value: str) -> bool:
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def _paths(value: str) -> list[str]:
+    """
+    Parse a comma separated list of URL paths.
+    """
+    return [path.strip().rstrip("/") for path in value.split(",") if path.strip()]
+
+
+class Settings:
+    """
+    Application configuration, read from the environment and the `.env` file.
+    Nothing is read at import time, use `get_settings()`.
+    """
+
+    def __init__(self) -> None:
+        # Database configuration
+        self.db_driver = getenv("DB_DRIVER", "sqlite")
+        self.db_host = getenv("DB_HOST", "localhost")
+        self.db_port = getenv("DB_PORT", "5432")
+        self.db_name = getenv("DB_NAME", "mydatabase")
+        self.db_user = getenv("DB_USERNAME", "user")
+        self.db_password = getenv("DB_PASSWORD", "password")
+        # comma separated database names of the extra invoice shards
+        self.db_shards = [
+            name.strip() for name in getenv("DB_SHARDS", "").split(",") if name.strip()
+        ]
+        self.db_create_tables = _bool(getenv("DB_CREATE_TABLES", "false"))
+        # seconds a worker caches a seller's shard, rows copied per move batch
+        self.shard_directory_ttl = _int(getenv("SHARD_DIRECTORY_TTL", "5"))
+        self.shard_move_batch_size = _int(getenv("SHARD_MOVE_BATCH_SIZE", "1000"))
+
+        # Application Security settings
+        self.secret_key = getenv("APP_SECRET_KEY")
+        self.algorithm = getenv("ALGORITHM", "HS256")
+        self.access_token_expire_minutes = _int(
+            getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30")
+        )
+        # bcrypt cost, pick it with `python -m app.utils.security`
+        self.bcrypt_rounds = _int(getenv("BCRYPT_ROUNDS", "12"))
+
+        # Invoice archival
+        self.invoice_retention_days = _int(getenv("INVOICE_RETENTION_DAYS", "365"))
+        self.archive_batch_size = _int(getenv("ARCHIVE_BATCH_SIZE", "1000"))
+        # soft deleted invoices are purged after this many days
+        self.deleted_retention_days = _int(getenv("DELETED_RETENTION_DAYS", "30"))
+        self.purge_batch_size = _int(getenv("PURGE_BATCH_SIZE", "1000"))
+
+        # Caches
+        self.catalog_cache_max_products = _int(
+            getenv("CATALOG_CACHE_MAX_PRODUCTS", "50000")
+        )
+        # shared cache: memory://, sqlite:///path/to/cache.db or redis://host:port/db
+        self.cache_url = getenv("CACHE_URL", "memory://")
+        self.cache_max_entries = _int(getenv("CACHE_MAX_ENTRIES", "10000"))
+        # seconds a worker trusts a namespace version missed from the broadcast
+        self.cache_version_seconds = _int(getenv("CACHE_VERSION_SECONDS", "5"))
+        self.dashboard_ttl_seconds = _int(getenv("DASHBOARD_TTL_SECONDS", "30"))
+        # threads running the dashboard queries, three per dashboard miss
+        self.dashboard_threads = _int(getenv("DASHBOARD_THREADS", "6"))
+        self.public_invoice_ttl_seconds = _int(
+            getenv("PUBLIC_INVOICE_TTL_SECONDS", "300")
+        )
+
+        # Invoice numbers: PREFIX-YEAR-000123, "blocks" or "gapless" (see
+        # app.utils.invoice_numbers), numbers a worker reserves at a time
+        self.invoice_number_prefix = getenv("INVOICE_NUMBER_PREFIX", "INV")
+        self.invoice_number_policy = getenv("INVOICE_NUMBER_POLICY", "blocks")
+        self.invoice_number_block = _int(getenv("INVOICE_NUMBER_BLOCK", "20"))
+
+        # CSV imports
+        self.import_chunk_size = _int(getenv("IMPORT_CHUNK_SIZE", "1000"))
+        self.import_max_errors = _int(getenv("IMPORT_MAX_ERRORS", "100"))
+
+        # Export jobs
+        self.export_dir = getenv("EXPORT_DIR", "exports")
+        self.export_batch_size = _int(getenv("EXPORT_BATCH_SIZE", "500"))
+        # a running job not checkpointed for that long is taken over
+        self.export_lease_seconds = _int(getenv("EXPORT_LEASE_SECONDS", "300"))
+
+        # Live invoice events: "local" (one worker) or "postgres" (LISTEN/NOTIFY)
+        self.events_broadcaster = getenv("EVENTS_BROADCASTER", "local")
+        # events a connection may fall behind by before it is dropped
+        self.events_queue_size = _int(getenv("EVENTS_QUEUE_SIZE", "100"))
+        self.events_heartbeat_seconds = _int(getenv("EVENTS_HEARTBEAT_SECONDS", "15"))
+
+        # Batch requests
+        self.batch_max_requests = _int(getenv("BATCH_MAX_REQUESTS", "20"))
+
+        # Per-seller limits of the expensive routes (see app.utils.limiter):
+        # cost units of a worker, of one seller, and route name = cost
+        self.limiter_capacity = _int(getenv("LIMITER_CAPACITY", "40"))
+        self.limiter_seller_capacity = _int(getenv("LIMITER_SELLER_CAPACITY", "8"))
+        self.limiter_route_costs = {
+            name.strip(): _int(cost)
+            for name, _, cost in (
+                pair.partition("=")
+                for pair in getenv(
+                    "LIMITER_ROUTE_COSTS",
+                    "import_products=4,import_invoices=4,download_export=2,"
+                    "get_invoices=1,get_product_invoices=1,get_product_sales=2",
+                ).split(",")
+                if pair.strip()
+            )
+        }
+        # seconds a request may wait for its turn before a 429
+        self.limiter_queue_seconds = _int(getenv("LIMITER_QUEUE_SECONDS", "30"))
+
+        # Load shedding (see app.utils.load_shedding): threadpool queueing delay
+        # target (0 = off), requests waiting for a response before all but
+        # the critical routes are shed (0 = no limit), and API paths by priority
+        self.shed_target_ms = _int(getenv("SHED_TARGET_MS", "100"))
+        self.shed_max_in_flight = _int(getenv("SHED_MAX_IN_FLIGHT", "0"))
+        self.shed_interval_ms = _int(getenv("SHED_INTERVAL_MS", "100"))
+        self.shed_retry_seconds = _int(getenv("SHED_RETRY_SECONDS", "2"))
+        self.shed_low_priority = _paths(
+            getenv(
+                "SHED_LOW_PRIORITY",
+                "/user/exports,/user/get_invoices,/user/get_product_invoices,"
+                "/user/reports,/user/import",
+            )
+        )
+        self.shed_critical = _paths(
+            getenv("SHED_CRITICAL", "/login/access-token,/invoice")
+        )
+
+        # Request tracing (see app.utils.tracing): share of requests sampled
+        # (0 = off, 0.01 = one in a hundred), the JSON Lines file of spans,
+        # requests per second a caller's traceparent may force into the
+        # sample, and traces waiting to be written before new ones are dropped
+        self.trace_sample_rate = float(getenv("TRACE_SAMPLE_RATE", "0"))
+        self.trace_file = getenv("TRACE_FILE", "traces.jsonl")
+        self.trace_forced_per_second = float(getenv("TRACE_FORCED_PER_SECOND", "10"))
+        self.trace_queue_size = _int(getenv("TRACE_QUEUE_SIZE", "1000"))
+
+        # Bearer token operators send to read /health/stats (unset = 404)
+        self.stats_token = getenv("STATS_TOKEN") or None
+
+        # Startup
+        self.warmup = _bool(getenv("APP_WARMUP", "false"))
+        self.warmup_connections = _int(getenv("WARMUP_CONNECTIONS", "5"))
+
+
+@lru_cache
+def get_settings() -> Settings:
+    from dotenv import find_dotenv, load_dotenv
+
+    load_dotenv(find_dotenv())
+    return Settings()
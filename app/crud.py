@@ -1,17 +1,49 @@
-from typing import Any, List
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import date, datetime
+from threading import Lock
+from typing import Any, Iterable, List
 from fastapi import HTTPException, Query, status
-from sqlmodel import Session, col, select
+from sqlalchemy import Engine, case, delete, or_, update
+from sqlalchemy.orm import selectinload
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlmodel import Session, col, func, select
 from sqlalchemy.exc import SQLAlchemyError
 from app.models import (
+    BaseSeller,
     CreateSeller,
+    ExportJob,
+    ExportRequest,
     InputProduct,
     InputSellers,
+    InvoiceArchive,
     InvoiceCreate,
+    InvoiceEvent,
+    InvoiceFilter,
     InvoiceInput,
+    InvoiceItems,
+    InvoiceItemsArchive,
+    InvoiceItemUpdate,
     InvoicePublic,
+    InvoiceStatus,
+    InvoiceStatusUpdate,
+    InvoiceUpdate,
+    MonthTotals,
     Product,
+    ProductDailySales,
+    ProductSales,
+    ProductSalesFilter,
+    SellerCounter,
+    SellerCounts,
+)
+from app.db import database
+from app.utils.invoice_numbers import get_invoice_numbers
+from app.utils.tracing import trace_functions
+from app.utils.security import (
+    get_password_hash,
+    password_needs_update,
+    verify_password,
 )
-from app.utils.security import verify_password, get_password_hash
 from uuid import UUID
 
 """
@@ -28,9 +60,23 @@ def create_Seller(*, session: Session, seller: InputSellers) -> CreateSeller:
     session.add(seller)
     session.commit()
     session.refresh(seller)
+    replicate_seller(seller=seller)
     return seller
 
 
+def replicate_seller(*, seller: CreateSeller) -> None:
+    """
+    Mirror the seller row onto their home shard so the foreign keys of their
+    products and invoices hold there. The primary copy stays authoritative.
+    """
+    seller_engine = database.router.engine_for_seller(seller.id)
+    if seller_engine is database.engine:
+        return
+    with Session(seller_engine) as shard_session:
+        shard_session.merge(CreateSeller(**seller.model_dump()))
+        shard_session.commit()
+
+
 def get_user_by_email(*, session: Session, email: str) -> CreateSeller | None:
     """
     Get a seller by their email.
@@ -80,23 +126,69 @@ def authenticate(
         return None
     if not verify_password(password, db_user.password):
         return None
+    if password_needs_update(db_user.password):
+        engine = session.get_bind()
+        rehash_password(engine, db_user.id, db_user.password, password)  # type: ignore[arg-type]
     return db_user
 
 
+_rehash_executor: ThreadPoolExecutor | None = None
+_rehashing: set[UUID] = set()
+_rehash_lock = Lock()
+
+
+def rehash_password(
+    engine: Engine, seller_id: UUID, old_hash: str, password: str
+) -> Future | None:
+    """
+    Rehash a password with the current cost in the background, so the login
+    does not pay for it. The hash is only replaced if it has not changed
+    meanwhile. Returns None if the seller is already being rehashed.
+    """
+    global _rehash_executor
+    with _rehash_lock:
+        if seller_id in _rehashing:
+            return None
+        _rehashing.add(seller_id)
+        if _rehash_executor is None:
+            _rehash_executor = ThreadPoolExecutor(1, thread_name_prefix="rehash")
+    return _rehash_executor.submit(_rehash, engine, seller_id, old_hash, password)
+
+
+def _rehash(engine: Engine, seller_id: UUID, old_hash: str, password: str) -> None:
+    try:
+        new_hash = get_password_hash(password)
+        with Session(engine) as session:
+            session.execute(
+                update(CreateSeller)
+                .where(col(CreateSeller.id) == seller_id)
+                .where(col(CreateSeller.password) == old_hash)
+                .values(password=new_hash)
+            )
+            session.commit()
+    except SQLAlchemyError as e:
+        # the old hash still works, the next login tries again
+        print(f"Password not rehashed: {e}")
+    finally:
+        with _rehash_lock:
+            _rehashing.discard(seller_id)
+
+
 def update_user(
-    *, session: Session, user_id: str, user_data: InputSellers
+    *, session: Session, user_id: UUID, user_data: BaseSeller
 ) -> CreateSeller | None:
     """
-    Update an existing seller in the database.
+    Update an existing seller in the database. The cached dashboards show
+    the profile, so they are invalidated.
     """
     user = session.get(CreateSeller, user_id)
     if not user:
         return None
-    for key, value in user_data.dict(exclude_unset=True).items():
-        setattr(user, key, value)
+    user.sqlmodel_update(user_data.model_dump(exclude_unset=True))
     session.add(user)
     session.commit()
     session.refresh(user)
+    seller_changed(user.id)
     return user
 
 
@@ -113,7 +205,11 @@ def create_product(session: Session, products: List[InputProduct], user_id: UUID
         for product in products:
             product = Product.model_validate(product, update={"seller_id": user_id})
             session.add(product)
+        bump_counters(
+            session, user_id, {"products": len(products), "catalog_version": 1}
+        )
         session.commit()
+        seller_changed(user_id)
     except Exception as e:
         print(e)
 
@@ -138,10 +234,24 @@ def create_invoice(
     """
     Create a new invoice in the database.
     """
-    invoice = InvoiceCreate.model_validate(invoice, update={"seller_id": user_id})
+    items = [InvoiceItems(**item.model_dump()) for item in invoice.invoiceitems]
+    invoice = InvoiceCreate.model_validate(
+        invoice, update={"seller_id": user_id, "invoiceitems": items}
+    )
+    [invoice.number] = get_invoice_numbers().allocate(
+        session, user_id, invoice.created_date.year
+    )
+    # index first: a dangling index entry is harmless, a missing one is not
+    router = database.router
+    router.index_invoices([invoice.id], router.shard_for_seller(user_id))
     session.add(invoice)
+    bump_counters(
+        session, user_id, {"invoices": 1, status_counter(invoice.status): 1}
+    )
+    bump_sales(session, user_id, invoice_sales(invoice.created_date, items))
     session.commit()
     session.refresh(invoice)
+    seller_changed(user_id, InvoiceEvent(type="created", invoice_ids=[invoice.id]))
     return invoice
 
 
@@ -150,35 +260,219 @@ def get_invoice_by_id(session: Session, invoice_id: str) -> InvoicePublic | None
     Get an invoice by its ID.
     """
     invoice = session.get(InvoiceCreate, UUID(invoice_id))
-    if invoice is None:
+    if invoice is not None and invoice.deleted_at is not None:
         return None
+    if invoice is None:
+        statement = select(InvoiceArchive).where(InvoiceArchive.id == UUID(invoice_id))
+        archived = session.exec(statement).first()
+        if archived is None:
+            return None
+        return _archived_invoices(session, [archived])[0]
     return InvoicePublic.model_validate(invoice)
 
 
+def get_invoice_by_number(
+    session: Session, seller_id: UUID, number: str
+) -> InvoicePublic | None:
+    """
+    Get a seller's invoice by its number.
+    """
+    statement = select(InvoiceCreate).where(
+        InvoiceCreate.seller_id == seller_id,
+        InvoiceCreate.number == number,
+        col(InvoiceCreate.deleted_at).is_(None),
+    )
+    invoice = session.exec(statement).first()
+    if invoice is not None:
+        return InvoicePublic.model_validate(invoice)
+    archived = session.exec(
+        select(InvoiceArchive).where(
+            InvoiceArchive.seller_id == seller_id, InvoiceArchive.number == number
+        )
+    ).first()
+    if archived is None:
+        return None
+    return _archived_invoices(session, [archived])[0]
+
+
+def _archived_invoices(
+    session: Session, invoices: List[InvoiceArchive]
+) -> List[InvoicePublic]:
+    """
+    Rebuild the public shape of archived invoices, loading all their items
+    with one query.
+    """
+    ids = [invoice.id for invoice in invoices]
+    statement = select(InvoiceItemsArchive).where(
+        col(InvoiceItemsArchive.invoice_id).in_(ids)
+    )
+    items: dict[UUID, list[InvoiceItems]] = {invoice_id: [] for invoice_id in ids}
+    for item in session.exec(statement).all():
+        items[item.invoice_id].append(InvoiceItems(**item.model_dump()))
+    return [
+        InvoicePublic.model_validate(
+            invoice, update={"invoiceitems": items[invoice.id]}
+        )
+        for invoice in invoices
+    ]
+
+
+def _invoice_filters(
+    model: type[InvoiceCreate] | type[InvoiceArchive],
+    user_id: UUID,
+    filters: InvoiceFilter | None,
+) -> list[Any]:
+    """
+    WHERE clauses of a seller's invoice listing, shaped to match the
+    seller_id-led indexes of `model`. Soft deleted hot invoices are left out.
+    """
+    conditions = [col(model.seller_id) == user_id]
+    if model is InvoiceCreate:
+        conditions.append(col(InvoiceCreate.deleted_at).is_(None))
+    if filters is None:
+        return conditions
+    if filters.status is not None:
+        conditions.append(col(model.status) == filters.status)
+    if filters.payment_mode is not None:
+        conditions.append(col(model.payment_mode) == filters.payment_mode)
+    if filters.created_from is not None:
+        conditions.append(col(model.created_date) >= filters.created_from)
+    if filters.created_to is not None:
+        conditions.append(col(model.created_date) < filters.created_to)
+    if filters.min_total is not None:
+        conditions.append(col(model.total_price) >= filters.min_total)
+    if filters.max_total is not None:
+        conditions.append(col(model.total_price) <= filters.max_total)
+    return conditions
+
+
+def _newest_first(
+    session: Session,
+    hot: list[Any],
+    archived: list[Any],
+    offset: int,
+    limit: int,
+) -> List[InvoiceCreate | InvoicePublic]:
+    """
+    A page of invoices, newest first, across the hot table (rows matching
+    `hot`) and the archive (rows matching `archived`). Imports can add old
+    invoices to the hot table, so neither table is entirely newer than the
+    other: the (created date, id) keys of the first offset + limit rows of
+    each are merged, then only the rows of the page are loaded.
+    """
+    keys = []
+    for model, conditions in ((InvoiceCreate, hot), (InvoiceArchive, archived)):
+        statement = (
+            select(model.created_date, model.id)  # type: ignore[call-overload]
+            .where(*conditions)
+            .order_by(col(model.created_date).desc(), col(model.id).desc())
+            .limit(offset + limit)
+        )
+        keys += [
+            (created, invoice_id, model)
+            for created, invoice_id in session.exec(statement)
+        ]
+    keys.sort(key=lambda key: (key[0], key[1]), reverse=True)
+    page = keys[offset : offset + limit]
+
+    rows: dict[UUID, InvoiceCreate | InvoicePublic] = {}
+    hot_ids = [invoice_id for _, invoice_id, model in page if model is InvoiceCreate]
+    if hot_ids:
+        statement = select(InvoiceCreate).where(col(InvoiceCreate.id).in_(hot_ids))
+        rows.update((invoice.id, invoice) for invoice in session.exec(statement))
+    archived_ids = [invoice_id for _, invoice_id, model in page if model is InvoiceArchive]
+    if archived_ids:
+        statement = select(InvoiceArchive).where(col(InvoiceArchive.id).in_(archived_ids))
+        loaded = list(session.exec(statement).all())
+        rows.update(
+            (invoice.id, invoice) for invoice in _archived_invoices(session, loaded)
+        )
+    return [rows[invoice_id] for _, invoice_id, _ in page]
+
+
 def get_seller_invoices(
     session: Session,
     user_id: UUID,
     offset: int,
     limit: int,
+    filters: InvoiceFilter | None = None,
+) -> Any:
+    """
+    Get all invoices for a specific seller, archived ones included, newest
+    first, optionally filtered.
+    """
+    return _newest_first(
+        session,
+        _invoice_filters(InvoiceCreate, user_id, filters),
+        _invoice_filters(InvoiceArchive, user_id, filters),
+        offset,
+        limit,
+    )
+
+
+def get_product_invoices(
+    session: Session, user_id: UUID, product_id: UUID, offset: int, limit: int
 ) -> Any:
     """
-    Get all invoices for a specific seller.
+    Get the invoices of a seller that contain a product, newest first. The
+    items are looked up through their (product_id, invoice_id) index.
+    """
+    return _newest_first(
+        session,
+        [
+            InvoiceCreate.seller_id == user_id,
+            col(InvoiceCreate.deleted_at).is_(None),
+            col(InvoiceCreate.id).in_(
+                select(InvoiceItems.invoice_id).where(
+                    InvoiceItems.product_id == product_id
+                )
+            ),
+        ],
+        [
+            InvoiceArchive.seller_id == user_id,
+            col(InvoiceArchive.id).in_(
+                select(InvoiceItemsArchive.invoice_id).where(
+                    InvoiceItemsArchive.product_id == product_id
+                )
+            ),
+        ],
+        offset,
+        limit,
+    )
+
+
+def _archived_ids(
+    session: Session, invoice_ids: List[UUID], user_id: UUID | None
+) -> List[UUID]:
+    """
+    Which of the invoices are archived (and the seller's, when given).
     """
-    statement = select(InvoiceCreate).order_by(col(InvoiceCreate.created_date).desc())
-    statement = statement.where(InvoiceCreate.seller_id == user_id)
-    statement = statement.offset(offset).limit(limit)
-    invoices = session.exec(statement).all()
-    return invoices
+    statement = select(InvoiceArchive.id).where(col(InvoiceArchive.id).in_(invoice_ids))
+    if user_id is not None:
+        statement = statement.where(InvoiceArchive.seller_id == user_id)
+    return list(session.exec(statement).all())
+
+
+def _archived_conflict(invoice_ids: List[UUID]) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_409_CONFLICT,
+        detail="Archived invoices are read-only: "
+        + ", ".join(str(invoice_id) for invoice_id in invoice_ids),
+    )
 
 
 def update_invoice(
-    session: Session, up_invoice: InvoicePublic, user_id: UUID
+    session: Session, up_invoice: InvoiceUpdate, user_id: UUID
 ) -> InvoiceCreate | None:
     """
-    Update an existing invoice in the database.
+    Update an existing invoice in the database. Only the sent header columns
+    and the line items that actually changed are written, in one transaction.
+    Archived invoices are read-only.
     """
     db_invoice = session.get(InvoiceCreate, up_invoice.id)
-    if not db_invoice:
+    if not db_invoice and _archived_ids(session, [up_invoice.id], user_id):
+        raise _archived_conflict([up_invoice.id])
+    if not db_invoice or db_invoice.deleted_at is not None:
         raise HTTPException(status_code=404, detail="Invoice not found")
 
     if db_invoice.seller_id != user_id:
@@ -187,20 +481,477 @@ def update_invoice(
             detail="You do not have permission to update this invoice.",
         )
     else:
-        update_data = up_invoice.model_dump(exclude_unset=True)
+        update_data = up_invoice.model_dump(
+            exclude_unset=True, exclude={"id", "invoiceitems"}
+        )
+        if update_data.get("total_price", 0) is None:
+            del update_data["total_price"]
+        old_status = db_invoice.status
         db_invoice = db_invoice.sqlmodel_update(update_data)
         session.add(db_invoice)
+        if db_invoice.status != old_status:
+            bump_counters(
+                session,
+                user_id,
+                {status_counter(old_status): -1, status_counter(db_invoice.status): 1},
+            )
+        if up_invoice.invoiceitems is not None:
+            sales_before = invoice_sales(
+                db_invoice.created_date, _invoice_items(session, db_invoice.id), -1
+            )
+            _apply_item_changes(session, db_invoice, up_invoice.invoiceitems)
+            sales_after = invoice_sales(
+                db_invoice.created_date, _invoice_items(session, db_invoice.id)
+            )
+            bump_sales(session, user_id, merge_sales(sales_before, sales_after))
         session.commit()
+        seller_changed(
+            user_id, InvoiceEvent(type="updated", invoice_ids=[up_invoice.id])
+        )
         session.refresh(db_invoice)
     return db_invoice  # type ignore[return-value]
 
 
-def delete_invoice(session: Session, invoice_id: str) -> None:
+def _invoice_items(session: Session, invoice_id: UUID) -> List[InvoiceItems]:
+    statement = select(InvoiceItems).where(InvoiceItems.invoice_id == invoice_id)
+    return list(session.exec(statement).all())
+
+
+def _apply_item_changes(
+    session: Session, db_invoice: InvoiceCreate, items: List[InvoiceItemUpdate]
+) -> None:
+    """
+    Diff the sent line items against the stored ones by id and stage only the
+    inserts, updates and deletes. Unchanged items produce no statement.
+    """
+    existing = {item.id: item for item in _invoice_items(session, db_invoice.id)}
+    kept = set()
+    for item in items:
+        item_data = item.model_dump(exclude_unset=True, exclude={"id"})
+        if item.id is None:
+            if item.quantity is None or item.total_price is None:
+                raise HTTPException(
+                    status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                    detail="New invoice items need a quantity and a total_price.",
+                )
+            session.add(InvoiceItems(invoice_id=db_invoice.id, **item_data))
+        elif item.id in existing:
+            kept.add(item.id)
+            existing[item.id].sqlmodel_update(
+                {key: value for key, value in item_data.items() if value is not None}
+            )
+            session.add(existing[item.id])
+        else:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Invoice item {item.id} not found on this invoice.",
+            )
+    removed = [item_id for item_id in existing if item_id not in kept]
+    if removed:
+        for item_id in removed:
+            session.expunge(existing[item_id])
+        statement = delete(InvoiceItems).where(col(InvoiceItems.id).in_(removed))
+        session.exec(statement)  # type: ignore[call-overload]
+
+
+def update_invoices_status(
+    session: Session, status_update: InvoiceStatusUpdate, user_id: UUID
+) -> List[UUID]:
+    """
+    Move many invoices of a seller to a new status (and payment mode) with a
+    single UPDATE ... RETURNING statement. Returns the ids that changed.
+    Archived invoices are read-only: filters leave them out, and asking for
+    one by id is a conflict.
+    """
+    filters = [
+        status_update.ids,
+        status_update.current_status,
+        status_update.created_from,
+        status_update.created_to,
+    ]
+    if all(value is None for value in filters):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Give invoice ids or at least one filter.",
+        )
+
+    if status_update.ids:
+        archived = _archived_ids(session, status_update.ids, user_id)
+        if archived:
+            raise _archived_conflict(archived)
+
+    values: dict[str, Any] = {"status": status_update.status}
+    if status_update.payment_mode is not None:
+        values["payment_mode"] = status_update.payment_mode
+
+    conditions = _invoice_filters(
+        InvoiceCreate,
+        user_id,
+        InvoiceFilter(
+            status=status_update.current_status,
+            created_from=status_update.created_from,
+            created_to=status_update.created_to,
+        ),
+    )
+    if status_update.ids is not None:
+        conditions.append(col(InvoiceCreate.id).in_(status_update.ids))
+
+    # status counters move by the rows that are about to change status
+    moving = session.exec(
+        select(InvoiceCreate.status, func.count())
+        .where(*conditions, col(InvoiceCreate.status) != status_update.status)
+        .group_by(col(InvoiceCreate.status))
+    ).all()
+    deltas = {status_counter(old): -count for old, count in moving}
+    deltas[status_counter(status_update.status)] = sum(count for _, count in moving)
+
+    statement = update(InvoiceCreate).where(*conditions)
+    statement = statement.values(**values).returning(col(InvoiceCreate.id))
+    updated = list(session.exec(statement).scalars())  # type: ignore[call-overload]
+    bump_counters(session, user_id, deltas)
+    session.commit()
+    if updated:
+        seller_changed(user_id, InvoiceEvent(type="status", invoice_ids=updated))
+    return updated
+
+
+def delete_invoice(
+    session: Session,
+    invoice_id: UUID | str,
+    user_id: UUID | None = None,
+    permanent: bool = False,
+) -> None:
     """
-    Delete an invoice from the database.
+    Delete an invoice. By default it is only tombstoned: every read skips it
+    at once and `app.utils.purge` removes it after the retention period. A
+    permanent delete is a single DELETE, the database cascading to the items.
+    Archived invoices are read-only.
     """
+    invoice_id = UUID(str(invoice_id))
     invoice = session.get(InvoiceCreate, invoice_id)
-    if not invoice:
-        return None
-    session.delete(invoice)
+    if not invoice and _archived_ids(session, [invoice_id], user_id):
+        raise _archived_conflict([invoice_id])
+    if not invoice or (invoice.deleted_at is not None and not permanent):
+        raise HTTPException(status_code=404, detail="Invoice not found")
+    if user_id is not None and invoice.seller_id != user_id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="You do not have permission to delete this invoice.",
+        )
+
+    if invoice.deleted_at is None:
+        sales = invoice_sales(
+            invoice.created_date, _invoice_items(session, invoice.id), -1
+        )
+        bump_counters(
+            session,
+            invoice.seller_id,
+            {"invoices": -1, status_counter(invoice.status): -1},
+        )
+        bump_sales(session, invoice.seller_id, sales)
+    if permanent:
+        session.delete(invoice)
+    else:
+        invoice.deleted_at = datetime.now()
+        session.add(invoice)
+    seller_id, invoice_id = invoice.seller_id, invoice.id
+    session.commit()
+    seller_changed(seller_id, InvoiceEvent(type="deleted", invoice_ids=[invoice_id]))
+
+
+def seller_changed(seller_id: UUID, event: InvoiceEvent | None = None) -> None:
+    """
+    Drop what the workers cache about a seller after their products or
+    invoices were written, and push the invoice event to their live feeds.
+    """
+    # imported here, the events are built on top of this module
+    from app.utils.cache import get_cache
+    from app.utils.events import get_event_hub
+
+    namespaces = [f"dashboard:{seller_id}"]
+    # new invoices cannot have been cached yet
+    if event is not None and event.type not in ("created", "imported"):
+        namespaces += [f"invoice:{invoice_id}" for invoice_id in event.invoice_ids]
+    get_cache().invalidate_many(namespaces)
+    if event is not None:
+        try:
+            get_event_hub().publish(seller_id, event)
+        except Exception as e:
+            # the write is committed, a lost event only delays the feeds
+            print(f"Event not published: {e}")
+
+
+"""
+Seller dashboard
+"""
+
+
+def get_month_totals(session: Session, seller_id: UUID, month: date) -> MonthTotals:
+    """
+    Number, total and paid total of the seller's invoices created since the
+    first day of `month`, in one aggregate over the (seller_id, created_date)
+    index.
+    """
+    start = datetime(month.year, month.month, 1)
+    paid = case(
+        (col(InvoiceCreate.status) == InvoiceStatus.PAID, InvoiceCreate.total_price),
+        else_=0,
+    )
+    invoices, total, paid_total = session.exec(
+        select(func.count(), func.sum(InvoiceCreate.total_price), func.sum(paid)).where(
+            *_invoice_filters(InvoiceCreate, seller_id, InvoiceFilter(created_from=start))
+        )
+    ).one()
+    return MonthTotals(
+        month=start.date(), invoices=invoices, total=total or 0.0, paid=paid_total or 0.0
+    )
+
+
+def get_recent_invoices(
+    session: Session, seller_id: UUID, limit: int
+) -> List[InvoicePublic]:
+    """
+    The seller's newest invoices with their items, loaded in two queries.
+    """
+    statement = (
+        select(InvoiceCreate)
+        .where(*_invoice_filters(InvoiceCreate, seller_id, None))
+        .order_by(col(InvoiceCreate.created_date).desc())
+        .limit(limit)
+        .options(selectinload(InvoiceCreate.invoiceitems))  # type: ignore[arg-type]
+    )
+    return [
+        InvoicePublic.model_validate(invoice)
+        for invoice in session.exec(statement).all()
+    ]
+
+
+"""
+Export jobs
+"""
+
+
+def create_export_job(
+    session: Session, request: ExportRequest, user_id: UUID
+) -> ExportJob:
+    """
+    Queue an invoice export for `app.utils.exports` to run.
+    """
+    job = ExportJob.model_validate(request, update={"seller_id": user_id})
+    session.add(job)
     session.commit()
+    session.refresh(job)
+    return job
+
+
+def get_export_job(session: Session, job_id: UUID, user_id: UUID) -> ExportJob:
+    job = session.get(ExportJob, job_id)
+    if job is None or job.seller_id != user_id:
+        raise HTTPException(status_code=404, detail="Export not found")
+    return job
+
+
+"""
+Per-seller counters
+"""
+
+
+def status_counter(invoice_status: InvoiceStatus | str | None) -> str:
+    if invoice_status is None:
+        return "invoices:None"
+    return f"invoices:{InvoiceStatus(invoice_status).value}"
+
+
+def bump_counters(session: Session, seller_id: UUID, deltas: dict[str, int]) -> None:
+    """
+    Add the deltas to the seller's counters inside the caller's transaction,
+    creating missing counters with an upsert.
+    """
+    dialect = session.get_bind().dialect.name
+    for name, delta in deltas.items():
+        if not delta or name == "invoices:None":
+            continue
+        if dialect in ("postgresql", "sqlite"):
+            insert = postgresql_insert if dialect == "postgresql" else sqlite_insert
+            statement = insert(SellerCounter).values(
+                seller_id=seller_id, name=name, value=delta
+            )
+            statement = statement.on_conflict_do_update(
+                index_elements=["seller_id", "name"],
+                set_={"value": SellerCounter.value + delta},
+            )
+            session.exec(statement)  # type: ignore[call-overload]
+        else:
+            counter = session.get(SellerCounter, (seller_id, name), with_for_update=True)
+            if counter is None:
+                counter = SellerCounter(seller_id=seller_id, name=name)
+            counter.value += delta
+            session.add(counter)
+
+
+def get_counters(session: Session, seller_id: UUID) -> dict[str, int]:
+    statement = select(SellerCounter).where(SellerCounter.seller_id == seller_id)
+    return {counter.name: counter.value for counter in session.exec(statement).all()}
+
+
+def get_seller_counts(session: Session, seller_id: UUID) -> SellerCounts:
+    counters = get_counters(session, seller_id)
+    return SellerCounts(
+        invoices=counters.get("invoices", 0),
+        products=counters.get("products", 0),
+        invoices_by_status={
+            name.split(":", 1)[1]: value
+            for name, value in counters.items()
+            if name.startswith("invoices:") and value
+        },
+    )
+
+
+def count_seller_invoices(
+    session: Session, user_id: UUID, filters: InvoiceFilter | None = None
+) -> int:
+    """
+    Total for paginating a listing: read from the counters when the filter
+    is at most a status, otherwise counted on the hot and archive tables.
+    """
+    only_status = filters is None or not (
+        filters.model_dump(exclude_none=True).keys() - {"status"}
+    )
+    if only_status:
+        counters = get_counters(session, user_id)
+        if filters is None or filters.status is None:
+            return counters.get("invoices", 0)
+        return counters.get(status_counter(filters.status), 0)
+
+    total = 0
+    for model in (InvoiceCreate, InvoiceArchive):
+        total += session.exec(
+            select(func.count())
+            .select_from(model)
+            .where(*_invoice_filters(model, user_id, filters))
+        ).one()
+    return total
+
+
+"""
+Per-product daily sales
+"""
+
+SalesDeltas = dict[tuple[UUID, date], tuple[int, float]]
+
+
+def invoice_sales(
+    created_date: datetime, items: Iterable[InvoiceItems], sign: int = 1
+) -> SalesDeltas:
+    """
+    What the items of an invoice add to (sign=1) or take from (sign=-1) the
+    daily sales of their products.
+    """
+    sales: SalesDeltas = {}
+    for item in items:
+        if item.product_id is None:
+            continue
+        key = (item.product_id, created_date.date())
+        quantity, revenue = sales.get(key, (0, 0.0))
+        sales[key] = (
+            quantity + sign * item.quantity,
+            revenue + sign * item.total_price,
+        )
+    return sales
+
+
+def merge_sales(*all_sales: SalesDeltas) -> SalesDeltas:
+    merged: SalesDeltas = {}
+    for sales in all_sales:
+        for key, (quantity, revenue) in sales.items():
+            total_quantity, total_revenue = merged.get(key, (0, 0.0))
+            merged[key] = (total_quantity + quantity, total_revenue + revenue)
+    return merged
+
+
+def bump_sales(session: Session, seller_id: UUID, deltas: SalesDeltas) -> None:
+    """
+    Add the deltas to the seller's daily product sales inside the caller's
+    transaction, creating missing rows with an upsert.
+    """
+    dialect = session.get_bind().dialect.name
+    for (product_id, day), (quantity, revenue) in deltas.items():
+        if not quantity and not round(revenue, 2):
+            continue
+        if dialect in ("postgresql", "sqlite"):
+            insert = postgresql_insert if dialect == "postgresql" else sqlite_insert
+            statement = insert(ProductDailySales).values(
+                seller_id=seller_id,
+                day=day,
+                product_id=product_id,
+                quantity=quantity,
+                revenue=revenue,
+            )
+            statement = statement.on_conflict_do_update(
+                index_elements=["seller_id", "day", "product_id"],
+                set_={
+                    "quantity": ProductDailySales.quantity + quantity,
+                    "revenue": ProductDailySales.revenue + revenue,
+                },
+            )
+            session.exec(statement)  # type: ignore[call-overload]
+        else:
+            row = session.get(
+                ProductDailySales, (seller_id, day, product_id), with_for_update=True
+            )
+            if row is None:
+                row = ProductDailySales(
+                    seller_id=seller_id, day=day, product_id=product_id
+                )
+            row.quantity += quantity
+            row.revenue += revenue
+            session.add(row)
+
+
+def get_product_sales(
+    session: Session, seller_id: UUID, filters: ProductSalesFilter
+) -> List[ProductSales]:
+    """
+    Best selling products of a seller over a date range, by quantity or by
+    revenue. Reads one aggregate row per product and day of the range.
+    """
+    quantity = func.sum(ProductDailySales.quantity).label("quantity")
+    revenue = func.sum(ProductDailySales.revenue).label("revenue")
+    statement = select(ProductDailySales.product_id, quantity, revenue).where(
+        ProductDailySales.seller_id == seller_id
+    )
+    if filters.date_from is not None:
+        statement = statement.where(ProductDailySales.day >= filters.date_from)
+    if filters.date_to is not None:
+        statement = statement.where(ProductDailySales.day <= filters.date_to)
+    order = [quantity, revenue]
+    if filters.order_by == "revenue":
+        order.reverse()
+    statement = (
+        statement.group_by(col(ProductDailySales.product_id))
+        .having(or_(quantity != 0, revenue != 0))
+        .order_by(
+            *(measure.desc() for measure in order), col(ProductDailySales.product_id)
+        )
+        .limit(filters.limit)
+    )
+    rows = session.exec(statement).all()
+    names = {
+        product.id: product.name
+        for product in session.exec(
+            select(Product).where(col(Product.id).in_([row[0] for row in rows]))
+        ).all()
+    }
+    return [
+        ProductSales(
+            product_id=product_id,
+            name=names.get(product_id),
+            quantity=product_quantity,
+            revenue=product_revenue or 0.0,
+        )
+        for product_id, product_quantity, product_revenue in rows
+    ]
+
+
+# a span for every call of a sampled request, see app.utils.tracing
+trace_functions(globals(), "crud")
@@ -1,44 +1,230 @@
-from sqlmodel import create_engine
-from sqlalchemy import URL
-from dotenv import load_dotenv, find_dotenv
-from os import getenv
+import time
+from bisect import bisect
+from hashlib import md5
+from uuid import UUID
+from sqlmodel import Session, create_engine
+from sqlalchemy import URL, Engine, event
+from app.config import get_settings
 
 
-path = find_dotenv()
-if not load_dotenv(path):
-    raise RuntimeError("Failed to load environment variables from .env file")
-
-DB_DRIVER = getenv("DB_DRIVER", "sqlite")
-DB_HOST = getenv("DB_HOST", "localhost")
-DB_PORT = getenv("DB_PORT", "5432")
-DB_NAME = getenv("DB_NAME", "mydatabase")
-DB_USER = getenv("DB_USERNAME", "user")
-DB_PASSWORD = getenv("DB_PASSWORD", "password")
-
-
-def get_url():
-    if DB_DRIVER == "sqlite":
-        return f"sqlite:///./{DB_NAME}.db"
+def get_url(db_name: str | None = None):
+    settings = get_settings()
+    db_name = db_name or settings.db_name
+    if settings.db_driver == "sqlite":
+        return f"sqlite:///./{db_name}.db"
     else:
         return URL().create(
-            DB_DRIVER,
-            database=DB_NAME,
-            username=DB_USER,
-            password=DB_PASSWORD,
-            host=DB_HOST,
-            port=DB_PORT,
+            settings.db_driver,
+            database=db_name,
+            username=settings.db_user,
+            password=settings.db_password,
+            host=settings.db_host,
+            port=int(settings.db_port),
         )
 
 
-def get_engine():
+def enable_sqlite_foreign_keys(engine: Engine) -> Engine:
+    """
+    SQLite only enforces foreign keys, and their ON DELETE CASCADE, when
+    asked to on every connection.
+    """
+
+    @event.listens_for(engine, "connect")
+    def _foreign_keys(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA foreign_keys=ON")
+        cursor.close()
+
+    return engine
 
-    _url = get_url()
+
+def get_engine(db_name: str | None = None):
+
+    _url = get_url(db_name)
 
     if "sqlite" in _url:
         _connect_args = {"check_same_thread": False}
-        return create_engine(_url, connect_args=_connect_args)
+        engine = create_engine(_url, connect_args=_connect_args)
+        return enable_sqlite_foreign_keys(engine)
     else:
         return create_engine(_url)
 
 
-engine = get_engine()
+class ShardRouter:
+    """
+    Maps a seller to the engine holding their products and invoices.
+
+    Sellers are placed on a consistent hash ring, so adding a shard only
+    moves the sellers that land on the new shard's points. The
+    `SellerShard` directory on the primary database overrides the ring for
+    sellers that have been moved by hand (see `app.utils.shards`).
+    Sellers, the directory and the invoice index always live on shard 0.
+
+    Each worker caches directory entries for `directory_ttl` seconds, so a
+    move is seen by every worker within that time.
+    """
+
+    def __init__(
+        self, engines: list[Engine], replicas: int = 64, directory_ttl: float = 5
+    ):
+        if not engines:
+            raise ValueError("At least one shard engine is required")
+        self.engines = engines
+        self._ring = sorted(
+            (self._hash(f"{shard}:{replica}"), shard)
+            for shard in range(len(engines))
+            for replica in range(replicas)
+        )
+        self._ring_keys = [point for point, _ in self._ring]
+        self.directory_ttl = directory_ttl
+        # seller -> (expiry, shard, moving)
+        self._directory: dict[UUID, tuple[float, int, bool]] = {}
+
+    @staticmethod
+    def _hash(key: str) -> int:
+        return int.from_bytes(md5(key.encode()).digest()[:8], "big")
+
+    @property
+    def primary(self) -> Engine:
+        return self.engines[0]
+
+    @property
+    def sharded(self) -> bool:
+        return len(self.engines) > 1
+
+    def ring_shard(self, seller_id: UUID) -> int:
+        """
+        Shard picked by the hash ring, ignoring the directory.
+        """
+        index = bisect(self._ring_keys, self._hash(str(seller_id)))
+        return self._ring[index % len(self._ring)][1]
+
+    def _entry(self, seller_id: UUID) -> tuple[float, int, bool]:
+        from app.models import SellerShard
+
+        cached = self._directory.get(seller_id)
+        if cached is None or cached[0] <= time.monotonic():
+            with Session(self.primary) as session:
+                entry = session.get(SellerShard, seller_id)
+            cached = self._directory[seller_id] = (
+                time.monotonic() + self.directory_ttl,
+                entry.shard if entry else self.ring_shard(seller_id),
+                bool(entry and entry.moving),
+            )
+        return cached
+
+    def shard_for_seller(self, seller_id: UUID) -> int:
+        if not self.sharded:
+            return 0
+        return self._entry(seller_id)[1]
+
+    def is_moving(self, seller_id: UUID) -> bool:
+        """
+        Whether the seller is being moved to another shard; their writes
+        must wait until the move ends.
+        """
+        return self.sharded and self._entry(seller_id)[2]
+
+    def engine_for_seller(self, seller_id: UUID) -> Engine:
+        return self.engines[self.shard_for_seller(seller_id)]
+
+    def assign(self, seller_id: UUID, shard: int, moving: bool = False) -> None:
+        """
+        Pin a seller to a shard in the directory. Other workers see the
+        change once their cached entry expires.
+        """
+        from app.models import SellerShard
+
+        with Session(self.primary) as session:
+            session.merge(SellerShard(seller_id=seller_id, shard=shard, moving=moving))
+            session.commit()
+        self.forget(seller_id)
+
+    def forget(self, seller_id: UUID) -> None:
+        """
+        Drop the cached directory entry so the next lookup re-reads it.
+        """
+        self._directory.pop(seller_id, None)
+
+    def index_invoices(self, invoice_ids: list[UUID], shard: int) -> None:
+        """
+        Record which shard holds the given invoices.
+        """
+        from app.models import InvoiceShard
+
+        if not self.sharded or not invoice_ids:
+            return
+        with Session(self.primary) as session:
+            for invoice_id in invoice_ids:
+                session.merge(InvoiceShard(invoice_id=invoice_id, shard=shard))
+            session.commit()
+
+    def shard_for_invoice(self, invoice_id: UUID) -> int | None:
+        """
+        Look an invoice up in the global index. Invoices written before the
+        index existed are found by probing every shard, and indexed on the way.
+        """
+        from app.models import InvoiceCreate, InvoiceShard
+
+        if not self.sharded:
+            return 0
+        with Session(self.primary) as session:
+            entry = session.get(InvoiceShard, invoice_id)
+        if entry:
+            return entry.shard
+        for shard, engine in enumerate(self.engines):
+            with Session(engine) as session:
+                if session.get(InvoiceCreate, invoice_id):
+                    self.index_invoices([invoice_id], shard)
+                    return shard
+        return None
+
+    def engine_for_invoice(self, invoice_id: UUID) -> Engine:
+        shard = self.shard_for_invoice(invoice_id)
+        return self.engines[shard if shard is not None else 0]
+
+
+class Database:
+    """
+    Holds the shard router and its engines. Nothing is created until first
+    use, so importing the app has no side effects; the lifespan in
+    `app.lifespan` builds it at startup and disposes it at shutdown.
+    Tests can swap the engines with `override`.
+    """
+
+    def __init__(self) -> None:
+        self._router: ShardRouter | None = None
+
+    @property
+    def initialized(self) -> bool:
+        return self._router is not None
+
+    @property
+    def router(self) -> ShardRouter:
+        if self._router is None:
+            settings = get_settings()
+            engines = [get_engine()] + [get_engine(name) for name in settings.db_shards]
+            self._router = ShardRouter(
+                engines, directory_ttl=settings.shard_directory_ttl
+            )
+        return self._router
+
+    @property
+    def engine(self) -> Engine:
+        """
+        The primary engine (shard 0).
+        """
+        return self.router.primary
+
+    def override(self, router: ShardRouter) -> None:
+        self.dispose()
+        self._router = router
+
+    def dispose(self) -> None:
+        if self._router is not None:
+            for engine in self._router.engines:
+                engine.dispose()
+        self._router = None
+
+
+database = Database()
@@ -0,0 +1,59 @@
+from contextlib import asynccontextmanager
+from fastapi import FastAPI
+from sqlalchemy import text
+from starlette.concurrency import run_in_threadpool
+from app.config import get_settings
+from app.db import database
+
+
+def warm_up(app: FastAPI) -> None:
+    """
+    Pay the first-request costs before the readiness probe flips: open pool
+    connections on every shard, load the bcrypt backend and build the
+    pydantic / OpenAPI schemas.
+    """
+    from app.utils.security import get_password_hash, verify_password
+
+    settings = get_settings()
+    for engine in database.router.engines:
+        connections = [engine.connect() for _ in range(settings.warmup_connections)]
+        for connection in connections:
+            connection.execute(text("SELECT 1"))
+            connection.close()
+
+    verify_password("warm-up", get_password_hash("warm-up"))
+    app.openapi()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Check the configuration and build the engines at startup instead of at
+    import time, optionally warm up, and dispose the engines at shutdown.
+    """
+    from app.api.deps import create_db_and_tables
+    from app.utils.cache import get_cache
+    from app.utils.events import get_event_hub
+    from app.utils.tracing import get_tracer
+
+    app.state.ready = False
+    settings = get_settings()
+    if not settings.secret_key:
+        # refuse to start, rather than failing every authenticated request
+        raise RuntimeError("APP_SECRET_KEY is not set in the environment variables")
+    if settings.db_create_tables:
+        await run_in_threadpool(create_db_and_tables)
+    else:
+        database.router  # build the engines now rather than on the first request
+    if settings.warmup:
+        await run_in_threadpool(warm_up, app)
+    get_event_hub()  # start listening for other workers' events
+    get_cache()  # and for their cache invalidations
+    get_tracer()  # install the SQL hooks before the first query
+    app.state.ready = True
+    yield
+    app.state.ready = False
+    get_event_hub().close()
+    get_cache().close()
+    get_tracer().close()
+    database.dispose()
@@ -1,9 +1,15 @@
-from fastapi import FastAPI, __version__
-from fastapi.responses import HTMLResponse
+import secrets
+from fastapi import FastAPI, Request, __version__
+from fastapi.responses import HTMLResponse, JSONResponse
 from fastapi.middleware.cors import CORSMiddleware  # Import middleware for CORS handling
 from app.api.api_main import api_routers
+from app.config import get_settings
+from app.lifespan import lifespan
+from app.utils.load_shedding import LoadSheddingMiddleware
+from app.utils.tracing import TracingMiddleware
 
-app = FastAPI()
+# Engines, settings and the optional warm-up are set up in the lifespan
+app = FastAPI(lifespan=lifespan)
 
 # Include your API routers under the "/api/v1" prefix
 app.include_router(api_routers, prefix="/api/v1")
@@ -21,8 +27,17 @@ app.add_middleware(
     allow_credentials=True,     # Allow cookies, authorization headers, etc.
     allow_methods=["*"],        # Allow all HTTP methods (GET, POST, etc.)
     allow_headers=["*"],        # Allow all headers
+    # Let the frontend read pagination totals and the trace of a request
+    expose_headers=["X-Total-Count", "traceparent"],
 )
 
+# Span per sampled request, see TRACE_SAMPLE_RATE
+app.add_middleware(TracingMiddleware)
+
+# Answer 503 to the low priority routes first when the worker falls behind,
+# see SHED_TARGET_MS. Added last so it runs first, before any other work.
+app.add_middleware(LoadSheddingMiddleware)
+
 # Simple HTML page returned on root URL "/"
 html = f"""
 <!DOCTYPE html>
@@ -93,3 +108,45 @@ html = f"""
 @app.get("/")
 async def root():
     return HTMLResponse(html)
+
+
+# Liveness and readiness probes for the orchestrator
+@app.get("/health/live")
+async def live():
+    return {"status": "alive"}
+
+
+# Per-worker internals for operators holding STATS_TOKEN, hidden from others
+@app.get("/health/stats", include_in_schema=False)
+async def stats(request: Request):
+    token = get_settings().stats_token
+    scheme, _, given = request.headers.get("authorization", "").partition(" ")
+    if (
+        not token
+        or scheme.lower() != "bearer"
+        or not secrets.compare_digest(given.encode(), token.encode())
+    ):
+        return JSONResponse({"detail": "Not Found"}, status_code=404)
+
+    from app.utils.catalog import get_catalog_cache
+    from app.utils.cache import get_cache
+    from app.utils.events import get_event_hub
+    from app.utils.limiter import get_limiter
+    from app.utils.load_shedding import get_load_shedder
+    from app.utils.tracing import get_tracer
+
+    return {
+        "catalog_cache": get_catalog_cache().stats(),
+        "cache": get_cache().stats(),
+        "events": get_event_hub().stats(),
+        "limiter": get_limiter().stats(),
+        "load_shedding": get_load_shedder().stats(),
+        "tracing": get_tracer().stats(),
+    }
+
+
+@app.get("/health/ready")
+async def ready(request: Request):
+    if not getattr(request.app.state, "ready", False):
+        return JSONResponse({"status": "starting"}, status_code=503)
+    return {"status": "ready"}
@@ -1,8 +1,11 @@
-from datetime import datetime
-from typing import Annotated
+from datetime import date, datetime
+from enum import Enum
+from typing import Annotated, Any, Literal
 from fastapi import Query
 from pydantic import BaseModel
+from sqlalchemy import BigInteger, Index, text
 from sqlmodel import SQLModel, Field, Relationship
+from app.utils.types import Cents, CodedEnum
 import uuid
 
 
@@ -57,19 +60,80 @@ class PublicSeller(BaseSeller):
     products: list["Product"] = []  # type: ignore[valid-type]
 
 
+class _SpelledEnum(str, Enum):
+    @classmethod
+    def _missing_(cls, value):
+        # accept the free-form spellings older clients send ("paid", "BANK_TRANSFER")
+        if isinstance(value, str):
+            key = value.replace("_", " ").strip().lower()
+            for member in cls:
+                if member.value.lower() == key:
+                    return member
+        return None
+
+
+class InvoiceStatus(_SpelledEnum):
+    """
+    Status of an invoice. Any case is accepted, with "_" for spaces ("paid",
+    "PARTIALLY_PAID"); other values are rejected with 422.
+    """
+
+    # stored as the 1-based position of the member: only append new ones
+    PENDING = "Pending"
+    PAID = "Paid"
+    PARTIALLY_PAID = "Partially Paid"
+    OVERDUE = "Overdue"
+    CANCELLED = "Cancelled"
+    REFUNDED = "Refunded"
+    VOID = "Void"
+    DRAFT = "Draft"
+
+
+class PaymentMode(_SpelledEnum):
+    """
+    How an invoice is paid. Any case is accepted, with "_" for spaces
+    ("card", "BANK_TRANSFER"); other values are rejected with 422, send
+    "Other" for a mode not listed.
+    """
+
+    # stored as the 1-based position of the member: only append new ones
+    CASH = "Cash"
+    CARD = "Card"
+    BANK_TRANSFER = "Bank Transfer"
+    ONLINE = "Online"
+    CHEQUE = "Cheque"
+    OTHER = "Other"
+
+
 class InvoiceBase(SQLModel):
     customer_name: str | None = None
     customer_phone_number: str | None = None
     customer_email: str | None = None
     customer_address: str | None = None
-    status: str | None = Field(default="Pending")
-    payment_mode: str | None = Field(default="Cash")
-    total_price: float
+    status: InvoiceStatus | None = Field(
+        default=InvoiceStatus.PENDING, sa_type=CodedEnum(InvoiceStatus)
+    )
+    payment_mode: PaymentMode | None = Field(
+        default=PaymentMode.CASH, sa_type=CodedEnum(PaymentMode)
+    )
+    total_price: float = Field(sa_type=Cents)
+
+
+class InvoiceItemBase(SQLModel):
+    product_id: uuid.UUID | None = Field(
+        default=None, foreign_key="product.id", nullable=True
+    )
+    quantity: int
+    total_price: float = Field(sa_type=Cents)
+
+
+class InvoiceItemInput(InvoiceItemBase):
+    pass
 
 
 class InvoiceInput(InvoiceBase):
 
-    invoiceitems: list["InvoiceItems"] = []  # type: ignore[valid-type]
+    invoiceitems: list[InvoiceItemInput] = []
 
     model_config = {
         "json_schema_extra": {
@@ -101,31 +165,209 @@ class InvoiceInput(InvoiceBase):
     }
 
 
+LIVE_INVOICE = text("deleted_at IS NULL")
+DELETED_INVOICE = text("deleted_at IS NOT NULL")
+
+
 class InvoiceCreate(InvoiceBase, table=True):
+    # Listing indexes, all led by seller_id. The first one carries the filter
+    # columns so any filter combination stays a range scan on (seller, date)
+    # evaluated inside the index; the others serve selective equality filters.
+    # They only cover live invoices, so reads must filter on deleted_at IS NULL
+    # to use them; tombstones are found for the purge by their own index.
+    __table_args__ = (
+        Index(
+            "ix_invoicecreate_seller_created",
+            "seller_id",
+            "created_date",
+            "status",
+            "payment_mode",
+            "total_price",
+            sqlite_where=LIVE_INVOICE,
+            postgresql_where=LIVE_INVOICE,
+        ),
+        Index(
+            "ix_invoicecreate_seller_status",
+            "seller_id",
+            "status",
+            "created_date",
+            sqlite_where=LIVE_INVOICE,
+            postgresql_where=LIVE_INVOICE,
+        ),
+        Index(
+            "ix_invoicecreate_seller_payment",
+            "seller_id",
+            "payment_mode",
+            "created_date",
+            sqlite_where=LIVE_INVOICE,
+            postgresql_where=LIVE_INVOICE,
+        ),
+        Index(
+            "ix_invoicecreate_deleted_at",
+            "deleted_at",
+            sqlite_where=DELETED_INVOICE,
+            postgresql_where=DELETED_INVOICE,
+        ),
+        # the public link looks invoices up by number
+        Index("ix_invoicecreate_seller_number", "seller_id", "number", unique=True),
+    )
+
     id: uuid.UUID | None = Field(primary_key=True, default_factory=uuid.uuid4)
-    seller_id: uuid.UUID = Field(foreign_key="createseller.id", index=True)
+    seller_id: uuid.UUID = Field(foreign_key="createseller.id")
     created_date: datetime = Field(default_factory=datetime.now)
+    # sequential per seller and year, see app.utils.invoice_numbers
+    number: str | None = Field(default=None, max_length=32)
+    # tombstone of a soft deleted invoice, purged by app.utils.purge
+    deleted_at: datetime | None = None
+
+    # items are removed by the ON DELETE CASCADE of their foreign key, the
+    # ORM never loads them to delete an invoice
+    invoiceitems: list["InvoiceItems"] = Relationship(  # type: ignore[valid-type]
+        back_populates="invoice", passive_deletes="all"
+    )
+
+
+class InvoiceImport(InvoiceInput):
+    """
+    An invoice read from a CSV import, which may keep its original date.
+    """
 
-    invoiceitems: list["InvoiceItems"] = Relationship(back_populates="invoice")  # type: ignore[valid-type]
+    created_date: datetime | None = None
 
 
-class InvoiceItems(SQLModel, table=True):
+class InvoiceItems(InvoiceItemBase, table=True):
+    __table_args__ = (
+        Index("ix_invoiceitems_product_invoice", "product_id", "invoice_id"),
+    )
+
     id: uuid.UUID | None = Field(primary_key=True, default_factory=uuid.uuid4)
     invoice_id: uuid.UUID = Field(
         foreign_key="invoicecreate.id", index=True, nullable=False, ondelete="CASCADE"
     )
-    product_id: str | None = Field(foreign_key="product.id", nullable=True)
-    quantity: int
-    total_price: float
     invoice: InvoiceCreate = Relationship(back_populates="invoiceitems")
 
 
+class InvoiceArchive(InvoiceBase, table=True):
+    """
+    Invoices moved out of `InvoiceCreate` by the archival job. On Postgres
+    the table is range partitioned by month on `created_date`, which is why
+    the date is part of the primary key. Archived invoices are read-only.
+    """
+
+    __table_args__ = (
+        Index("ix_invoicearchive_seller_created", "seller_id", "created_date"),
+        # not unique: a unique index of a partitioned table must hold the
+        # partition key, the numbers were unique in invoicecreate anyway
+        Index("ix_invoicearchive_seller_number", "seller_id", "number"),
+        {"postgresql_partition_by": "RANGE (created_date)"},
+    )
+
+    id: uuid.UUID = Field(primary_key=True)
+    created_date: datetime = Field(primary_key=True)
+    seller_id: uuid.UUID = Field(foreign_key="createseller.id")
+    number: str | None = Field(default=None, max_length=32)
+
+
+class InvoiceItemsArchive(SQLModel, table=True):
+    __table_args__ = (
+        Index("ix_invoiceitemsarchive_product_invoice", "product_id", "invoice_id"),
+    )
+
+    id: uuid.UUID = Field(primary_key=True)
+    invoice_id: uuid.UUID = Field(index=True)
+    product_id: uuid.UUID | None = None
+    quantity: int
+    total_price: float = Field(sa_type=Cents)
+
+
 class InvoicePublic(InvoiceBase):
     id: uuid.UUID
+    number: str | None = None
     created_date: datetime
     invoiceitems: list[InvoiceItems] = []
 
 
+class InvoiceFilter(SQLModel):
+    status: InvoiceStatus | None = None
+    payment_mode: PaymentMode | None = None
+    created_from: datetime | None = None
+    created_to: datetime | None = None
+    min_total: float | None = None
+    max_total: float | None = None
+
+
+class InvoiceItemUpdate(SQLModel):
+    id: uuid.UUID | None = None
+    product_id: uuid.UUID | None = None
+    quantity: int | None = None
+    total_price: float | None = None
+
+
+class InvoiceUpdate(SQLModel):
+    """
+    Partial invoice update: only the header fields that are sent are
+    written. When `invoiceitems` is sent it is the new set of line items,
+    matched by id: items without an id are inserted, missing ones deleted,
+    and only the sent fields of the others are updated.
+    """
+
+    id: uuid.UUID
+    customer_name: str | None = None
+    customer_phone_number: str | None = None
+    customer_email: str | None = None
+    customer_address: str | None = None
+    status: InvoiceStatus | None = None
+    payment_mode: PaymentMode | None = None
+    total_price: float | None = None
+    invoiceitems: list[InvoiceItemUpdate] | None = None
+
+
+class InvoiceStatusUpdate(SQLModel):
+    """
+    Bulk status transition. Either `ids` or at least one filter field must
+    be given; they are combined when both are.
+    """
+
+    ids: list[uuid.UUID] | None = None
+    current_status: InvoiceStatus | None = None
+    created_from: datetime | None = None
+    created_to: datetime | None = None
+    status: InvoiceStatus
+    payment_mode: PaymentMode | None = None
+
+    model_config = {
+        "json_schema_extra": {
+            "examples": [
+                {
+                    "current_status": "Pending",
+                    "created_from": "2023-01-01T00:00:00",
+                    "created_to": "2023-01-02T00:00:00",
+                    "status": "Paid",
+                    "payment_mode": "Card",
+                }
+            ]
+        }
+    }
+
+
+class InvoiceStatusResult(BaseModel):
+    updated: list[uuid.UUID]
+
+
+class ImportRowError(BaseModel):
+    line: int
+    error: str
+
+
+class ImportResult(BaseModel):
+    rows: int = 0
+    imported: int = 0
+    failed: int = 0
+    chunks: int = 0
+    errors: list[ImportRowError] = []
+    done: bool = False
+
+
 class InputProduct(SQLModel):
     name: str = Field(index=True)
     description: str | None = None
@@ -163,6 +405,169 @@ class PublicProduct(InputProduct):
     id: uuid.UUID
 
 
+class SellerCounter(SQLModel, table=True):
+    """
+    Per-seller row counts ("invoices", "products", "invoices:<status>") kept
+    in step by the crud writes, so pagination totals need no COUNT(*).
+    Lives on the seller's shard; `app.utils.counters` repairs any drift.
+    """
+
+    seller_id: uuid.UUID = Field(primary_key=True)
+    name: str = Field(primary_key=True, max_length=32)
+    value: int = 0
+
+
+class SellerCounts(BaseModel):
+    invoices: int
+    products: int
+    invoices_by_status: dict[str, int]
+
+
+class ProductDailySales(SQLModel, table=True):
+    """
+    Units and revenue of a product per day of invoice creation, kept in step
+    by the crud invoice writes so sales reports read one row per product and
+    day instead of every line item. Every invoice counts, whatever its
+    status. Lives on the seller's shard; `app.utils.sales` rebuilds it.
+    """
+
+    seller_id: uuid.UUID = Field(primary_key=True)
+    day: date = Field(primary_key=True)
+    product_id: uuid.UUID = Field(primary_key=True)
+    quantity: int = 0
+    revenue: float = Field(default=0, sa_type=Cents)
+
+
+class ProductSalesFilter(SQLModel):
+    date_from: date | None = None
+    date_to: date | None = None
+    order_by: Literal["quantity", "revenue"] = "quantity"
+    limit: int = Field(default=10, ge=1, le=100)
+
+
+class ProductSales(BaseModel):
+    product_id: uuid.UUID
+    name: str | None
+    quantity: int
+    revenue: float
+
+
+class SellerProfile(BaseSeller):
+    id: uuid.UUID
+
+
+class MonthTotals(BaseModel):
+    month: date
+    invoices: int
+    total: float
+    paid: float
+
+
+class Dashboard(BaseModel):
+    profile: SellerProfile
+    counts: SellerCounts
+    month: MonthTotals
+    recent_invoices: list[InvoicePublic]
+
+
+class InvoiceEvent(BaseModel):
+    type: Literal["created", "updated", "deleted", "status", "imported"]
+    invoice_ids: list[uuid.UUID]
+    at: datetime = Field(default_factory=datetime.now)
+
+
+class ExportFormat(str, Enum):
+    # stored as the 1-based position of the member: only append new ones
+    CSV = "csv"
+    JSON = "json"
+
+
+class ExportStatus(str, Enum):
+    # stored as the 1-based position of the member: only append new ones
+    QUEUED = "Queued"
+    RUNNING = "Running"
+    DONE = "Done"
+    FAILED = "Failed"
+
+
+class ExportRequest(SQLModel):
+    format: ExportFormat = Field(
+        default=ExportFormat.CSV, sa_type=CodedEnum(ExportFormat)
+    )
+    created_from: datetime | None = None
+    created_to: datetime | None = None
+
+
+class ExportJob(ExportRequest, table=True):
+    """
+    Invoice export run by `app.utils.exports` into a gzip file. The
+    checkpoint (last exported invoice and file size) is saved after every
+    batch, so a restarted worker truncates the file there and carries on.
+    Lives on the seller's shard.
+    """
+
+    id: uuid.UUID | None = Field(primary_key=True, default_factory=uuid.uuid4)
+    seller_id: uuid.UUID = Field(index=True)
+    status: ExportStatus = Field(
+        default=ExportStatus.QUEUED, sa_type=CodedEnum(ExportStatus), index=True
+    )
+    total: int | None = None
+    exported: int = 0
+    checkpoint_date: datetime | None = None
+    checkpoint_id: uuid.UUID | None = None
+    checkpoint_offset: int = Field(default=0, sa_type=BigInteger)
+    # token of the worker's current claim, checked before every write
+    lease: uuid.UUID | None = None
+    error: str | None = None
+    created_at: datetime = Field(default_factory=datetime.now)
+    updated_at: datetime = Field(default_factory=datetime.now)
+
+
+class ExportJobPublic(ExportRequest):
+    id: uuid.UUID
+    status: ExportStatus
+    total: int | None
+    exported: int
+    error: str | None
+    created_at: datetime
+    updated_at: datetime
+
+
+class BatchItem(BaseModel):
+    method: Literal["GET", "POST", "PUT", "PATCH", "DELETE"] = "GET"
+    path: str
+    query: dict[str, Any] = {}
+    body: Any = None
+
+
+class BatchResult(BaseModel):
+    status: int
+    headers: dict[str, str]
+    body: Any
+
+
+class SellerShard(SQLModel, table=True):
+    """
+    Directory entry pinning a seller to a shard, overriding the hash ring.
+    Lives on the primary database only.
+    """
+
+    seller_id: uuid.UUID = Field(primary_key=True)
+    shard: int
+    # set while `app.utils.shards` copies the seller away from `shard`
+    moving: bool = False
+
+
+class InvoiceShard(SQLModel, table=True):
+    """
+    Global invoice id -> shard index used by the public invoice link.
+    Lives on the primary database only.
+    """
+
+    invoice_id: uuid.UUID = Field(primary_key=True)
+    shard: int = Field(index=True)
+
+
 class Token(BaseModel):
     access_token: str
     token_type: str = "bearer"
@@ -0,0 +1,136 @@
+"""
+Measure how long requests hold pooled connections, under a mix of cached
+and uncached traffic.
+
+    python -m app.tests.bench_sessions [--requests N] [--concurrency N]
+        [--pool N] [--cached PERCENT]
+
+Runs the same traffic twice against a fresh SQLite file behind a small
+pool: once holding the request session's connection until the end of the
+request (`eager`), once releasing it as soon as the current user is loaded
+(`lazy`, what `RequestSession` does). Cached requests are dashboard hits;
+uncached ones read the seller's counters through a second session, so an
+eager run with fewer connections than concurrent requests can exhaust the
+pool and fail requests after `--pool-timeout` seconds.
+"""
+
+import argparse
+import asyncio
+import random
+import statistics
+import tempfile
+import time
+from pathlib import Path
+import httpx
+from sqlalchemy import create_engine, event
+from sqlmodel import SQLModel
+from app.api.deps import RequestSession
+from app.db import ShardRouter, database, enable_sqlite_foreign_keys
+from app.main import app
+
+
+class PoolMonitor:
+    """
+    Connection checkouts of an engine: how many at once, and for how long.
+    """
+
+    def __init__(self, engine):
+        self.checked_out = 0
+        self.peak = 0
+        self.checkouts = 0
+        self.held = 0.0
+        self._since: dict[int, float] = {}
+        event.listen(engine, "checkout", self._checkout)
+        event.listen(engine, "checkin", self._checkin)
+
+    def _checkout(self, dbapi_connection, record, proxy):
+        self.checkouts += 1
+        self.checked_out += 1
+        self.peak = max(self.peak, self.checked_out)
+        self._since[id(record)] = time.perf_counter()
+
+    def _checkin(self, dbapi_connection, record):
+        self.checked_out -= 1
+        self.held += time.perf_counter() - self._since.pop(id(record), time.perf_counter())
+
+
+async def login(client: httpx.AsyncClient) -> dict[str, str]:
+    user = {"email": "bench@example.com", "phone_number": "09120000999"}
+    await client.post("/api/v1/signup", json={**user, "password": "benchpass123"})
+    response = await client.post(
+        "/api/v1/login/access-token",
+        params={"email": user["email"], "password": "benchpass123"},
+    )
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+async def traffic(args: argparse.Namespace, directory: Path, mode: str) -> None:
+    engine = enable_sqlite_foreign_keys(
+        create_engine(
+            f"sqlite:///{directory / mode}.db",
+            pool_size=args.pool,
+            max_overflow=0,
+            pool_timeout=args.pool_timeout,
+            connect_args={"check_same_thread": False},
+        )
+    )
+    SQLModel.metadata.create_all(engine)
+    database.override(ShardRouter([engine]))
+    transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        headers = await login(client)
+        await client.get("/api/v1/user/dashboard", headers=headers)  # fill the cache
+        monitor = PoolMonitor(engine)
+        rng = random.Random(0)
+        paths = [
+            "/api/v1/user/dashboard"
+            if rng.random() * 100 < args.cached
+            else "/api/v1/user/counts"
+            for _ in range(args.requests)
+        ]
+        gate = asyncio.Semaphore(args.concurrency)
+        latencies: list[float] = []
+        failed = 0
+
+        async def call(path: str) -> None:
+            nonlocal failed
+            async with gate:
+                start = time.perf_counter()
+                response = await client.get(path, headers=headers)
+                latencies.append(time.perf_counter() - start)
+                failed += response.status_code != 200
+
+        start = time.perf_counter()
+        await asyncio.gather(*map(call, paths))
+        elapsed = time.perf_counter() - start
+    latencies.sort()
+    print(
+        f"{mode:>5}: {args.requests / elapsed:7.0f} req/s, "
+        f"p50 {statistics.median(latencies) * 1000:6.1f} ms, "
+        f"p95 {latencies[int(len(latencies) * 0.95)] * 1000:6.1f} ms, "
+        f"connection held {monitor.held / args.requests * 1000:5.2f} ms/request, "
+        f"{monitor.checkouts} checkouts, peak {monitor.peak}/{args.pool}, "
+        f"{failed} failed"
+    )
+    database.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="python -m app.tests.bench_sessions")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--pool", type=int, default=16)
+    parser.add_argument("--pool-timeout", type=int, default=5)
+    parser.add_argument("--cached", type=int, default=80, help="percent of requests")
+    args = parser.parse_args()
+
+    release = RequestSession.release
+    with tempfile.TemporaryDirectory() as directory:
+        RequestSession.release = lambda self: None  # type: ignore[method-assign]
+        asyncio.run(traffic(args, Path(directory), "eager"))
+        RequestSession.release = release  # type: ignore[method-assign]
+        asyncio.run(traffic(args, Path(directory), "lazy"))
+
+
+if __name__ == "__main__":
+    main()
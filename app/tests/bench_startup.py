@@ -0,0 +1,53 @@
+"""
+Track cold start cost of the application.
+
+    python -m app.tests.bench_startup [--runs N] [--top N]
+
+Times `import app.main` in fresh interpreters, then prints the slowest
+modules reported by `python -X importtime`.
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+
+
+def time_import(runs: int) -> list[float]:
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", "import app.main"], check=True)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def slowest_imports(top: int) -> list[tuple[int, str]]:
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.main"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    modules = []
+    for line in result.stderr.splitlines()[1:]:
+        _, cumulative, name = line.split("|")
+        modules.append((int(cumulative), name.strip()))
+    return sorted(modules, reverse=True)[:top]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog="python -m app.tests.bench_startup")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    timings = time_import(args.runs)
+    print(
+        f"import app.main: median {statistics.median(timings) * 1000:.1f} ms, "
+        f"min {min(timings) * 1000:.1f} ms over {args.runs} runs"
+    )
+    print("slowest imports (cumulative us):")
+    for cumulative, name in slowest_imports(args.top):
+        print(f"{cumulative:>10}  {name}")
@@ -0,0 +1,359 @@
+"""
+Fill the database with synthetic sellers, products, invoices and line items
+for benchmarks.
+
+    python -m app.tests.generate_bench_data [--sellers N] [--products N]
+        [--invoices N] [--max-items N] [--skew S] [--days N] [--seed N]
+
+Sizes follow a Zipf law of exponent `--skew`: a few sellers hold most of the
+products and invoices and a long tail holds a handful each, and within a
+seller a few products make most of the sales. The same seed gives the same
+data on the same day. Rows bypass the ORM: they go through COPY on
+PostgreSQL and executemany on SQLite, on the shard of their seller. The
+counters and daily product sales are written along, so the data is ready to
+serve. Invoices are numbered per seller and year in date order, and the
+`invoice_numbers:<year>` counters are set to the last number, so invoices
+created afterwards continue the sequence. Every seller's password is
+`--password`.
+"""
+
+import argparse
+import csv
+import io
+import random
+import time
+import uuid
+from collections import Counter
+from datetime import date, datetime, timedelta
+from enum import Enum
+from itertools import accumulate
+from typing import Iterable
+from sqlalchemy import Engine, Table
+from app.crud import status_counter
+from app.db import ShardRouter, database
+from app.models import (
+    CreateSeller,
+    InvoiceCreate,
+    InvoiceItems,
+    InvoiceShard,
+    InvoiceStatus,
+    PaymentMode,
+    Product,
+    ProductDailySales,
+    SellerCounter,
+)
+from app.utils.invoice_numbers import counter_name, get_invoice_numbers
+from app.utils.security import get_password_hash
+
+STATUS_WEIGHTS = {
+    InvoiceStatus.PAID: 55,
+    InvoiceStatus.PENDING: 20,
+    InvoiceStatus.PARTIALLY_PAID: 5,
+    InvoiceStatus.OVERDUE: 8,
+    InvoiceStatus.CANCELLED: 5,
+    InvoiceStatus.REFUNDED: 2,
+    InvoiceStatus.VOID: 1,
+    InvoiceStatus.DRAFT: 4,
+}
+PAYMENT_WEIGHTS = {
+    PaymentMode.CASH: 30,
+    PaymentMode.CARD: 40,
+    PaymentMode.BANK_TRANSFER: 15,
+    PaymentMode.ONLINE: 12,
+    PaymentMode.CHEQUE: 2,
+    PaymentMode.OTHER: 1,
+}
+
+# columns written per table, in the order of the generated tuples
+COLUMNS: dict[Table, tuple[str, ...]] = {
+    CreateSeller.__table__: (  # type: ignore[attr-defined]
+        "id", "name", "email", "phone_number", "password", "store_name"
+    ),
+    Product.__table__: (  # type: ignore[attr-defined]
+        "id", "seller_id", "name", "price"
+    ),
+    InvoiceCreate.__table__: (  # type: ignore[attr-defined]
+        "id", "seller_id", "created_date", "customer_name", "status",
+        "payment_mode", "total_price", "number",
+    ),
+    InvoiceItems.__table__: (  # type: ignore[attr-defined]
+        "id", "invoice_id", "product_id", "quantity", "total_price"
+    ),
+    InvoiceShard.__table__: ("invoice_id", "shard"),  # type: ignore[attr-defined]
+    SellerCounter.__table__: ("seller_id", "name", "value"),  # type: ignore[attr-defined]
+    ProductDailySales.__table__: (  # type: ignore[attr-defined]
+        "seller_id", "day", "product_id", "quantity", "revenue"
+    ),
+}
+
+
+class BulkWriter:
+    """
+    Buffers rows per table and writes them in batches straight through the
+    driver. Tables are flushed in the order they were first written to, so
+    parents always land before their children.
+
+    The rows must already hold what the column types store, which both
+    SQLite and PostgreSQL's COPY accept: UUIDs as 32 hex digits, money as
+    integer cents, enums as their codes, datetimes as ISO text.
+    """
+
+    def __init__(self, engine: Engine, batch_size: int):
+        self.engine = engine
+        self.batch_size = batch_size
+        self.buffers: dict[Table, list[tuple]] = {}
+        self.written: Counter[str] = Counter()
+
+    def add(self, table: Table, rows: Iterable[tuple]) -> None:
+        buffer = self.buffers.setdefault(table, [])
+        buffer.extend(rows)
+        if len(buffer) >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        connection = self.engine.raw_connection()
+        try:
+            cursor = connection.cursor()
+            sqlite = self.engine.dialect.name == "sqlite"
+            if sqlite:
+                # the data can be generated again, skip the fsyncs
+                cursor.execute("PRAGMA synchronous = OFF")
+                cursor.execute("PRAGMA cache_size = -262144")
+            for table, rows in self.buffers.items():
+                if not rows:
+                    continue
+                columns = COLUMNS[table]
+                if self.engine.dialect.name == "postgresql":
+                    data = io.StringIO()
+                    csv.writer(data).writerows(rows)
+                    data.seek(0)
+                    cursor.copy_expert(  # type: ignore[attr-defined]
+                        f"COPY {table.name} ({', '.join(columns)}) "
+                        "FROM STDIN WITH (FORMAT csv)",
+                        data,
+                    )
+                else:
+                    # in key order, the B-tree pages are filled one after the other
+                    rows.sort()
+                    cursor.executemany(
+                        f"INSERT INTO {table.name} ({', '.join(columns)}) "
+                        f"VALUES ({', '.join('?' * len(columns))})",
+                        rows,
+                    )
+                self.written[table.name] += len(rows)
+                rows.clear()
+            connection.commit()
+            if sqlite:
+                cursor.execute("PRAGMA synchronous = FULL")
+            cursor.close()
+        finally:
+            connection.close()
+
+
+def zipf_weights(count: int, skew: float) -> list[float]:
+    """
+    Cumulative weights of ranks 1..count under a Zipf law.
+    """
+    return list(accumulate(1 / rank**skew for rank in range(1, count + 1)))
+
+
+def spread(total: int, count: int, skew: float, rng: random.Random) -> list[int]:
+    """
+    Split `total` over `count` owners, the first ones getting the most.
+    """
+    weights = zipf_weights(count, skew)
+    drawn = Counter(rng.choices(range(count), cum_weights=weights, k=total))
+    return [drawn[owner] for owner in range(count)]
+
+
+def new_id(rng: random.Random) -> str:
+    return "%032x" % rng.getrandbits(128)
+
+
+def code(member: Enum) -> int:
+    """
+    The stored code of an enum member, see `CodedEnum`.
+    """
+    return list(type(member)).index(member) + 1
+
+
+class Generator:
+    def __init__(self, args: argparse.Namespace, router: ShardRouter | None = None):
+        self.args = args
+        self.router = router or database.router
+        self.rng = random.Random(args.seed)
+        self.writers: dict[Engine, BulkWriter] = {}
+        self.end = datetime.combine(date.today(), datetime.min.time())
+        self.statuses = [code(member) for member in STATUS_WEIGHTS]
+        self.counter_names = {code(member): status_counter(member) for member in STATUS_WEIGHTS}
+        self.status_weights = list(accumulate(STATUS_WEIGHTS.values()))
+        self.payments = [code(member) for member in PAYMENT_WEIGHTS]
+        self.payment_weights = list(accumulate(PAYMENT_WEIGHTS.values()))
+        self.item_weights = zipf_weights(args.max_items, 1.0)
+
+    def writer(self, engine: Engine) -> BulkWriter:
+        if engine not in self.writers:
+            self.writers[engine] = BulkWriter(engine, self.args.batch_size)
+        return self.writers[engine]
+
+    def sellers(self) -> list[str]:
+        args, rng = self.args, self.rng
+        password = get_password_hash(args.password)
+        ids = [new_id(rng) for _ in range(args.sellers)]
+        self.writer(self.router.primary).add(
+            CreateSeller.__table__,  # type: ignore[attr-defined]
+            (
+                (
+                    seller_id,
+                    f"Bench Seller {index}",
+                    f"seller{index}.{args.seed}@bench.example.com",
+                    f"+98{args.seed % 100:02d}{index:09d}",
+                    password,
+                    f"Bench Store {index}",
+                )
+                for index, seller_id in enumerate(ids)
+            ),
+        )
+        self.writer(self.router.primary).flush()
+        return ids
+
+    def seller_data(self, seller_id: str, products: int, invoices: int) -> None:
+        args, rng, router = self.args, self.rng, self.router
+        shard = router.shard_for_seller(uuid.UUID(seller_id))
+        writer = self.writer(router.engines[shard])
+
+        product_ids = [new_id(rng) for _ in range(products)]
+        prices = [rng.randint(100, 50000) for _ in range(products)]
+        writer.add(
+            Product.__table__,  # type: ignore[attr-defined]
+            (
+                (product_id, seller_id, f"Product {index}", price)
+                for index, (product_id, price) in enumerate(zip(product_ids, prices))
+            ),
+        )
+
+        # everything random is drawn in bulk, the loop only assembles rows
+        sizes = rng.choices(
+            range(1, args.max_items + 1), cum_weights=self.item_weights, k=invoices
+        )
+        items = sum(sizes)
+        picks = iter(
+            rng.choices(
+                range(products), cum_weights=zipf_weights(products, args.skew), k=items
+            )
+        )
+        quantities = iter(rng.choices(range(1, 6), k=items))
+        statuses = rng.choices(self.statuses, cum_weights=self.status_weights, k=invoices)
+        payments = rng.choices(self.payments, cum_weights=self.payment_weights, k=invoices)
+        span = args.days * 86400 * 10**6
+        dates = [
+            self.end - timedelta(microseconds=rng.randrange(span)) for _ in range(invoices)
+        ]
+        customers = rng.choices(range(10000), k=invoices)
+        # numbered in date order within each year, as if created live
+        formatter = get_invoice_numbers()
+        numbers: list[str] = [""] * invoices
+        last_numbers: Counter[int] = Counter()
+        for index in sorted(range(invoices), key=dates.__getitem__):
+            year = dates[index].year
+            last_numbers[year] += 1
+            numbers[index] = formatter.format(year, last_numbers[year])
+
+        sales: dict[tuple[str, str], list[int]] = {}
+        invoice_rows, item_rows = [], []
+        for size, invoice_status, payment, created, customer, number in zip(
+            sizes, statuses, payments, dates, customers, numbers
+        ):
+            invoice_id = new_id(rng)
+            day = created.strftime("%Y-%m-%d")
+            total = 0
+            for _ in range(size):
+                product, quantity = next(picks), next(quantities)
+                cents = quantity * prices[product]
+                total += cents
+                item_rows.append(
+                    (new_id(rng), invoice_id, product_ids[product], quantity, cents)
+                )
+                daily = sales.setdefault((product_ids[product], day), [0, 0])
+                daily[0] += quantity
+                daily[1] += cents
+            invoice_rows.append(
+                (
+                    invoice_id,
+                    seller_id,
+                    created.strftime("%Y-%m-%d %H:%M:%S.%f"),
+                    f"Customer {customer}",
+                    invoice_status,
+                    payment,
+                    total,
+                    number,
+                )
+            )
+        if router.sharded:
+            self.writer(router.primary).add(
+                InvoiceShard.__table__,  # type: ignore[attr-defined]
+                ((row[0], shard) for row in invoice_rows),
+            )
+        writer.add(InvoiceCreate.__table__, invoice_rows)  # type: ignore[attr-defined]
+        writer.add(InvoiceItems.__table__, item_rows)  # type: ignore[attr-defined]
+
+        counters: Counter[str] = Counter(map(self.counter_names.get, statuses))
+        counters["invoices"] = invoices
+        counters["products"] = products
+        for year, last in last_numbers.items():
+            counters[counter_name(year)] = last
+        writer.add(
+            SellerCounter.__table__,  # type: ignore[attr-defined]
+            ((seller_id, name, value) for name, value in counters.items() if value),
+        )
+        writer.add(
+            ProductDailySales.__table__,  # type: ignore[attr-defined]
+            (
+                (seller_id, day, product_id, quantity, revenue)
+                for (product_id, day), (quantity, revenue) in sales.items()
+            ),
+        )
+
+    def run(self) -> Counter[str]:
+        args = self.args
+        sellers = self.sellers()
+        products = [
+            max(count, 1) for count in spread(args.products, args.sellers, args.skew, self.rng)
+        ]
+        invoices = spread(args.invoices, args.sellers, args.skew, self.rng)
+        for seller_id, product_count, invoice_count in zip(sellers, products, invoices):
+            self.seller_data(seller_id, product_count, invoice_count)
+        written: Counter[str] = Counter()
+        for writer in self.writers.values():
+            writer.flush()
+            written.update(writer.written)
+        return written
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="python -m app.tests.generate_bench_data")
+    parser.add_argument("--sellers", type=int, default=100)
+    parser.add_argument("--products", type=int, default=5000, help="in total")
+    parser.add_argument("--invoices", type=int, default=100000, help="in total")
+    parser.add_argument("--max-items", type=int, default=8, help="per invoice")
+    parser.add_argument("--skew", type=float, default=1.1, help="Zipf exponent")
+    parser.add_argument("--days", type=int, default=365, help="invoice date range")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--batch-size", type=int, default=20000)
+    parser.add_argument("--password", default="benchpass123")
+    return parser.parse_args(argv)
+
+
+def main() -> None:
+    args = parse_args()
+    start = time.perf_counter()
+    written = Generator(args).run()
+    elapsed = time.perf_counter() - start
+    for table, rows in written.items():
+        print(f"{table}: {rows} rows")
+    total = sum(written.values())
+    print(f"{total} rows in {elapsed:.1f} s, {total / elapsed:.0f} rows/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+A stand-in for a Redis server, speaking just enough of its protocol for
+`RedisBackend`: PING, SELECT, GET, SET (PX, NX), DEL, EXPIRE, INCR, PUBLISH
+and SUBSCRIBE.
+"""
+
+import socketserver
+import threading
+import time
+
+
+class RespServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self) -> None:
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.data: dict[bytes, tuple[float | None, bytes]] = {}
+        self.subscribers: dict[bytes, list["_Handler"]] = {}
+        self.lock = threading.Lock()
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"redis://{host}:{port}/0"
+
+    def _live(self, key: bytes) -> bytes | None:
+        entry = self.data.get(key)
+        if entry is None:
+            return None
+        if entry[0] is not None and entry[0] <= time.monotonic():
+            del self.data[key]
+            return None
+        return entry[1]
+
+    def close(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    server: RespServer
+
+    def _read_command(self) -> list[bytes] | None:
+        line = self.rfile.readline()
+        if not line:
+            return None
+        args = []
+        for _ in range(int(line[1:-2])):
+            length = int(self.rfile.readline()[1:-2])
+            args.append(self.rfile.read(length + 2)[:-2])
+        return args
+
+    def _send(self, reply: object) -> None:
+        self.wfile.write(_encode(reply))
+        self.wfile.flush()
+
+    def handle(self) -> None:
+        while (args := self._read_command()) is not None:
+            self._send(self._run(args[0].upper(), args[1:]))
+
+    def _run(self, command: bytes, args: list[bytes]) -> object:
+        server = self.server
+        with server.lock:
+            if command == b"PING":
+                return "PONG"
+            if command == b"SELECT":
+                return "OK"
+            if command == b"GET":
+                return server._live(args[0])
+            if command == b"SET":
+                options = [arg.upper() for arg in args[2:]]
+                if b"NX" in options and server._live(args[0]) is not None:
+                    return None
+                expires = None
+                if b"PX" in options:
+                    expires = time.monotonic() + int(args[2 + options.index(b"PX") + 1]) / 1000
+                server.data[args[0]] = (expires, args[1])
+                return "OK"
+            if command == b"DEL":
+                return sum(server.data.pop(key, None) is not None for key in args)
+            if command == b"EXPIRE":
+                value = server._live(args[0])
+                if value is None:
+                    return 0
+                server.data[args[0]] = (time.monotonic() + int(args[1]), value)
+                return 1
+            if command == b"INCR":
+                value = int(server._live(args[0]) or 0) + 1
+                expires = server.data.get(args[0], (None, b""))[0]
+                server.data[args[0]] = (expires, str(value).encode())
+                return value
+            if command == b"PUBLISH":
+                subscribers = list(server.subscribers.get(args[0], ()))
+            elif command == b"SUBSCRIBE":
+                server.subscribers.setdefault(args[0], []).append(self)
+                return [b"subscribe", args[0], 1]
+            else:
+                return ValueError(f"ERR unknown command {command.decode()}")
+        for subscriber in subscribers:
+            try:
+                subscriber._send([b"message", args[0], args[1]])
+            except OSError:
+                pass
+        return len(subscribers)
+
+
+def _encode(reply: object) -> bytes:
+    if reply is None:
+        return b"$-1\r\n"
+    if isinstance(reply, Exception):
+        return f"-{reply}\r\n".encode()
+    if isinstance(reply, str):
+        return f"+{reply}\r\n".encode()
+    if isinstance(reply, int):
+        return f":{reply}\r\n".encode()
+    if isinstance(reply, bytes):
+        return f"${len(reply)}\r\n".encode() + reply + b"\r\n"
+    if isinstance(reply, list):
+        return f"*{len(reply)}\r\n".encode() + b"".join(map(_encode, reply))
+    raise TypeError(reply)
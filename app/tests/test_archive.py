@@ -0,0 +1,115 @@
+import uuid
+from datetime import datetime, timedelta
+import pytest
+from fastapi import HTTPException
+from sqlmodel import SQLModel, Session, create_engine, select
+from app import crud
+from app.models import (
+    InvoiceArchive,
+    InvoiceCreate,
+    InvoiceItems,
+    InvoiceStatusUpdate,
+    InvoiceUpdate,
+)
+from app.utils.archive import archive_invoices
+
+
+def make_invoices(session, seller_id, ages_in_days):
+    ids = []
+    for age in ages_in_days:
+        invoice = InvoiceCreate(
+            seller_id=seller_id,
+            total_price=float(age),
+            created_date=datetime.now() - timedelta(days=age),
+        )
+        invoice.invoiceitems = [InvoiceItems(quantity=1, total_price=float(age))]
+        session.add(invoice)
+        ids.append(invoice.id)
+    session.commit()
+    return ids
+
+
+def test_archive_moves_old_invoices_and_reads_stay_transparent():
+    engine = create_engine("sqlite://")
+    SQLModel.metadata.create_all(engine)
+    seller_id = uuid.uuid4()
+    with Session(engine) as session:
+        ids = make_invoices(session, seller_id, [1, 2, 400, 500, 600])
+
+    assert archive_invoices(engine, retention_days=365, batch_size=2) == 3
+
+    with Session(engine) as session:
+        assert len(session.exec(select(InvoiceCreate)).all()) == 2
+        assert len(session.exec(select(InvoiceArchive)).all()) == 3
+
+        archived = crud.get_invoice_by_id(session=session, invoice_id=str(ids[3]))
+        assert archived is not None
+        assert archived.total_price == 500.0
+        assert len(archived.invoiceitems) == 1
+
+        first_page = crud.get_seller_invoices(
+            session=session, user_id=seller_id, offset=0, limit=3
+        )
+        assert [invoice.total_price for invoice in first_page] == [1.0, 2.0, 400.0]
+        second_page = crud.get_seller_invoices(
+            session=session, user_id=seller_id, offset=3, limit=3
+        )
+        assert [invoice.total_price for invoice in second_page] == [500.0, 600.0]
+
+
+def test_old_imported_invoices_sort_across_the_archive():
+    engine = create_engine("sqlite://")
+    SQLModel.metadata.create_all(engine)
+    seller_id = uuid.uuid4()
+    with Session(engine) as session:
+        make_invoices(session, seller_id, [1, 400, 600])
+    archive_invoices(engine, retention_days=365)
+    with Session(engine) as session:
+        # imported after the archival, with a historical date
+        make_invoices(session, seller_id, [500, 700])
+        pages = [
+            crud.get_seller_invoices(
+                session=session, user_id=seller_id, offset=offset, limit=2
+            )
+            for offset in (0, 2, 4)
+        ]
+    assert [[invoice.total_price for invoice in page] for page in pages] == [
+        [1.0, 400.0],
+        [500.0, 600.0],
+        [700.0],
+    ]
+
+
+def test_archived_invoices_are_read_only():
+    engine = create_engine("sqlite://")
+    SQLModel.metadata.create_all(engine)
+    seller_id = uuid.uuid4()
+    with Session(engine) as session:
+        hot, old = make_invoices(session, seller_id, [1, 400])
+    archive_invoices(engine, retention_days=365)
+
+    with Session(engine) as session:
+        for write in (
+            lambda: crud.update_invoice(
+                session=session,
+                up_invoice=InvoiceUpdate(id=old, customer_name="Late"),
+                user_id=seller_id,
+            ),
+            lambda: crud.delete_invoice(
+                session=session, invoice_id=old, user_id=seller_id
+            ),
+            lambda: crud.update_invoices_status(
+                session=session,
+                status_update=InvoiceStatusUpdate(ids=[hot, old], status="Paid"),
+                user_id=seller_id,
+            ),
+        ):
+            with pytest.raises(HTTPException) as error:
+                write()
+            assert error.value.status_code == 409
+            assert str(old) in error.value.detail
+        # nothing was written, and other sellers still get a 404
+        assert session.get(InvoiceCreate, hot).status.value == "Pending"
+        with pytest.raises(HTTPException) as error:
+            crud.delete_invoice(session=session, invoice_id=old, user_id=uuid.uuid4())
+        assert error.value.status_code == 404
@@ -0,0 +1,90 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app.api.routers import batch, login, signup, users
+
+app = FastAPI()
+app.include_router(login.router)
+app.include_router(signup.router)
+app.include_router(users.router)
+app.include_router(batch.router)
+
+client = TestClient(app)
+
+
+def get_auth_headers(email, password, phone_number):
+    client.post(
+        "/signup",
+        json={"email": email, "phone_number": phone_number, "password": password},
+    )
+    token = client.post(
+        "/login/access-token", params={"email": email, "password": password}
+    ).json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
+
+
+def test_batch_runs_sub_requests_in_order():
+    headers = get_auth_headers("batch@example.com", "batchpass123", "09123456711")
+    response = client.post(
+        "/batch",
+        json=[
+            {"path": "/login/me"},
+            {
+                "method": "POST",
+                "path": "/user/newproduct",
+                "body": [{"name": "P", "price": 2.5}],
+            },
+            {
+                "method": "POST",
+                "path": "/user/createInvoice",
+                "body": {"total_price": 5.0},
+            },
+            {"path": "/user/counts"},
+            {"path": "/user/get_invoices", "query": {"limit": 5}},
+            {"path": "/user/get_invoices?limit=oops"},
+            {"path": "/user/nowhere"},
+            {"method": "DELETE", "path": "/login/me"},
+            {"path": "/batch"},
+        ],
+        headers=headers,
+    )
+    assert response.status_code == 200
+    results = response.json()
+    assert [result["status"] for result in results] == [
+        200, 200, 200, 200, 200, 422, 404, 405, 400
+    ]
+    assert results[0]["body"]["email"] == "batch@example.com"
+    assert [product["name"] for product in results[1]["body"]] == ["P"]
+    # the GETs after the writes see them
+    assert results[3]["body"]["products"] == 1
+    assert results[4]["body"][0]["id"] == results[2]["body"]["id"]
+    assert results[4]["headers"]["x-total-count"] == "1"
+
+
+def test_batch_without_a_valid_token():
+    response = client.post(
+        "/batch",
+        json=[{"path": "/login/me"}, {"method": "POST", "path": "/signup", "body": {}}],
+        headers={"Authorization": "Bearer not-a-token"},
+    )
+    assert [result["status"] for result in response.json()] == [403, 422]
+    assert client.post("/batch", json=[{"path": "/login/me"}] * 21).status_code == 400
+
+
+def test_overloaded_worker_sheds_low_priority_sub_requests(monkeypatch):
+    from app.utils.load_shedding import LoadShedder
+
+    shedder = LoadShedder(target_ms=50, low_priority=["/user/get_invoices"], prefix="")
+    monkeypatch.setattr(batch, "get_load_shedder", lambda: shedder)
+    headers = get_auth_headers("shedbatch@example.com", "batchpass123", "09123456721")
+    shedder.delay = 0.08
+    response = client.post(
+        "/batch",
+        json=[{"path": "/login/me"}, {"path": "/user/get_invoices"}],
+        headers=headers,
+    )
+    assert response.status_code == 200
+    me, invoices = response.json()
+    assert me["status"] == 200
+    assert invoices["status"] == 503
+    assert invoices["headers"]["retry-after"] == "2"
+    assert shedder.stats()["shed_low"] == 1
@@ -0,0 +1,64 @@
+from sqlalchemy import func
+from sqlmodel import SQLModel, Session, create_engine, select
+from app.db import ShardRouter
+from app.models import CreateSeller, InvoiceCreate, InvoiceShard, SellerCounter
+from app.tests.generate_bench_data import Generator, parse_args
+from app.utils.counters import reconcile_counters
+from app.utils.sales import reconcile_sales
+
+
+def generate(seed):
+    engines = [create_engine("sqlite://") for _ in range(2)]
+    for engine in engines:
+        SQLModel.metadata.create_all(engine)
+    router = ShardRouter(engines)
+    args = parse_args(
+        ["--sellers", "20", "--products", "200", "--invoices", "2000",
+         "--seed", str(seed), "--batch-size", "500"]
+    )
+    return router, Generator(args, router).run()
+
+
+def test_generated_data_is_skewed_consistent_and_reproducible():
+    router, written = generate(seed=7)
+    assert written["createseller"] == 20
+    assert written["invoicecreate"] == written["invoiceshard"] == 2000
+
+    per_seller = []
+    for engine in router.engines:
+        # the counters and daily sales written along match the rows
+        assert reconcile_counters(engine) == 0
+        assert reconcile_sales(engine) == 0
+        with Session(engine) as session:
+            per_seller += session.exec(
+                select(func.count())
+                .select_from(InvoiceCreate)
+                .group_by(InvoiceCreate.seller_id)
+            ).all()
+        with Session(engine) as session:
+            last_numbers = {
+                (seller_id, int(name.split(":")[1])): value
+                for seller_id, name, value in session.exec(
+                    select(SellerCounter.seller_id, SellerCounter.name, SellerCounter.value)
+                    .where(SellerCounter.name.startswith("invoice_numbers:"))
+                )
+            }
+            numbers = session.exec(select(InvoiceCreate.seller_id, InvoiceCreate.number)).all()
+        # every invoice numbered, each year's sequence ending at its counter
+        assert len(set(numbers)) == len(numbers)
+        years = {}
+        for seller_id, number in numbers:
+            key = (seller_id, int(number.split("-")[1]))
+            years[key] = max(years.get(key, 0), int(number.split("-")[2]))
+        assert years == last_numbers
+    per_seller.sort(reverse=True)
+    assert per_seller[0] > 5 * per_seller[len(per_seller) // 2]
+
+    with Session(router.primary) as session:
+        sellers = session.exec(select(CreateSeller.id).order_by(CreateSeller.id)).all()
+        indexed = session.exec(select(func.count()).select_from(InvoiceShard)).one()
+    assert indexed == 2000
+
+    again, _ = generate(seed=7)
+    with Session(again.primary) as session:
+        assert session.exec(select(CreateSeller.id).order_by(CreateSeller.id)).all() == sellers
@@ -0,0 +1,142 @@
+import socket
+import threading
+import time
+import pytest
+from app.models import MonthTotals
+from app.tests.resp_server import RespServer
+from app.utils.cache import (
+    Cache,
+    MemoryBackend,
+    RedisBackend,
+    SQLiteBackend,
+    backend_from_url,
+)
+
+
+@pytest.fixture(params=["memory", "sqlite", "redis"])
+def backends(request, tmp_path):
+    """
+    Two workers' backends on the same storage.
+    """
+    if request.param == "memory":
+        backend = MemoryBackend(max_entries=100)
+        yield backend, backend
+    elif request.param == "sqlite":
+        path = str(tmp_path / "cache.db")
+        first = SQLiteBackend(path, poll_interval=0.05)
+        second = SQLiteBackend(path, poll_interval=0.05)
+        yield first, second
+        first.close()
+        second.close()
+    else:
+        server = RespServer()
+        first, second = backend_from_url(server.url), backend_from_url(server.url)
+        yield first, second
+        first.close()
+        second.close()
+        server.close()
+
+
+def eventually(check, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not check():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.02)
+    return True
+
+
+def test_backend_operations(backends):
+    backend, other = backends
+    assert backend.get("a") is None
+    backend.set("a", b"1", 60)
+    assert other.get("a") == b"1"
+    assert not other.add("a", b"2", 60)
+    assert backend.add("b", b"2", 60)
+    backend.delete("a")
+    assert other.get("a") is None
+    assert [backend.incr("n"), other.incr("n")] == [1, 2]
+    backend.set("short", b"1", 0.05)
+    time.sleep(0.1)
+    assert other.get("short") is None
+    assert other.add("short", b"2", 60)
+
+
+def test_invalidation_reaches_every_worker(backends):
+    first, second = (Cache(backend, version_ttl=60) for backend in backends)
+    month = MonthTotals(month="2025-01-01", invoices=1, total=5.0, paid=5.0)
+    first.set("dashboard:1", "", month, 60, MonthTotals)
+    assert second.get("dashboard:1", "", MonthTotals) == month
+
+    second.invalidate("dashboard:1")
+    assert second.get("dashboard:1", "", MonthTotals) is None
+    # the first worker trusts its version for 60s, only the broadcast updates it
+    assert eventually(lambda: first.get("dashboard:1", "", MonthTotals) is None)
+    first.set("dashboard:1", "", month, 60, MonthTotals)
+    assert second.get("dashboard:1", "", MonthTotals) == month
+    assert first.get("dashboard:2", "", MonthTotals) is None
+
+
+def test_invalidate_many_broadcasts_once(backends):
+    first, second = (Cache(backend, version_ttl=60) for backend in backends)
+    for namespace in ("invoice:1", "invoice:2"):
+        first.set(namespace, "", 1, 60, int)
+        assert second.get(namespace, "", int) == 1
+
+    calls = []
+
+    def counted(name, method):
+        def call(*args):
+            calls.append(name)
+            return method(*args)
+
+        return call
+
+    for name in ("get", "add", "incr", "publish"):
+        setattr(second.backend, name, counted(name, getattr(second.backend, name)))
+    second.invalidate_many(["invoice:1", "invoice:2", "invoice:3"])
+    assert sorted(calls) == ["add"] * 3 + ["incr"] * 3 + ["publish"]
+
+    assert eventually(lambda: first.get("invoice:1", "", int) is None)
+    assert eventually(lambda: first.get("invoice:2", "", int) is None)
+
+
+def test_get_or_set_loads_a_hot_key_once(backends):
+    caches = [Cache(backend) for backend in backends]
+    loads = []
+
+    def load():
+        loads.append(1)
+        time.sleep(0.2)
+        return 42
+
+    results = []
+    threads = [
+        threading.Thread(
+            target=lambda cache=caches[i % 2]: results.append(
+                cache.get_or_set("hot", "key", load, 60, int)
+            )
+        )
+        for i in range(10)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == [42] * 10
+    assert len(loads) == 1
+    assert caches[0].get_or_set("hot", "key", load, 60, int) == 42
+    # None is not cached
+    assert caches[0].get_or_set("hot", "none", lambda: None, 60, int) is None
+    assert caches[0].get_or_set("hot", "none", lambda: 7, 60, int) == 7
+
+
+def test_a_backend_down_falls_back_to_loading():
+    with socket.socket() as unused:
+        unused.bind(("127.0.0.1", 0))
+        port = unused.getsockname()[1]
+    cache = Cache(RedisBackend("127.0.0.1", port))
+    assert cache.get_or_set("invoice:1", "", lambda: 3, 60, int) == 3
+    cache.invalidate("invoice:1")
+    assert cache.stats()["errors"] > 0
+    cache.close()
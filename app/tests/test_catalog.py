@@ -0,0 +1,53 @@
+import uuid
+from sqlmodel import SQLModel, Session, create_engine
+from app import crud
+from app.models import InputProduct
+from app.utils.catalog import CatalogCache
+
+
+def add_products(session, seller_id, *names):
+    crud.create_product(
+        session=session,
+        products=[InputProduct(name=name, price=1.0) for name in names],
+        user_id=seller_id,
+    )
+
+
+def test_catalog_cache_hits_and_versions():
+    engine = create_engine("sqlite://")
+    SQLModel.metadata.create_all(engine)
+    cache = CatalogCache(max_products=100)
+    seller_id = uuid.uuid4()
+    with Session(engine) as session:
+        add_products(session, seller_id, "A", "B")
+        catalog = cache.get(session, seller_id)
+        assert set(catalog.by_name) == {"A", "B"}
+        product = catalog.by_name["A"]
+        assert catalog.by_id[product.id] is product
+        assert cache.get(session, seller_id) is catalog
+
+        add_products(session, seller_id, "C")
+        assert "C" in cache.get(session, seller_id).by_name
+
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"]) == (1, 2)
+    assert stats["hit_rate"] == 1 / 3
+
+
+def test_catalog_cache_evicts_least_recently_used():
+    engine = create_engine("sqlite://")
+    SQLModel.metadata.create_all(engine)
+    cache = CatalogCache(max_products=4)
+    sellers = [uuid.uuid4() for _ in range(3)]
+    with Session(engine) as session:
+        for seller_id in sellers:
+            add_products(session, seller_id, "X", "Y")
+        cache.get(session, sellers[0])
+        cache.get(session, sellers[1])
+        cache.get(session, sellers[0])
+        cache.get(session, sellers[2])
+
+    stats = cache.stats()
+    assert stats["evictions"] == 1
+    assert stats["products"] == 4
+    assert set(cache._catalogs) == {sellers[0], sellers[2]}
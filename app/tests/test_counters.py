@@ -0,0 +1,109 @@
+import uuid
+from sqlmodel import SQLModel, Session, create_engine, select
+from app import crud
+from app.models import (
+    InputProduct,
+    InvoiceInput,
+    InvoiceStatusUpdate,
+    InvoiceUpdate,
+    SellerCounter,
+)
+from app.utils import counters
+from app.utils.counters import is_count, reconcile_counters
+
+
+def make_session():
+    engine = create_engine("sqlite://")
+    SQLModel.metadata.create_all(engine)
+    return engine, Session(engine)
+
+
+def test_counters_follow_writes():
+    engine, session = make_session()
+    seller_id = uuid.uuid4()
+    crud.create_product(
+        session=session,
+        products=[InputProduct(name="A", price=1.0), InputProduct(name="B", price=2.0)],
+        user_id=seller_id,
+    )
+    ids = [
+        crud.create_invoice(
+            session=session,
+            invoice=InvoiceInput(total_price=1.0, status="Pending"),
+            user_id=seller_id,
+        ).id
+        for _ in range(3)
+    ]
+    counts = crud.get_seller_counts(session=session, seller_id=seller_id)
+    assert (counts.invoices, counts.products) == (3, 2)
+    assert counts.invoices_by_status == {"Pending": 3}
+
+    crud.update_invoice(
+        session=session,
+        up_invoice=InvoiceUpdate(id=ids[0], status="Paid"),
+        user_id=seller_id,
+    )
+    crud.update_invoices_status(
+        session=session,
+        status_update=InvoiceStatusUpdate(ids=ids, status="Void"),
+        user_id=seller_id,
+    )
+    crud.delete_invoice(session=session, invoice_id=ids[1])
+
+    counts = crud.get_seller_counts(session=session, seller_id=seller_id)
+    assert counts.invoices == 2
+    assert counts.invoices_by_status == {"Void": 2}
+    assert crud.count_seller_invoices(session=session, user_id=seller_id) == 2
+    session.close()
+
+
+def test_reconcile_repairs_drift():
+    engine, session = make_session()
+    seller_id = uuid.uuid4()
+    for _ in range(2):
+        crud.create_invoice(
+            session=session, invoice=InvoiceInput(total_price=1.0), user_id=seller_id
+        )
+    counter = session.get(SellerCounter, (seller_id, "invoices"))
+    counter.value = 40
+    session.add(counter)
+    session.delete(session.get(SellerCounter, (seller_id, "invoices:Pending")))
+    session.commit()
+    session.close()
+
+    assert reconcile_counters(engine) == 2
+    assert reconcile_counters(engine) == 0
+    with Session(engine) as session:
+        counters = session.exec(select(SellerCounter)).all()
+        assert {c.name: c.value for c in counters if is_count(c.name)} == {
+            "invoices": 2,
+            "invoices:Pending": 2,
+        }
+
+
+def test_reconcile_keeps_writes_landing_meanwhile(monkeypatch):
+    engine, session = make_session()
+    seller_id = uuid.uuid4()
+    crud.create_invoice(
+        session=session, invoice=InvoiceInput(total_price=1.0), user_id=seller_id
+    )
+    counter = session.get(SellerCounter, (seller_id, "invoices"))
+    counter.value = 0
+    session.add(counter)
+    session.commit()
+
+    read = counters._count_deltas
+
+    def read_then_write(reading):
+        deltas = read(reading)
+        # an invoice created after the reconciler read the counts
+        crud.create_invoice(
+            session=session, invoice=InvoiceInput(total_price=1.0), user_id=seller_id
+        )
+        return deltas
+
+    monkeypatch.setattr(counters, "_count_deltas", read_then_write)
+    assert reconcile_counters(engine) == 1
+    session.close()
+    with Session(engine) as session:
+        assert session.get(SellerCounter, (seller_id, "invoices")).value == 2
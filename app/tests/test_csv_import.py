@@ -0,0 +1,139 @@
+import io
+import uuid
+from datetime import datetime
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import SQLModel, Session, create_engine, select
+from app import crud
+from app.models import InvoiceCreate, InvoiceItems, ProductSalesFilter
+from app.utils.csv_import import import_invoices, import_products
+
+
+def make_session():
+    engine = create_engine("sqlite://")
+    SQLModel.metadata.create_all(engine)
+    return Session(engine)
+
+
+def upload(text):
+    return io.BytesIO(text.encode())
+
+
+def test_import_products_in_chunks():
+    session = make_session()
+    seller_id = uuid.uuid4()
+    result = import_products(
+        session,
+        seller_id,
+        upload(
+            "name,price,description\n"
+            "A,1.5,first\n"
+            "B,2\n"
+            "A,3\n"
+            "C,not a price\n"
+            "D,4,\n"
+            "E,5\n"
+        ),
+        chunk_size=2,
+    )
+    assert (result.rows, result.imported, result.failed) == (6, 4, 2)
+    assert result.chunks == 2
+    assert [(error.line, error.error.split(":")[0]) for error in result.errors] == [
+        (4, "Product 'A' already exists"),
+        (5, "price"),
+    ]
+    products = crud.get_seller_product(session=session, seller_id=seller_id)
+    assert sorted(product.name for product in products) == ["A", "B", "D", "E"]
+    assert crud.get_seller_counts(session=session, seller_id=seller_id).products == 4
+
+    # names already in the catalog are rejected on the next import
+    again = import_products(session, seller_id, upload("name,price\nB,2\nF,6\n"))
+    assert (again.imported, again.failed) == (1, 1)
+    session.close()
+
+
+def test_import_invoices_groups_rows_by_reference():
+    session = make_session()
+    seller_id = uuid.uuid4()
+    import_products(session, seller_id, upload("name,price\nA,1\nB,2\n"))
+    product_b = next(
+        product.id
+        for product in crud.get_seller_product(session=session, seller_id=seller_id)
+        if product.name == "B"
+    )
+    result = import_invoices(
+        session,
+        seller_id,
+        upload(
+            "invoice,customer_name,status,total_price,created_date,"
+            "product_name,product_id,quantity,item_total_price\n"
+            "1,Ann,paid,7,2024-01-02T10:00:00,A,,3,3\n"
+            "1,,,,,,{b},2,4\n"
+            "2,Bob,,5,,Missing,,1,5\n"
+            ",Cy,,9,,,,,\n"
+            "3,Dee,Pending,not a total,,A,,1,1\n"
+            "4,Eve,,2,,A,,2,2\n".format(b=product_b)
+        ),
+        chunk_size=2,
+    )
+    assert (result.rows, result.imported, result.failed) == (6, 4, 2)
+    assert [error.line for error in result.errors] == [4, 6]
+    assert "unknown product 'Missing'" in result.errors[0].error
+
+    invoices = {
+        invoice.customer_name: invoice
+        for invoice in session.exec(
+            select(InvoiceCreate).where(InvoiceCreate.seller_id == seller_id)
+        ).all()
+    }
+    assert sorted(invoices) == ["Ann", "Cy", "Eve"]
+    assert invoices["Ann"].status == "Paid"
+    assert invoices["Ann"].created_date == datetime(2024, 1, 2, 10)
+    items = session.exec(
+        select(InvoiceItems).where(InvoiceItems.invoice_id == invoices["Ann"].id)
+    ).all()
+    assert sorted(item.quantity for item in items) == [2, 3]
+
+    counts = crud.get_seller_counts(session=session, seller_id=seller_id)
+    assert counts.invoices == 3
+    assert counts.invoices_by_status == {"Paid": 1, "Pending": 2}
+    sales = crud.get_product_sales(
+        session=session, seller_id=seller_id, filters=ProductSalesFilter()
+    )
+    assert [(row.name, row.quantity) for row in sales] == [("A", 5), ("B", 2)]
+    session.close()
+
+
+def test_rejected_chunks_do_not_leak_database_errors(monkeypatch, capsys):
+    session = make_session()
+    seller_id = uuid.uuid4()
+
+    def reject(*args, **kwargs):
+        raise IntegrityError("INSERT INTO product ...", {"secret": 1}, Exception("boom"))
+
+    monkeypatch.setattr(crud, "bump_counters", reject)
+    result = import_products(session, seller_id, upload("name,price\nA,1\nB,2\n"))
+    assert (result.imported, result.failed) == (0, 2)
+    assert [error.error for error in result.errors] == [
+        "Chunk not saved: the database rejected it"
+    ]
+    assert "INSERT INTO product" in capsys.readouterr().out
+    session.close()
+
+
+def test_import_reports_progress_after_each_chunk():
+    session = make_session()
+    snapshots = []
+    result = import_products(
+        session,
+        uuid.uuid4(),
+        upload("name,price\nA,1\nB,2\nC,x\nD,4\nE,5\n"),
+        chunk_size=2,
+        progress=lambda result: snapshots.append(result.model_copy(deep=True)),
+    )
+    assert [(s.rows, s.imported, s.failed, s.done) for s in snapshots] == [
+        (2, 2, 0, False),
+        (5, 4, 1, False),
+        (5, 4, 1, True),
+    ]
+    assert result.done
+    session.close()
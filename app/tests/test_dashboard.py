@@ -0,0 +1,116 @@
+import asyncio
+import threading
+import uuid
+import anyio
+from datetime import date
+from sqlmodel import SQLModel, Session, create_engine
+from app import crud
+from app.models import InvoiceEvent, InvoiceInput, InvoiceStatus
+from app.utils.cache import get_cache
+
+
+def test_month_totals_and_recent_invoices():
+    engine = create_engine("sqlite://")
+    SQLModel.metadata.create_all(engine)
+    seller_id = uuid.uuid4()
+    with Session(engine) as session:
+        ids = [
+            crud.create_invoice(
+                session=session,
+                invoice=InvoiceInput(
+                    total_price=total,
+                    status=invoice_status,
+                    invoiceitems=[{"quantity": 1, "total_price": total}],
+                ),
+                user_id=seller_id,
+            ).id
+            for total, invoice_status in [
+                (10.0, InvoiceStatus.PAID),
+                (2.5, InvoiceStatus.PENDING),
+                (4.0, InvoiceStatus.PAID),
+            ]
+        ]
+        crud.delete_invoice(session=session, invoice_id=ids[2], user_id=seller_id)
+
+        totals = crud.get_month_totals(
+            session=session, seller_id=seller_id, month=date.today()
+        )
+        assert totals.month == date.today().replace(day=1)
+        assert (totals.invoices, totals.total, totals.paid) == (2, 12.5, 10.0)
+
+        recent = crud.get_recent_invoices(session=session, seller_id=seller_id, limit=5)
+        assert {invoice.id for invoice in recent} == set(ids[:2])
+        assert [len(invoice.invoiceitems) for invoice in recent] == [1, 1]
+
+
+def test_writes_invalidate_the_cached_dashboard_and_invoices():
+    cache = get_cache()
+    seller_id, invoice_id = uuid.uuid4(), uuid.uuid4()
+    cache.set(f"dashboard:{seller_id}", "", 1, 60, int)
+    cache.set(f"invoice:{invoice_id}", "", 2, 60, int)
+
+    crud.seller_changed(seller_id, InvoiceEvent(type="created", invoice_ids=[invoice_id]))
+    assert cache.get(f"dashboard:{seller_id}", "", int) is None
+    assert cache.get(f"invoice:{invoice_id}", "", int) == 2
+
+    crud.seller_changed(seller_id, InvoiceEvent(type="status", invoice_ids=[invoice_id]))
+    assert cache.get(f"invoice:{invoice_id}", "", int) is None
+
+
+def test_concurrent_misses_do_not_starve_the_threadpool():
+    from app.models import CreateSeller
+    from app.utils.dashboard import get_dashboard
+
+    seller = CreateSeller(phone_number="09123456719", password="dashpass123")
+
+    async def run():
+        anyio.to_thread.current_default_thread_limiter().total_tokens = 4
+        with anyio.fail_after(10):
+            return await asyncio.gather(*(get_dashboard(seller) for _ in range(8)))
+
+    dashboards = asyncio.run(run())
+    assert {dashboard.profile.phone_number for dashboard in dashboards} == {
+        "09123456719"
+    }
+
+
+def test_dashboard_queries_run_at_the_same_time(monkeypatch):
+    from app.models import CreateSeller
+    from app.utils.dashboard import build_dashboard
+
+    # each query only returns once all three are running
+    barrier = threading.Barrier(3, timeout=5)
+    for name in ("get_seller_counts", "get_month_totals", "get_recent_invoices"):
+        read = getattr(crud, name)
+
+        def waiting(read=read, **kwargs):
+            barrier.wait()
+            return read(**kwargs)
+
+        monkeypatch.setattr(crud, name, waiting)
+    seller = CreateSeller(phone_number="09123456728", password="dashpass123")
+    dashboard = build_dashboard(seller)
+    assert dashboard.profile.phone_number == "09123456728"
+    assert dashboard.recent_invoices == []
+
+
+def test_profile_updates_invalidate_the_cached_dashboard():
+    from app.models import BaseSeller, CreateSeller
+
+    engine = create_engine("sqlite://")
+    SQLModel.metadata.create_all(engine)
+    seller = CreateSeller(phone_number="09123456720", password="dashpass123")
+    seller_id = seller.id
+    with Session(engine) as session:
+        session.add(seller)
+        session.commit()
+        cache = get_cache()
+        cache.set(f"dashboard:{seller_id}", "", 1, 60, int)
+
+        user = crud.update_user(
+            session=session,
+            user_id=seller_id,
+            user_data=BaseSeller(phone_number="09123456720", name="Renamed"),
+        )
+        assert user.name == "Renamed"
+        assert cache.get(f"dashboard:{seller_id}", "", int) is None
@@ -0,0 +1,108 @@
+import asyncio
+import json
+import threading
+import uuid
+from app.models import InvoiceEvent
+from app.utils.events import Broadcaster, EventHub, PostgresBroadcaster, sse_stream
+
+
+def publish_from_thread(hub, seller_id, *types):
+    thread = threading.Thread(
+        target=lambda: [
+            hub.publish(seller_id, InvoiceEvent(type=kind, invoice_ids=[uuid.uuid4()]))
+            for kind in types
+        ]
+    )
+    thread.start()
+    thread.join()
+
+
+def test_events_reach_the_seller_connections_only():
+    hub = EventHub(Broadcaster(), queue_size=10)
+    seller, other = uuid.uuid4(), uuid.uuid4()
+
+    async def scenario():
+        with hub.subscribe(seller) as first, hub.subscribe(seller) as second:
+            with hub.subscribe(other) as unrelated:
+                publish_from_thread(hub, seller, "created", "updated")
+                received = [
+                    json.loads(await anext(subscription))["type"]
+                    for subscription in (first, first, second, second)
+                ]
+                await asyncio.sleep(0)
+                assert unrelated.queue.empty()
+                return received
+
+    assert asyncio.run(scenario()) == ["created", "updated", "created", "updated"]
+    assert hub.stats()["connections"] == 0
+
+
+def test_slow_consumer_is_dropped():
+    hub = EventHub(Broadcaster(), queue_size=2)
+    seller = uuid.uuid4()
+
+    async def scenario():
+        subscription = hub.subscribe(seller)
+        publish_from_thread(hub, seller, "created", "created", "created")
+        await asyncio.sleep(0)
+        return subscription.dropped, [data async for data in subscription]
+
+    assert asyncio.run(scenario()) == (True, [])
+    assert hub.stats() == {"connections": 0, "published": 3, "delivered": 3, "dropped": 1}
+
+
+def test_sse_stream():
+    hub = EventHub(Broadcaster(), queue_size=10)
+    seller = uuid.uuid4()
+
+    async def scenario():
+        stream = sse_stream(hub, seller, heartbeat=0.01)
+        chunks = [await anext(stream), await anext(stream)]
+        publish_from_thread(hub, seller, "deleted")
+        chunk = await anext(stream)
+        while chunk.startswith(":"):
+            chunk = await anext(stream)
+        chunks.append(chunk)
+        await stream.aclose()
+        return chunks
+
+    retry, keep_alive, event = asyncio.run(scenario())
+    assert (retry, keep_alive) == ("retry: 3000\n\n", ": keep-alive\n\n")
+    assert event.startswith("event: invoice\ndata: ")
+    assert json.loads(event.split("data: ", 1)[1])["type"] == "deleted"
+    assert hub.stats()["connections"] == 0
+
+
+def test_large_events_are_split_to_fit_a_notify():
+    messages = []
+
+    class Recorder(Broadcaster):
+        def publish(self, message):
+            messages.append(message)
+
+    hub = EventHub(Recorder(), queue_size=10)
+    hub.broadcaster.max_ids = PostgresBroadcaster.max_ids
+    ids = [uuid.uuid4() for _ in range(1000)]
+    hub.publish(uuid.uuid4(), InvoiceEvent(type="imported", invoice_ids=ids))
+
+    assert len(messages) == 7
+    assert all(len(message.encode()) < 8000 for message in messages)
+    parts = [json.loads(message)["event"] for message in messages]
+    assert {part["type"] for part in parts} == {"imported"}
+    assert [i for part in parts for i in part["invoice_ids"]] == [str(i) for i in ids]
+
+
+def test_postgres_listener_reconnects():
+    attempts = []
+
+    class Unreachable:
+        def raw_connection(self):
+            attempts.append(1)
+            if len(attempts) == 3:
+                broadcaster._stopped.set()
+            raise OSError("connection refused")
+
+    broadcaster = PostgresBroadcaster(Unreachable())  # type: ignore[arg-type]
+    broadcaster._stopped.wait = lambda timeout: None  # type: ignore[method-assign]
+    broadcaster._listen(lambda message: None)
+    assert len(attempts) == 3
@@ -0,0 +1,174 @@
+import csv
+import gzip
+import io
+import json
+import uuid
+from datetime import datetime, timedelta
+import pytest
+from sqlmodel import SQLModel, Session, create_engine, select
+from app import crud
+from app.config import get_settings
+from app.models import (
+    ExportJob,
+    ExportRequest,
+    ExportStatus,
+    InputProduct,
+    InvoiceCreate,
+    InvoiceInput,
+)
+from app.utils import exports
+from app.utils.archive import archive_invoices
+
+
+@pytest.fixture
+def export_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(get_settings(), "export_dir", str(tmp_path))
+    return tmp_path
+
+
+def make_seller(count):
+    engine = create_engine("sqlite://")
+    SQLModel.metadata.create_all(engine)
+    seller_id = uuid.uuid4()
+    with Session(engine) as session:
+        crud.create_product(
+            session=session, products=[InputProduct(name="A", price=1.0)], user_id=seller_id
+        )
+        product_id = crud.get_seller_product(session=session, seller_id=seller_id)[0].id
+        for number in range(count):
+            crud.create_invoice(
+                session=session,
+                invoice=InvoiceInput(
+                    customer_name=f"Customer {number}",
+                    total_price=2.0,
+                    invoiceitems=[
+                        {"product_id": product_id, "quantity": 1, "total_price": 1.0},
+                        {"product_id": product_id, "quantity": 1, "total_price": 1.0},
+                    ],
+                ),
+                user_id=seller_id,
+            )
+    return engine, seller_id
+
+
+def queue(engine, seller_id, **request):
+    with Session(engine) as session:
+        return crud.create_export_job(
+            session=session, request=ExportRequest(**request), user_id=seller_id
+        ).id
+
+
+def read_job(engine, job_id):
+    with Session(engine) as session:
+        job = session.get(ExportJob, job_id)
+        return job, gzip.decompress(exports.export_path(job).read_bytes()).decode()
+
+
+def test_csv_export_in_batches(export_dir):
+    engine, seller_id = make_seller(5)
+    job_id = queue(engine, seller_id)
+    assert exports.process_jobs(engine, batch_size=2) == 1
+    assert exports.process_jobs(engine) == 0
+
+    job, content = read_job(engine, job_id)
+    assert (job.status, job.total, job.exported) == (ExportStatus.DONE, 5, 5)
+    rows = list(csv.DictReader(io.StringIO(content)))
+    assert len(rows) == 10
+    assert len({row["invoice"] for row in rows}) == 5
+    assert rows[0]["customer_name"] == "Customer 0"
+    assert rows[0]["item_total_price"] == "1.0"
+
+
+def test_json_export_respects_the_date_range(export_dir):
+    engine, seller_id = make_seller(3)
+    job_id = queue(
+        engine, seller_id, format="json", created_to=datetime.now() - timedelta(days=1)
+    )
+    other_id = queue(engine, seller_id, format="json")
+    exports.process_jobs(engine)
+
+    job, content = read_job(engine, job_id)
+    assert (job.total, content) == (0, "")
+    job, content = read_job(engine, other_id)
+    invoices = [json.loads(line) for line in content.splitlines()]
+    assert [len(invoice["invoiceitems"]) for invoice in invoices] == [2, 2, 2]
+
+
+def test_export_resumes_after_worker_crash(export_dir, monkeypatch):
+    engine, seller_id = make_seller(5)
+    job_id = queue(engine, seller_id)
+
+    render = exports._render
+    calls = []
+
+    def crash_on_third_batch(*args):
+        calls.append(1)
+        if len(calls) == 3:
+            # the worker dies half way through writing the batch
+            with open(exports.export_path(args[0]), "ab") as file:
+                file.write(b"\x1f\x8b partial")
+            raise SystemExit
+        return render(*args)
+
+    monkeypatch.setattr(exports, "_render", crash_on_third_batch)
+    with pytest.raises(SystemExit):
+        exports.process_jobs(engine, batch_size=2)
+    monkeypatch.setattr(exports, "_render", render)
+
+    with Session(engine) as session:
+        job = session.get(ExportJob, job_id)
+        assert (job.status, job.exported) == (ExportStatus.RUNNING, 4)
+    # still leased by the dead worker
+    assert exports.process_jobs(engine, batch_size=2) == 0
+
+    monkeypatch.setattr(get_settings(), "export_lease_seconds", 0)
+    assert exports.process_jobs(engine, batch_size=2) == 1
+    job, content = read_job(engine, job_id)
+    assert (job.status, job.exported) == (ExportStatus.DONE, 5)
+    rows = list(csv.DictReader(io.StringIO(content)))
+    assert [row["customer_name"] for row in rows[::2]] == [
+        f"Customer {number}" for number in range(5)
+    ]
+
+
+def test_export_includes_archived_invoices(export_dir):
+    engine, seller_id = make_seller(4)
+    with Session(engine) as session:
+        for number, invoice in enumerate(
+            session.exec(select(InvoiceCreate).order_by(InvoiceCreate.created_date)).all()
+        ):
+            if number < 2:
+                invoice.created_date = datetime(2020, 1, number + 1)
+                session.add(invoice)
+        session.commit()
+    assert archive_invoices(engine, retention_days=30) == 2
+    job_id = queue(engine, seller_id)
+    exports.process_jobs(engine, batch_size=3)
+
+    job, content = read_job(engine, job_id)
+    assert (job.total, job.exported) == (4, 4)
+    rows = list(csv.DictReader(io.StringIO(content)))
+    assert [row["customer_name"] for row in rows[::2]] == [
+        f"Customer {number}" for number in range(4)
+    ]
+    assert rows[0]["created_date"].startswith("2020-01-01")
+
+
+def test_a_worker_that_lost_its_lease_stops(export_dir, monkeypatch):
+    engine, seller_id = make_seller(3)
+    job_id = queue(engine, seller_id)
+    claimed_id, slow_lease = exports.claim_job(engine)
+    assert claimed_id == job_id
+
+    # the slow worker misses its lease, another one takes the job and runs it
+    monkeypatch.setattr(get_settings(), "export_lease_seconds", 0)
+    assert exports.process_jobs(engine) == 1
+    job, content = read_job(engine, job_id)
+    assert job.status == ExportStatus.DONE
+
+    with pytest.raises(exports.LeaseLost):
+        exports.run_export(engine, job_id, slow_lease)
+    # neither the file nor the job were touched
+    assert read_job(engine, job_id)[1] == content
+    with Session(engine) as session:
+        assert session.get(ExportJob, job_id).status == ExportStatus.DONE
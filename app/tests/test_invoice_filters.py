@@ -0,0 +1,150 @@
+import json
+import os
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import event
+from sqlmodel import SQLModel, Session, create_engine, select
+from app import crud
+from app.models import CreateSeller, InvoiceCreate, InvoiceFilter, InvoiceItems, Product
+
+FILTERS = [
+    {},
+    {"status": "Pending"},
+    {"payment_mode": "Card"},
+    {"created_from": datetime(2024, 1, 1), "created_to": datetime(2024, 2, 1)},
+    {"min_total": 10.0, "max_total": 100.0},
+    {
+        "status": "Pending",
+        "payment_mode": "Card",
+        "created_from": datetime(2024, 1, 1),
+        "created_to": datetime(2024, 2, 1),
+        "min_total": 10.0,
+    },
+]
+
+
+def seed(engine):
+    SQLModel.metadata.create_all(engine)
+    seller = CreateSeller(phone_number="09120000009", password="planpass123")
+    other = CreateSeller(phone_number="09120000008", password="planpass123")
+    with Session(engine) as session:
+        session.add(seller)
+        session.add(other)
+        for day in range(60):
+            session.add(
+                InvoiceCreate(
+                    seller_id=seller.id if day % 2 else other.id,
+                    total_price=float(day),
+                    status="Paid" if day % 3 else "Pending",
+                    payment_mode="Card" if day % 5 else "Cash",
+                    created_date=datetime(2024, 1, 1) + timedelta(days=day),
+                )
+            )
+        session.commit()
+        return seller.id
+
+
+def listing_sql(engine, seller_id, filters):
+    """
+    Run the real listing query and capture the SQL sent for the hot table.
+    """
+    captured = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().startswith("SELECT") and "FROM invoicecreate" in statement:
+            captured.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", capture)
+    try:
+        with Session(engine) as session:
+            crud.get_seller_invoices(
+                session=session,
+                user_id=seller_id,
+                offset=0,
+                limit=10,
+                filters=InvoiceFilter(**filters),
+            )
+    finally:
+        event.remove(engine, "before_cursor_execute", capture)
+    return captured[0]
+
+
+@pytest.mark.parametrize("filters", FILTERS)
+def test_sqlite_listing_uses_seller_index(filters):
+    engine = create_engine("sqlite://")
+    seller_id = seed(engine)
+    statement, parameters = listing_sql(engine, seller_id, filters)
+    with engine.connect() as conn:
+        plan = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).all()
+    details = [row[-1] for row in plan if "invoicecreate" in row[-1]]
+    assert details, plan
+    assert all("INDEX ix_invoicecreate_seller" in detail for detail in details), plan
+
+
+def test_sqlite_product_invoices_use_product_index():
+    engine = create_engine("sqlite://")
+    seller_id = seed(engine)
+    with Session(engine) as session:
+        product = Product(name="Indexed", price=1.0, seller_id=seller_id)
+        session.add(product)
+        for invoice in session.exec(select(InvoiceCreate)).all():
+            session.add(
+                InvoiceItems(
+                    invoice_id=invoice.id,
+                    product_id=product.id,
+                    quantity=1,
+                    total_price=1.0,
+                )
+            )
+        session.commit()
+        product_id = product.id
+
+    captured = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if "FROM invoiceitems" in statement:
+            captured.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", capture)
+    try:
+        with Session(engine) as session:
+            invoices = crud.get_product_invoices(
+                session=session,
+                user_id=seller_id,
+                product_id=product_id,
+                offset=0,
+                limit=10,
+            )
+    finally:
+        event.remove(engine, "before_cursor_execute", capture)
+    assert len(invoices) == 10
+    statement, parameters = captured[0]
+    with engine.connect() as conn:
+        plan = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).all()
+    details = [row[-1] for row in plan if "invoiceitems" in row[-1]]
+    assert details, plan
+    assert all(
+        "INDEX ix_invoiceitems_product_invoice" in detail for detail in details
+    ), plan
+
+
+@pytest.mark.skipif(
+    not os.getenv("TEST_POSTGRES_URL"), reason="TEST_POSTGRES_URL is not set"
+)
+@pytest.mark.parametrize("filters", FILTERS)
+def test_postgres_listing_uses_seller_index(filters):
+    engine = create_engine(os.environ["TEST_POSTGRES_URL"])
+    SQLModel.metadata.drop_all(engine)
+    try:
+        seller_id = seed(engine)
+        statement, parameters = listing_sql(engine, seller_id, filters)
+        with engine.connect() as conn:
+            conn.exec_driver_sql("SET enable_seqscan = off")
+            plan = conn.exec_driver_sql(
+                f"EXPLAIN (FORMAT JSON) {statement}", parameters
+            ).scalar()
+        plan_text = json.dumps(plan)
+        assert '"Seq Scan"' not in plan_text, plan_text
+        assert '"Index Name": "ix_invoicecreate_seller' in plan_text, plan_text
+    finally:
+        SQLModel.metadata.drop_all(engine)
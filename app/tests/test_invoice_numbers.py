@@ -0,0 +1,115 @@
+import threading
+import uuid
+from sqlmodel import SQLModel, Session, create_engine
+from app import crud
+from app.models import InvoiceInput
+from app.utils.invoice_numbers import InvoiceNumbers
+
+
+def make_engine(tmp_path):
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'numbers.db'}", connect_args={"timeout": 30}
+    )
+    SQLModel.metadata.create_all(engine)
+    return engine
+
+
+def test_workers_take_blocks_without_duplicates(tmp_path):
+    engine = make_engine(tmp_path)
+    seller_id = uuid.uuid4()
+    workers = [InvoiceNumbers(block=5), InvoiceNumbers(block=5)]
+    numbers: list[str] = []
+
+    def allocate(worker):
+        for _ in range(12):
+            with Session(engine) as session:
+                numbers.extend(worker.allocate(session, seller_id, 2026))
+
+    threads = [
+        threading.Thread(target=allocate, args=(worker,))
+        for worker in workers
+        for _ in range(2)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(set(numbers)) == len(numbers) == 48
+    assert all(number.startswith("INV-2026-") for number in numbers)
+    # at most one partly used block per worker is left over
+    assert max(int(number[-6:]) for number in numbers) <= 48 + 2 * 5
+
+    with Session(engine) as session:
+        assert workers[0].allocate(session, seller_id, 2027, count=7) == [
+            f"INV-2027-{value:06d}" for value in range(1, 8)
+        ]
+
+
+def test_a_slow_refill_only_holds_up_its_own_seller(tmp_path):
+    engine = make_engine(tmp_path)
+    slow, other = uuid.uuid4(), uuid.uuid4()
+    worker = InvoiceNumbers(block=5)
+    take, release = worker._take, threading.Event()
+
+    def slow_take(session, seller_id, year, count):
+        if seller_id == slow:
+            release.wait(5)
+        return take(session, seller_id, year, count)
+
+    def allocate_slow():
+        with Session(engine) as session:
+            worker.allocate(session, slow, 2026)
+
+    worker._take = slow_take
+    stuck = threading.Thread(target=allocate_slow)
+    stuck.start()
+    try:
+        with Session(engine) as session:
+            assert worker.allocate(session, other, 2026) == ["INV-2026-000001"]
+        # the refill of the slow seller is still waiting
+        assert stuck.is_alive()
+    finally:
+        release.set()
+        stuck.join()
+
+
+def test_gapless_numbers_come_back_on_rollback(tmp_path):
+    engine = make_engine(tmp_path)
+    seller_id = uuid.uuid4()
+    numbers = InvoiceNumbers(prefix="F", policy="gapless")
+    with Session(engine) as session:
+        assert numbers.allocate(session, seller_id, 2026) == ["F-2026-000001"]
+        session.rollback()
+        assert numbers.allocate(session, seller_id, 2026, count=2) == [
+            "F-2026-000001",
+            "F-2026-000002",
+        ]
+        session.commit()
+        assert numbers.allocate(session, seller_id, 2026) == ["F-2026-000003"]
+
+
+def test_created_invoices_are_found_by_number(tmp_path):
+    engine = make_engine(tmp_path)
+    seller_id, other = uuid.uuid4(), uuid.uuid4()
+    with Session(engine) as session:
+        first = crud.create_invoice(
+            session=session, invoice=InvoiceInput(total_price=1.0), user_id=seller_id
+        )
+        second = crud.create_invoice(
+            session=session, invoice=InvoiceInput(total_price=2.0), user_id=seller_id
+        )
+        assert first.number != second.number
+        assert first.number.startswith(f"INV-{first.created_date.year}-")
+
+        found = crud.get_invoice_by_number(
+            session=session, seller_id=seller_id, number=second.number
+        )
+        assert found.id == second.id
+        assert crud.get_invoice_by_number(
+            session=session, seller_id=other, number=second.number
+        ) is None
+
+        crud.delete_invoice(session=session, invoice_id=second.id, user_id=seller_id)
+        assert crud.get_invoice_by_number(
+            session=session, seller_id=seller_id, number=second.number
+        ) is None
@@ -0,0 +1,86 @@
+import asyncio
+import uuid
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app.api import deps
+from app.api.routers import login, signup, users
+from app.utils.limiter import FairLimiter, QueueTimeout
+
+
+def test_freed_capacity_goes_to_sellers_in_turn():
+    limiter = FairLimiter(capacity=2, seller_capacity=2, queue_seconds=5)
+    busy, calm = uuid.uuid4(), uuid.uuid4()
+    order: list[str] = []
+
+    async def request(seller_id, name):
+        async with limiter.slot(seller_id, 1):
+            order.append(name)
+            await asyncio.sleep(0.01)
+
+    async def run():
+        tasks = [asyncio.create_task(request(busy, f"busy{i}")) for i in range(6)]
+        await asyncio.sleep(0)
+        tasks += [asyncio.create_task(request(calm, f"calm{i}")) for i in range(2)]
+        await asyncio.gather(*tasks)
+
+    asyncio.run(run())
+    # the calm seller does not wait behind the whole backlog of the busy one
+    assert order.index("calm1") < order.index("busy5")
+    assert order[2:6] == ["busy2", "calm0", "busy3", "calm1"]
+    stats = limiter.stats()
+    assert stats["used"] == stats["waiting"] == 0
+    assert stats["admitted"] == 8 and stats["queued"] == 6
+    assert stats["wait_max_ms"] > 0
+
+
+def test_seller_share_and_queue_timeout():
+    limiter = FairLimiter(capacity=10, seller_capacity=4, queue_seconds=0.05)
+    seller_id, other = uuid.uuid4(), uuid.uuid4()
+
+    async def run():
+        await limiter.acquire(seller_id, limiter.cost("missing") or 3)
+        with pytest.raises(QueueTimeout):
+            await limiter.acquire(seller_id, 2)
+        await limiter.acquire(other, 4)  # other sellers are not held up
+        limiter.release(other, 4)
+        limiter.release(seller_id, 3)
+
+    asyncio.run(run())
+    assert limiter.stats()["timeouts"] == 1
+    assert limiter.used == 0 and not limiter._seller_used
+
+
+def test_limited_routes_answer_429_when_the_seller_is_at_its_share(monkeypatch):
+    limiter = FairLimiter(seller_capacity=2, costs={"get_invoices": 2}, queue_seconds=0)
+    monkeypatch.setattr(deps, "get_limiter", lambda: limiter)
+    app = FastAPI()
+    app.include_router(login.router)
+    app.include_router(signup.router)
+    app.include_router(users.router)
+    client = TestClient(app)
+    client.post(
+        "/signup",
+        json={
+            "email": "limited@example.com",
+            "phone_number": "09123456717",
+            "password": "limitedpass1",
+        },
+    )
+    token = client.post(
+        "/login/access-token",
+        params={"email": "limited@example.com", "password": "limitedpass1"},
+    ).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    seller_id = uuid.UUID(client.get("/login/me", headers=headers).json()["id"])
+
+    asyncio.run(limiter.acquire(seller_id, 2))
+    response = client.get("/user/get_invoices", headers=headers)
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "0"
+    # routes without a cost are not limited
+    assert client.get("/user/counts", headers=headers).status_code == 200
+
+    limiter.release(seller_id, 2)
+    assert client.get("/user/get_invoices", headers=headers).status_code == 404
+    assert limiter.used == 0
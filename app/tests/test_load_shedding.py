@@ -0,0 +1,88 @@
+import asyncio
+import time
+import anyio
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app.utils.load_shedding import LoadShedder, LoadSheddingMiddleware
+
+
+def make_shedder(**kwargs) -> LoadShedder:
+    return LoadShedder(
+        low_priority=["/user/get_invoices", "/user/exports"],
+        critical=["/login/access-token", "/invoice"],
+        **kwargs,
+    )
+
+
+def test_routes_are_shed_by_priority():
+    shedder = make_shedder(target_ms=50, retry_after=7)
+    app = FastAPI()
+    for path in (
+        "/api/v1/user/get_invoices",
+        "/api/v1/user/exports/{job_id}/download",
+        "/api/v1/user/counts",
+        "/api/v1/login/access-token",
+        "/api/v1/invoice",
+        "/health/live",
+    ):
+        app.add_api_route(path, lambda: {"ok": True})
+    app.add_middleware(LoadSheddingMiddleware, shedder=shedder)
+    client = TestClient(app)
+
+    def statuses(delay: float) -> list[int]:
+        codes = []
+        for path in (
+            "/api/v1/user/get_invoices",
+            "/api/v1/user/exports/1/download",
+            "/api/v1/user/counts",
+            "/api/v1/login/access-token",
+            "/api/v1/invoice",
+            "/health/live",
+        ):
+            shedder.delay = delay
+            codes.append(client.get(path).status_code)
+        return codes
+
+    assert statuses(0.0) == [200] * 6
+    assert statuses(0.08) == [503, 503, 200, 200, 200, 200]
+    assert statuses(0.2) == [503, 503, 503, 200, 200, 200]
+
+    shedder.delay = 0.08
+    response = client.get("/api/v1/user/get_invoices")
+    assert response.headers["Retry-After"] == "7"
+    assert shedder.stats()["shed_low"] == 5 and shedder.stats()["shed_normal"] == 1
+    assert shedder.in_flight == 0
+
+
+def test_probe_sees_a_saturated_threadpool():
+    shedder = make_shedder(target_ms=50, interval_ms=10)
+
+    async def run():
+        anyio.to_thread.current_default_thread_limiter().total_tokens = 1
+        busy = asyncio.create_task(anyio.to_thread.run_sync(time.sleep, 0.3))
+        await asyncio.sleep(0.01)
+        shedder.start()
+        await asyncio.sleep(0.15)
+        # the probe is still waiting behind the busy thread
+        assert shedder.queueing_delay() > 0.1
+        assert not shedder.admit("/api/v1/user/counts")
+        assert shedder.admit("/api/v1/login/access-token")
+        await busy
+        await asyncio.sleep(0.05)
+        assert shedder.queueing_delay() < 0.05
+        assert shedder.admit("/api/v1/user/get_invoices")
+        shedder.finish()
+        await asyncio.sleep(0.05)
+
+    asyncio.run(run())
+    assert shedder.delay == 0.0 and shedder.in_flight == 0
+
+
+def test_in_flight_limit_keeps_critical_routes():
+    shedder = make_shedder(target_ms=0, max_in_flight=2)
+    shedder.in_flight = 2
+    assert shedder.enabled
+    assert not shedder.admit("/api/v1/user/counts")
+    assert shedder.admit("/api/v1/invoice")
+    shedder.in_flight = 1
+    assert shedder.admit("/api/v1/user/get_invoices")
@@ -0,0 +1,94 @@
+from datetime import datetime, timedelta
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import event
+from sqlmodel import SQLModel, Session, create_engine, func, select
+from app import crud
+from app.db import enable_sqlite_foreign_keys
+from app.models import CreateSeller, InvoiceCreate, InvoiceInput, InvoiceItems
+from app.utils.archive import archive_invoices
+from app.utils.purge import purge_invoices
+
+
+def make_seller():
+    engine = enable_sqlite_foreign_keys(create_engine("sqlite://"))
+    SQLModel.metadata.create_all(engine)
+    seller = CreateSeller(phone_number="09120000010", password="purgepass123")
+    with Session(engine) as session:
+        session.add(seller)
+        session.commit()
+        return engine, seller.id
+
+
+def make_invoices(engine, seller_id, count):
+    with Session(engine) as session:
+        return [
+            crud.create_invoice(
+                session=session,
+                invoice=InvoiceInput(
+                    total_price=1.0,
+                    invoiceitems=[{"quantity": 1, "total_price": 1.0}] * 2,
+                ),
+                user_id=seller_id,
+            ).id
+            for _ in range(count)
+        ]
+
+
+def count(session, model):
+    return session.exec(select(func.count()).select_from(model)).one()
+
+
+def test_soft_delete_hides_the_invoice_from_reads():
+    engine, seller_id = make_seller()
+    ids = make_invoices(engine, seller_id, 3)
+    with Session(engine) as session:
+        crud.delete_invoice(session=session, invoice_id=ids[0], user_id=seller_id)
+        with pytest.raises(HTTPException) as error:
+            crud.delete_invoice(session=session, invoice_id=ids[0], user_id=seller_id)
+        assert error.value.status_code == 404
+
+        assert crud.get_invoice_by_id(session=session, invoice_id=str(ids[0])) is None
+        listed = crud.get_seller_invoices(
+            session=session, user_id=seller_id, offset=0, limit=10
+        )
+        assert {invoice.id for invoice in listed} == set(ids[1:])
+        assert crud.count_seller_invoices(session=session, user_id=seller_id) == 2
+        # the tombstone and its items are still there until the purge
+        assert (count(session, InvoiceCreate), count(session, InvoiceItems)) == (3, 6)
+
+    # tombstones are not archived, they are purged
+    assert archive_invoices(engine, retention_days=-1) == 2
+    assert purge_invoices(engine, retention_days=1) == 0
+    assert purge_invoices(engine, retention_days=0) == 1
+    with Session(engine) as session:
+        assert (count(session, InvoiceCreate), count(session, InvoiceItems)) == (0, 0)
+
+
+def test_permanent_delete_is_one_statement_cascading_to_items():
+    engine, seller_id = make_seller()
+    ids = make_invoices(engine, seller_id, 2)
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement.split()[0])
+
+    with Session(engine) as session:
+        event.listen(engine, "before_cursor_execute", capture)
+        crud.delete_invoice(session=session, invoice_id=ids[0], permanent=True)
+        event.remove(engine, "before_cursor_execute", capture)
+        assert statements.count("DELETE") == 1
+        assert (count(session, InvoiceCreate), count(session, InvoiceItems)) == (1, 2)
+        assert crud.get_seller_counts(session=session, seller_id=seller_id).invoices == 1
+
+
+def test_purge_finds_tombstones_through_their_index():
+    engine, _ = make_seller()
+    statement = str(
+        select(InvoiceCreate.id)
+        .where(InvoiceCreate.deleted_at < datetime.now() - timedelta(days=30))
+        .compile(engine, compile_kwargs={"literal_binds": True})
+    )
+    with engine.connect() as conn:
+        plan = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}").all()
+    assert "ix_invoicecreate_deleted_at" in plan[0][-1], plan
@@ -0,0 +1,34 @@
+import uuid
+from sqlmodel import SQLModel, create_engine
+from app.api.deps import RequestSession
+from app.models import CreateSeller, Product
+
+
+def test_release_gives_the_connection_back_after_a_read(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'sessions.db'}")
+    SQLModel.metadata.create_all(engine)
+    seller = CreateSeller(phone_number="09123456715", password="sessionpass1")
+    seller_id = seller.id
+    with RequestSession(engine) as session:
+        session.add(seller)
+        session.commit()
+
+    with RequestSession(engine) as session:
+        assert engine.pool.checkedout() == 0  # nothing checked out until used
+        user = session.get(CreateSeller, seller_id)
+        assert engine.pool.checkedout() == 1
+        session.release()
+        assert engine.pool.checkedout() == 0
+        # the loaded user is not expired, reading it needs no connection
+        assert user.phone_number == "09123456715"
+        assert engine.pool.checkedout() == 0
+
+        # a transaction that wrote is left alone
+        session.add(Product(name="P", price=1.0, seller_id=user.id, id=uuid.uuid4()))
+        session.flush()
+        session.release()
+        assert session.in_transaction()
+        session.rollback()
+        session.get(CreateSeller, seller_id)
+        session.release()
+        assert not session.in_transaction()
@@ -0,0 +1,132 @@
+import uuid
+from datetime import date, datetime, timedelta
+from sqlmodel import SQLModel, Session, create_engine, delete, select
+from app import crud
+from app.models import (
+    InputProduct,
+    InvoiceCreate,
+    InvoiceInput,
+    InvoiceItemUpdate,
+    InvoiceUpdate,
+    ProductDailySales,
+    ProductSalesFilter,
+)
+from app.utils import sales
+from app.utils.sales import reconcile_sales
+
+
+def make_seller():
+    engine = create_engine("sqlite://")
+    SQLModel.metadata.create_all(engine)
+    session = Session(engine)
+    seller_id = uuid.uuid4()
+    crud.create_product(
+        session=session,
+        products=[InputProduct(name="A", price=1.0), InputProduct(name="B", price=2.0)],
+        user_id=seller_id,
+    )
+    products = {
+        product.name: product.id
+        for product in crud.get_seller_product(session=session, seller_id=seller_id)
+    }
+    return engine, session, seller_id, products
+
+
+def sell(session, seller_id, items):
+    return crud.create_invoice(
+        session=session,
+        invoice=InvoiceInput(
+            total_price=sum(total for _, _, total in items),
+            invoiceitems=[
+                {"product_id": product_id, "quantity": quantity, "total_price": total}
+                for product_id, quantity, total in items
+            ],
+        ),
+        user_id=seller_id,
+    )
+
+
+def report(session, seller_id, **filters):
+    return [
+        (row.name, row.quantity, row.revenue)
+        for row in crud.get_product_sales(
+            session=session,
+            seller_id=seller_id,
+            filters=ProductSalesFilter(**filters),
+        )
+    ]
+
+
+def test_sales_follow_invoice_writes():
+    engine, session, seller_id, products = make_seller()
+    a, b = products["A"], products["B"]
+    first = sell(session, seller_id, [(a, 3, 3.0), (b, 1, 2.0)])
+    sell(session, seller_id, [(a, 2, 2.0)])
+    third = sell(session, seller_id, [(b, 3, 8.1)])
+    today = date.today()
+
+    assert report(session, seller_id) == [("A", 5, 5.0), ("B", 4, 10.1)]
+    assert report(session, seller_id, order_by="revenue", limit=1) == [
+        ("B", 4, 10.1)
+    ]
+    assert report(session, seller_id, date_from=today, date_to=today) == [
+        ("A", 5, 5.0),
+        ("B", 4, 10.1),
+    ]
+    assert report(session, seller_id, date_to=today - timedelta(days=1)) == []
+
+    # the second line of the first invoice goes, the first one changes
+    item = next(item for item in first.invoiceitems if item.product_id == a)
+    crud.update_invoice(
+        session=session,
+        up_invoice=InvoiceUpdate(
+            id=first.id,
+            invoiceitems=[InvoiceItemUpdate(id=item.id, quantity=1, total_price=1.5)],
+        ),
+        user_id=seller_id,
+    )
+    assert report(session, seller_id) == [("B", 3, 8.1), ("A", 3, 3.5)]
+
+    crud.delete_invoice(session=session, invoice_id=third.id)
+    assert report(session, seller_id) == [("A", 3, 3.5)]
+    session.close()
+
+    assert reconcile_sales(engine) == 1  # the emptied row of B is dropped
+    assert reconcile_sales(engine) == 0
+
+
+def test_reconcile_rebuilds_sales():
+    engine, session, seller_id, products = make_seller()
+    invoice = sell(session, seller_id, [(products["A"], 2, 4.5)])
+    # rewritten outside of crud: the aggregate still has it on today
+    db_invoice = session.get(InvoiceCreate, invoice.id)
+    db_invoice.created_date = datetime(2024, 3, 5, 10)
+    session.add(db_invoice)
+    session.commit()
+    session.close()
+
+    assert reconcile_sales(engine) == 2
+    with Session(engine) as session:
+        row = session.exec(select(ProductDailySales)).one()
+        assert (row.day, row.quantity, row.revenue) == (date(2024, 3, 5), 2, 4.5)
+
+
+def test_reconcile_keeps_sales_landing_meanwhile(monkeypatch):
+    engine, session, seller_id, products = make_seller()
+    a = products["A"]
+    for _ in range(3):
+        sell(session, seller_id, [(a, 1, 0.1)])
+    session.exec(delete(ProductDailySales))
+    session.commit()
+
+    read = sales._sales_deltas
+
+    def read_then_sell(reading):
+        deltas = read(reading)
+        sell(session, seller_id, [(a, 1, 0.1)])
+        return deltas
+
+    monkeypatch.setattr(sales, "_sales_deltas", read_then_sell)
+    assert reconcile_sales(engine) == 1
+    assert report(session, seller_id) == [("A", 4, 0.4)]
+    session.close()
@@ -0,0 +1,45 @@
+import time
+from passlib.hash import bcrypt
+from sqlmodel import SQLModel, Session, create_engine
+from app import crud
+from app.config import get_settings
+from app.models import CreateSeller
+from app.utils.security import calibrate, password_needs_update
+
+
+def test_login_rehashes_an_outdated_hash(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'rehash.db'}")
+    SQLModel.metadata.create_all(engine)
+    old_hash = bcrypt.using(rounds=4).hash("rehashpass123")
+    seller = CreateSeller(
+        email="rehash@example.com", phone_number="09123456714", password=old_hash
+    )
+    with Session(engine) as session:
+        session.add(seller)
+        session.commit()
+        assert password_needs_update(old_hash)
+        assert crud.authenticate(
+            session=session, email="rehash@example.com", password="rehashpass123"
+        )
+
+    deadline = time.monotonic() + 10
+    while True:
+        with Session(engine) as session:
+            new_hash = session.get(CreateSeller, seller.id).password
+        if new_hash != old_hash or time.monotonic() > deadline:
+            break
+        time.sleep(0.05)
+    assert new_hash.startswith(f"$2b${get_settings().bcrypt_rounds:02d}$")
+    assert not password_needs_update(new_hash)
+    with Session(engine) as session:
+        assert crud.authenticate(
+            session=session, email="rehash@example.com", password="rehashpass123"
+        )
+        assert not crud.authenticate(
+            session=session, email="rehash@example.com", password="wrongpass123"
+        )
+
+
+def test_calibrate_stays_within_bounds():
+    assert calibrate(target=60.0, min_rounds=4, max_rounds=6) == 6
+    assert calibrate(target=0.0, min_rounds=4, max_rounds=6) == 4
@@ -0,0 +1,43 @@
+import subprocess
+import sys
+import pytest
+from fastapi.testclient import TestClient
+from app.config import get_settings
+from app.main import app
+
+
+def test_import_has_no_side_effects():
+    code = (
+        "import sys, app.main\n"
+        "from app.db import database\n"
+        "assert not database.initialized\n"
+        "assert 'passlib' not in sys.modules\n"
+    )
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True)
+    assert result.returncode == 0, result.stderr.decode()
+
+
+def test_ready_after_lifespan():
+    with TestClient(app) as client:
+        assert client.get("/health/live").status_code == 200
+        assert client.get("/health/ready").status_code == 200
+
+
+def test_startup_fails_without_a_secret_key(monkeypatch):
+    monkeypatch.setattr(get_settings(), "secret_key", "")
+    with pytest.raises(RuntimeError, match="APP_SECRET_KEY"):
+        with TestClient(app):
+            pass
+
+
+def test_stats_need_the_stats_token(monkeypatch):
+    with TestClient(app) as client:
+        assert client.get("/health/stats").status_code == 404
+        monkeypatch.setattr(get_settings(), "stats_token", "operator-token")
+        wrong = {"Authorization": "Bearer guess"}
+        assert client.get("/health/stats", headers=wrong).status_code == 404
+        right = {"Authorization": "Bearer operator-token"}
+        response = client.get("/health/stats", headers=right)
+        assert response.status_code == 200
+        assert "limiter" in response.json()
+        assert "/health/stats" not in client.get("/openapi.json").json()["paths"]
@@ -0,0 +1,125 @@
+import json
+import threading
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app.api.routers import login, signup, users
+from app.utils.tracing import JsonlExporter, Span, Tracer, TracingMiddleware, span
+
+
+def make_client(tracer: Tracer) -> TestClient:
+    app = FastAPI()
+    app.include_router(login.router)
+    app.include_router(signup.router)
+    app.include_router(users.router)
+    app.add_middleware(TracingMiddleware, tracer=tracer)
+    return TestClient(app)
+
+
+def read_spans(path) -> list[dict]:
+    if not path.exists():
+        return []
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+
+def test_sampled_requests_are_traced_down_to_sql(tmp_path):
+    path = tmp_path / "traces.jsonl"
+    tracer = Tracer(1.0, JsonlExporter(path))
+    client = make_client(tracer)
+    client.post(
+        "/signup",
+        json={
+            "email": "traced@example.com",
+            "phone_number": "09123456718",
+            "password": "tracedpass1",
+        },
+    )
+    token = client.post(
+        "/login/access-token",
+        params={"email": "traced@example.com", "password": "tracedpass1"},
+    ).json()["access_token"]
+    tracer.close()
+    path.unlink()  # keep only the traced request
+
+    incoming = "00-0af7651916cd43dd8448eb211c80319c-b7ad6b7169203331-01"
+    response = client.get(
+        "/user/counts",
+        headers={"Authorization": f"Bearer {token}", "traceparent": incoming},
+    )
+    tracer.close()
+    assert response.status_code == 200
+    trace_id = "0af7651916cd43dd8448eb211c80319c"
+    assert response.headers["traceparent"].startswith(f"00-{trace_id}-")
+
+    spans = read_spans(path)
+    assert {s["trace_id"] for s in spans} == {trace_id}
+    by_id = {s["span_id"]: s for s in spans}
+    root = next(s for s in spans if s["name"] == "GET /user/counts")
+    assert root["parent_id"] == "b7ad6b7169203331"
+    assert root["attributes"]["status"] == 200
+    assert root["attributes"]["route"] == "/user/counts"
+    assert root["span_id"] == response.headers["traceparent"].split("-")[2]
+
+    def parent(name):
+        return by_id[next(s for s in spans if s["name"] == name)["parent_id"]]
+
+    assert parent("current_user") is root
+    assert parent("crud.get_seller_counts") is root
+    assert parent("crud.get_counters")["name"] == "crud.get_seller_counts"
+    assert parent("serialize_response") is root
+    sql = [s for s in spans if s["name"] == "sql"]
+    assert {by_id[s["parent_id"]]["name"] for s in sql} >= {
+        "current_user",
+        "crud.get_counters",
+    }
+    assert all(s["duration_ms"] >= 0 for s in spans)
+
+
+def test_unsampled_requests_leave_no_trace(tmp_path):
+    path = tmp_path / "traces.jsonl"
+    client = make_client(Tracer(1.0, JsonlExporter(path)))
+    # the caller decided not to sample
+    response = client.get(
+        "/login/me",
+        headers={"traceparent": "00-0af7651916cd43dd8448eb211c80319c-b7ad6b7169203331-00"},
+    )
+    assert response.status_code == 401
+    assert "traceparent" not in response.headers
+
+    off = Tracer(0.0, JsonlExporter(path))
+    assert not off.enabled
+    response = make_client(off).get("/login/me")
+    assert "traceparent" not in response.headers
+    assert read_spans(path) == []
+    with span("outside a request") as nothing:
+        assert nothing is None
+
+
+def test_callers_force_sampling_within_a_budget(tmp_path):
+    tracer = Tracer(1e-12, JsonlExporter(tmp_path / "traces.jsonl"), forced_per_second=2)
+    sampled = "00-0af7651916cd43dd8448eb211c80319c-b7ad6b7169203331-01"
+    roots = [tracer.start("GET /", sampled) for _ in range(5)]
+    assert [root is not None for root in roots] == [True, True, False, False, False]
+    assert roots[0].trace_id == "0af7651916cd43dd8448eb211c80319c"
+    assert tracer.stats()["forced_limited"] == 3
+
+
+def test_export_drops_traces_when_the_writer_falls_behind(tmp_path):
+    path = tmp_path / "traces.jsonl"
+    exporter = JsonlExporter(path, max_queued=1)
+    writing, release = threading.Event(), threading.Event()
+
+    class SlowSpan:
+        def to_dict(self):
+            writing.set()
+            release.wait(5)
+            return {"name": "slow"}
+
+    exporter.export([SlowSpan()])
+    assert writing.wait(5)
+    trace = [Span([], "0" * 32, "queued", None, {})]
+    exporter.export(trace)
+    exporter.export(trace)  # the queue is full
+    assert exporter.dropped == 1
+    release.set()
+    exporter.close()
+    assert [s["name"] for s in read_spans(path)] == ["slow", "queued"]
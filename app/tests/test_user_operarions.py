@@ -1,12 +1,15 @@
+import pytest
 from fastapi import FastAPI
 from fastapi.testclient import TestClient
-from app.api.routers import login, signup, users
+from fastapi.websockets import WebSocketDisconnect
+from app.api.routers import events, login, signup, users
 
 # Create a FastAPI app instance and include routers
 app = FastAPI()
 app.include_router(login.router)
 app.include_router(signup.router)
 app.include_router(users.router)
+app.include_router(events.router)
 
 
 client = TestClient(app)
@@ -279,3 +282,325 @@ def test_get_user_invoice():
     customer_names = [inv["customer_name"] for inv in invoices]
     assert "CustomerA" in customer_names
     assert "CustomerB" in customer_names
+
+
+def create_product_invoices(headers):
+    """
+    Two products and an invoice for each, returns the product ids.
+    """
+    products = [{"name": "Pen", "price": 15.0}, {"name": "Ink", "price": 25.0}]
+    prod_resp = client.post("/user/newproduct", json=products, headers=headers)
+    products_id = [product["id"] for product in prod_resp.json()]
+    for customer, product_id, quantity, total in (
+        ("CustomerA", products_id[0], 2, 30.0),
+        ("CustomerB", products_id[1], 1, 25.0),
+    ):
+        invoice = {
+            "customer_name": customer,
+            "total_price": total,
+            "invoiceitems": [
+                {"product_id": product_id, "quantity": quantity, "total_price": total}
+            ],
+        }
+        resp = client.post("/user/createInvoice", json=invoice, headers=headers)
+        assert resp.status_code == 200
+    return products_id
+
+
+def test_get_product_invoices():
+    headers = get_auth_headers("byproduct@example.com", "byproduct123", "09123456724")
+    products_id = create_product_invoices(headers)
+    product_resp = client.get(
+        "/user/get_product_invoices",
+        params={"product_id": products_id[1]},
+        headers=headers,
+    )
+    assert product_resp.status_code == 200
+    assert [inv["customer_name"] for inv in product_resp.json()] == ["CustomerB"]
+
+
+def test_product_sales_report():
+    headers = get_auth_headers("bestseller@example.com", "bestseller123", "09123456725")
+    create_product_invoices(headers)
+    report_resp = client.get(
+        "/user/reports/products", params={"order_by": "revenue"}, headers=headers
+    )
+    assert report_resp.status_code == 200
+    assert [(row["quantity"], row["revenue"]) for row in report_resp.json()] == [
+        (2, 30.0),
+        (1, 25.0),
+    ]
+
+
+def test_update_invoices_status():
+    headers = get_auth_headers("bulkstatus@example.com", "bulkpass123", "09123456702")
+    invoice = {"customer_name": "Bulk", "status": "Pending", "total_price": 10.0}
+    ids = [
+        client.post("/user/createInvoice", json=invoice, headers=headers).json()["id"]
+        for _ in range(3)
+    ]
+
+    response = client.patch(
+        "/user/invoices/status",
+        json={"ids": ids[:2], "status": "Paid", "payment_mode": "Card"},
+        headers=headers,
+    )
+    assert response.status_code == 200
+    assert sorted(response.json()["updated"]) == sorted(ids[:2])
+
+    invoices = client.get("/user/get_invoices", headers=headers).json()
+    statuses = {inv["id"]: (inv["status"], inv["payment_mode"]) for inv in invoices}
+    assert statuses[ids[0]] == ("Paid", "Card")
+    assert statuses[ids[2]] == ("Pending", "Cash")
+
+    # another seller cannot touch these invoices
+    other = get_auth_headers("bulkother@example.com", "bulkpass123", "09123456703")
+    response = client.patch(
+        "/user/invoices/status", json={"ids": ids, "status": "Void"}, headers=other
+    )
+    assert response.json()["updated"] == []
+
+    response = client.patch(
+        "/user/invoices/status", json={"status": "Paid"}, headers=headers
+    )
+    assert response.status_code == 400
+
+
+def test_partial_update_invoice_items():
+    headers = get_auth_headers("partialupd@example.com", "partpass123", "09123456704")
+    invoice = {
+        "customer_name": "Partial",
+        "total_price": 30.0,
+        "invoiceitems": [
+            {"quantity": 1, "total_price": 10.0},
+            {"quantity": 2, "total_price": 20.0},
+        ],
+    }
+    created = client.post("/user/createInvoice", json=invoice, headers=headers).json()
+    first, second = created["invoiceitems"]
+
+    # header only: items are left alone
+    response = client.patch(
+        "/user/update_invoice",
+        json={"id": created["id"], "status": "Paid"},
+        headers=headers,
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert data["status"] == "Paid"
+    assert data["customer_name"] == "Partial"
+    assert len(data["invoiceitems"]) == 2
+
+    # update one item, drop the other, add a new one
+    response = client.patch(
+        "/user/update_invoice",
+        json={
+            "id": created["id"],
+            "total_price": 45.0,
+            "invoiceitems": [
+                {"id": first["id"], "quantity": 3},
+                {"quantity": 1, "total_price": 15.0},
+            ],
+        },
+        headers=headers,
+    )
+    assert response.status_code == 200
+    items = {item["id"]: item for item in response.json()["invoiceitems"]}
+    assert len(items) == 2
+    assert second["id"] not in items
+    assert items[first["id"]]["quantity"] == 3
+    assert items[first["id"]]["total_price"] == 10.0
+
+
+def test_invoice_money_and_enums_stay_compatible():
+    headers = get_auth_headers("compact@example.com", "compact1234", "09123456705")
+    invoice = {
+        "status": "paid",
+        "payment_mode": "BANK_TRANSFER",
+        "total_price": 0.3,
+        "invoiceitems": [{"quantity": 3, "total_price": 0.1}],
+    }
+    response = client.post("/user/createInvoice", json=invoice, headers=headers)
+    assert response.status_code == 200
+    data = response.json()
+    assert data["status"] == "Paid"
+    assert data["payment_mode"] == "Bank Transfer"
+    assert data["total_price"] == 0.3
+    assert data["invoiceitems"][0]["total_price"] == 0.1
+
+    # unknown values are refused the same way for both fields
+    for field, value in [("status", "NotAStatus"), ("payment_mode", "Crypto")]:
+        response = client.post(
+            "/user/createInvoice", json={**invoice, field: value}, headers=headers
+        )
+        assert response.status_code == 422
+    schema = app.openapi()["components"]["schemas"]
+    assert "rejected with 422" in schema["InvoiceStatus"]["description"]
+    assert "rejected with 422" in schema["PaymentMode"]["description"]
+
+
+def test_get_invoices_filtered():
+    headers = get_auth_headers("filtered@example.com", "filterpass1", "09123456706")
+    for status, mode, total in [("Pending", "Card", 50.0), ("Paid", "Card", 5.0)]:
+        invoice = {"status": status, "payment_mode": mode, "total_price": total}
+        client.post("/user/createInvoice", json=invoice, headers=headers)
+
+    response = client.get(
+        "/user/get_invoices",
+        params={"status": "Pending", "payment_mode": "Card", "min_total": 10},
+        headers=headers,
+    )
+    assert response.status_code == 200
+    assert [inv["total_price"] for inv in response.json()] == [50.0]
+    assert response.headers["X-Total-Count"] == "1"
+
+    response = client.get("/user/get_invoices", headers=headers)
+    assert response.headers["X-Total-Count"] == "2"
+    counts = client.get("/user/counts", headers=headers).json()
+    assert counts["invoices_by_status"] == {"Pending": 1, "Paid": 1}
+
+
+def test_import_csv_uploads():
+    headers = get_auth_headers("importer@example.com", "importpass123", "09123456707")
+    products = "name,price\nImported A,10\nImported B,oops\n"
+    response = client.post(
+        "/user/import/products",
+        files={"file": ("products.csv", products, "text/csv")},
+        headers=headers,
+    )
+    assert response.status_code == 200
+    result = response.json()
+    assert (result["imported"], result["failed"]) == (1, 1)
+    assert result["errors"][0]["line"] == 3
+
+    invoices = (
+        "invoice,customer_name,total_price,product_name,quantity,item_total_price\n"
+        "1,Imported,20,Imported A,2,20\n"
+    )
+    response = client.post(
+        "/user/import/invoices",
+        files={"file": ("invoices.csv", invoices, "text/csv")},
+        headers=headers,
+    )
+    assert response.status_code == 200
+    assert response.json()["imported"] == 1
+    listed = client.get("/user/get_invoices", headers=headers).json()
+    assert [invoice["customer_name"] for invoice in listed] == ["Imported"]
+
+
+def test_import_progress_can_be_polled():
+    headers = get_auth_headers("progress@example.com", "progresspass1", "09123456722")
+    assert client.get("/user/import/progress/upload-1", headers=headers).status_code == 404
+    response = client.post(
+        "/user/import/products",
+        params={"progress": "upload-1"},
+        files={"file": ("products.csv", "name,price\nPolled,3\n", "text/csv")},
+        headers=headers,
+    )
+    assert response.status_code == 200
+    progress = client.get("/user/import/progress/upload-1", headers=headers).json()
+    assert progress == response.json()
+    assert (progress["imported"], progress["done"]) == (1, True)
+
+    # keys are per seller
+    other = get_auth_headers("progress2@example.com", "progresspass2", "09123456723")
+    assert client.get("/user/import/progress/upload-1", headers=other).status_code == 404
+
+
+def test_export_job_download(tmp_path, monkeypatch):
+    from app.config import get_settings
+    from app.db import database
+    from app.utils.exports import process_jobs
+
+    monkeypatch.setattr(get_settings(), "export_dir", str(tmp_path))
+    headers = get_auth_headers("exporter@example.com", "exportpass123", "09123456708")
+    invoice = {"customer_name": "Exported", "total_price": 10.0}
+    client.post("/user/createInvoice", json=invoice, headers=headers)
+
+    response = client.post("/user/exports", json={"format": "csv"}, headers=headers)
+    assert response.status_code == 202
+    job_id = response.json()["id"]
+    assert response.json()["status"] == "Queued"
+    download = f"/user/exports/{job_id}/download"
+    assert client.get(download, headers=headers).status_code == 409
+
+    process_jobs(database.engine)
+    status = client.get(f"/user/exports/{job_id}", headers=headers).json()
+    assert (status["status"], status["total"], status["exported"]) == ("Done", 1, 1)
+    full = client.get(download, headers=headers)
+    assert full.status_code == 200
+    partial = client.get(download, headers={**headers, "Range": "bytes=0-9"})
+    assert partial.status_code == 206
+    assert partial.content == full.content[:10]
+
+
+def test_delete_invoice():
+    headers = get_auth_headers("deleter@example.com", "deletepass123", "09123456709")
+    other = get_auth_headers("notdeleter@example.com", "deletepass123", "09123456710")
+    invoice = {"customer_name": "Deleted", "total_price": 10.0}
+    invoice_id = client.post(
+        "/user/createInvoice", json=invoice, headers=headers
+    ).json()["id"]
+
+    assert client.delete(f"/user/invoices/{invoice_id}", headers=other).status_code == 403
+    assert client.delete(f"/user/invoices/{invoice_id}", headers=headers).status_code == 204
+    assert client.get("/invoice", params={"id": invoice_id}).status_code == 404
+    assert client.get("/user/get_invoices", headers=headers).status_code == 404
+    assert client.delete(f"/user/invoices/{invoice_id}", headers=headers).status_code == 404
+    response = client.delete(
+        f"/user/invoices/{invoice_id}", params={"permanent": True}, headers=headers
+    )
+    assert response.status_code == 204
+
+
+def test_dashboard():
+    headers = get_auth_headers("dashboard@example.com", "dashpass1234", "09123456712")
+    client.post("/user/newproduct", json=[{"name": "D", "price": 3.0}], headers=headers)
+    dashboard = client.get("/user/dashboard", headers=headers).json()
+    assert dashboard["profile"]["email"] == "dashboard@example.com"
+    assert dashboard["counts"]["products"] == 1
+    assert (dashboard["month"]["invoices"], dashboard["recent_invoices"]) == (0, [])
+
+    # the cached dashboard is dropped by the write
+    invoice = {"total_price": 6.0, "status": "Paid"}
+    client.post("/user/createInvoice", json=invoice, headers=headers)
+    dashboard = client.get("/user/dashboard", headers=headers).json()
+    assert dashboard["counts"]["invoices_by_status"] == {"Paid": 1}
+    assert (dashboard["month"]["total"], dashboard["month"]["paid"]) == (6.0, 6.0)
+    assert len(dashboard["recent_invoices"]) == 1
+
+
+def test_invoice_events_websocket():
+    headers = get_auth_headers("live@example.com", "livepass1234", "09123456713")
+    token = headers["Authorization"].split()[1]
+
+    with client.websocket_connect(f"/user/events/ws?token={token}") as websocket:
+        invoice = client.post(
+            "/user/createInvoice", json={"total_price": 1.0}, headers=headers
+        ).json()
+        event = websocket.receive_json()
+        assert (event["type"], event["invoice_ids"]) == ("created", [invoice["id"]])
+
+    with pytest.raises(WebSocketDisconnect) as error:
+        with client.websocket_connect("/user/events/ws?token=bad"):
+            pass
+    assert error.value.code == 1008
+
+
+def test_get_invoice_by_number():
+    headers = get_auth_headers("numbered@example.com", "numberpass123", "09123456716")
+    created = client.post(
+        "/user/createInvoice", json={"total_price": 3.0}, headers=headers
+    ).json()
+    assert created["number"].startswith("INV-")
+
+    by_number = f"/user/invoices/number/{created['number']}"
+    response = client.get(by_number, headers=headers)
+    assert response.status_code == 200
+    assert response.json()["id"] == created["id"]
+    missing = "/user/invoices/number/INV-1999-000001"
+    assert client.get(missing, headers=headers).status_code == 404
+    # numbers are guessable, they are never a public link
+    assert client.get(by_number).status_code == 401
+    other = get_auth_headers("numbered2@example.com", "numberpass456", "09123456727")
+    assert client.get(by_number, headers=other).status_code == 404
@@ -0,0 +1,138 @@
+"""
+Move invoices older than the retention window out of the hot tables.
+
+    python -m app.utils.archive [--days N] [--batch-size N] [--every SECONDS]
+
+Each batch is copied into `invoicearchive`/`invoiceitemsarchive` and deleted
+from `invoicecreate`/`invoiceitems` in one transaction with set based
+statements, so no rows are loaded into Python. Soft deleted invoices are
+left for `app.utils.purge`. On Postgres the month
+partitions of `invoicearchive` are created on demand. Every shard is
+processed.
+"""
+
+import argparse
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import Connection, Engine, delete, insert, select, text
+from app.config import get_settings
+from app.db import database
+from app.models import InvoiceArchive, InvoiceCreate, InvoiceItems, InvoiceItemsArchive
+
+_INVOICE_COLUMNS = [
+    column.name for column in InvoiceArchive.__table__.columns  # type: ignore[attr-defined]
+]
+_ITEM_COLUMNS = [
+    column.name for column in InvoiceItemsArchive.__table__.columns  # type: ignore[attr-defined]
+]
+
+
+def _month_start(day: datetime) -> datetime:
+    return datetime(day.year, day.month, 1)
+
+
+def _next_month(day: datetime) -> datetime:
+    return datetime(day.year + day.month // 12, day.month % 12 + 1, 1)
+
+
+def ensure_month_partitions(conn: Connection, first: datetime, last: datetime) -> None:
+    """
+    Create the monthly partitions of `invoicearchive` covering [first, last].
+    Only Postgres partitions the archive, other dialects use the plain table.
+    """
+    if conn.dialect.name != "postgresql":
+        return
+    month = _month_start(first)
+    while month <= last:
+        upper = _next_month(month)
+        conn.execute(
+            text(
+                f"CREATE TABLE IF NOT EXISTS invoicearchive_{month:%Y_%m} "
+                f"PARTITION OF invoicearchive "
+                f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{upper:%Y-%m-%d}')"
+            )
+        )
+        month = upper
+
+
+def archive_batch(conn: Connection, cutoff: datetime, batch_size: int) -> int:
+    """
+    Move one batch of invoices created before `cutoff` with their items.
+    Returns the number of invoices moved.
+    """
+    rows = conn.execute(
+        select(InvoiceCreate.id, InvoiceCreate.created_date)  # type: ignore[call-overload]
+        .where(InvoiceCreate.created_date < cutoff, InvoiceCreate.deleted_at.is_(None))
+        .order_by(InvoiceCreate.created_date)
+        .limit(batch_size)
+    ).all()
+    if not rows:
+        return 0
+    ids = [row.id for row in rows]
+    ensure_month_partitions(conn, rows[0].created_date, rows[-1].created_date)
+
+    invoices = InvoiceCreate.__table__  # type: ignore[attr-defined]
+    items = InvoiceItems.__table__  # type: ignore[attr-defined]
+    conn.execute(
+        insert(InvoiceArchive).from_select(
+            _INVOICE_COLUMNS,
+            select(*[invoices.c[name] for name in _INVOICE_COLUMNS]).where(
+                invoices.c.id.in_(ids)
+            ),
+        )
+    )
+    conn.execute(
+        insert(InvoiceItemsArchive).from_select(
+            _ITEM_COLUMNS,
+            select(*[items.c[name] for name in _ITEM_COLUMNS]).where(
+                items.c.invoice_id.in_(ids)
+            ),
+        )
+    )
+    conn.execute(delete(items).where(items.c.invoice_id.in_(ids)))
+    conn.execute(delete(invoices).where(invoices.c.id.in_(ids)))
+    return len(ids)
+
+
+def archive_invoices(
+    engine: Engine,
+    retention_days: int | None = None,
+    batch_size: int | None = None,
+) -> int:
+    """
+    Archive every invoice older than the retention window, one committed
+    batch at a time. Returns the number of invoices moved.
+    """
+    settings = get_settings()
+    retention_days = retention_days or settings.invoice_retention_days
+    batch_size = batch_size or settings.archive_batch_size
+    cutoff = datetime.now() - timedelta(days=retention_days)
+    moved = 0
+    while True:
+        with engine.begin() as conn:
+            count = archive_batch(conn, cutoff, batch_size)
+        moved += count
+        if count < batch_size:
+            return moved
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="python -m app.utils.archive")
+    parser.add_argument("--days", type=int)
+    parser.add_argument("--batch-size", type=int)
+    parser.add_argument(
+        "--every", type=int, default=0, help="repeat every N seconds (0 = run once)"
+    )
+    args = parser.parse_args()
+
+    while True:
+        for shard, engine in enumerate(database.router.engines):
+            moved = archive_invoices(engine, args.days, args.batch_size)
+            print(f"Shard {shard}: archived {moved} invoices")
+        if not args.every:
+            break
+        time.sleep(args.every)
+
+
+if __name__ == "__main__":
+    main()
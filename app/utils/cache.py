@@ -0,0 +1,573 @@
+"""
+Cache shared by the workers of the application.
+
+`CACHE_URL` picks the backend:
+
+- `memory://`: a dict in the worker, for a single worker and for tests.
+- `sqlite:///path/to/cache.db`: a file shared by the workers of one host.
+- `redis://host:port/db`: any server speaking the Redis protocol.
+
+`Cache` stores typed values under versioned namespaces on top of the backend.
+Invalidating a namespace bumps its version. Keys written under the old
+version are never read again and expire on their own. Every worker keeps the
+versions it has read for `CACHE_VERSION_SECONDS`, and the bumps are broadcast
+through the backend, so the other workers drop theirs at once.
+
+`get_or_set` lets one caller per key load a missing value (single-flight),
+across threads and, through a short lock key, across workers. The others wait
+for the value instead of stampeding the database when a hot key expires.
+
+A failing backend never fails a request: reads turn into misses and writes
+are skipped.
+"""
+
+import socket
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Callable, Iterable, TypeVar
+from urllib.parse import urlparse
+from pydantic import TypeAdapter
+from app.config import get_settings
+
+T = TypeVar("T")
+Subscriber = Callable[[str], None]
+
+# version keys outlive every value written under them
+VERSION_TTL = 7 * 24 * 3600
+
+
+class CacheBackend:
+    """
+    Byte values with a time to live, integer counters and a broadcast
+    channel reaching the subscribers of every worker, this one included.
+    """
+
+    def get(self, key: str) -> bytes | None:
+        raise NotImplementedError
+
+    def set(self, key: str, value: bytes, ttl: float) -> None:
+        raise NotImplementedError
+
+    def add(self, key: str, value: bytes, ttl: float) -> bool:
+        """
+        Set the key only if it is missing, returns whether it was set.
+        """
+        raise NotImplementedError
+
+    def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+    def incr(self, key: str) -> int:
+        raise NotImplementedError
+
+    def publish(self, message: str) -> None:
+        raise NotImplementedError
+
+    def subscribe(self, subscriber: Subscriber) -> None:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+
+class MemoryBackend(CacheBackend):
+    """
+    Values in this worker's memory, LRU evicted past `max_entries`.
+    """
+
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, tuple[float, bytes]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._subscribers: list[Subscriber] = []
+
+    def _live(self, key: str) -> tuple[float, bytes] | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _store(self, key: str, value: bytes, ttl: float) -> None:
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get(self, key: str) -> bytes | None:
+        with self._lock:
+            entry = self._live(key)
+            return entry[1] if entry else None
+
+    def set(self, key: str, value: bytes, ttl: float) -> None:
+        with self._lock:
+            self._store(key, value, ttl)
+
+    def add(self, key: str, value: bytes, ttl: float) -> bool:
+        with self._lock:
+            if self._live(key) is not None:
+                return False
+            self._store(key, value, ttl)
+            return True
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def incr(self, key: str) -> int:
+        with self._lock:
+            entry = self._live(key)
+            value = int(entry[1]) + 1 if entry else 1
+            expires = entry[0] if entry else time.monotonic() + VERSION_TTL
+            self._entries[key] = (expires, str(value).encode())
+            return value
+
+    def publish(self, message: str) -> None:
+        for subscriber in list(self._subscribers):
+            subscriber(message)
+
+    def subscribe(self, subscriber: Subscriber) -> None:
+        self._subscribers.append(subscriber)
+
+
+class SQLiteBackend(CacheBackend):
+    """
+    Values in a SQLite file shared by the workers of one host. Broadcasts
+    are rows of a message table that every worker polls every
+    `poll_interval` seconds.
+    """
+
+    def __init__(self, path: str, poll_interval: float = 0.5):
+        self.path = path
+        self.poll_interval = poll_interval
+        self._local = threading.local()
+        self._stopped = threading.Event()
+        self._writes = 0
+        with self._connection() as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS cache_entries "
+                "(key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL NOT NULL)"
+            )
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS cache_messages "
+                "(id INTEGER PRIMARY KEY AUTOINCREMENT, message TEXT NOT NULL, "
+                "created REAL NOT NULL)"
+            )
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            self._local.connection = connection
+        return connection
+
+    def get(self, key: str) -> bytes | None:
+        row = (
+            self._connection()
+            .execute(
+                "SELECT value FROM cache_entries WHERE key = ? AND expires > ?",
+                (key, time.time()),
+            )
+            .fetchone()
+        )
+        return None if row is None else bytes(row[0])
+
+    def _write(self, statement: str, parameters: tuple) -> sqlite3.Cursor:
+        connection = self._connection()
+        cursor = connection.execute(statement, parameters)
+        self._writes += 1
+        if self._writes % 1000 == 0:
+            now = time.time()
+            connection.execute("DELETE FROM cache_entries WHERE expires <= ?", (now,))
+            connection.execute("DELETE FROM cache_messages WHERE created < ?", (now - 60,))
+        return cursor
+
+    def set(self, key: str, value: bytes, ttl: float) -> None:
+        self._write(
+            "INSERT OR REPLACE INTO cache_entries VALUES (?, ?, ?)",
+            (key, value, time.time() + ttl),
+        )
+
+    def add(self, key: str, value: bytes, ttl: float) -> bool:
+        now = time.time()
+        cursor = self._write(
+            "INSERT INTO cache_entries VALUES (?, ?, ?) ON CONFLICT (key) DO UPDATE "
+            "SET value = excluded.value, expires = excluded.expires "
+            "WHERE cache_entries.expires <= ?",
+            (key, value, now + ttl, now),
+        )
+        return cursor.rowcount == 1
+
+    def delete(self, key: str) -> None:
+        self._write("DELETE FROM cache_entries WHERE key = ?", (key,))
+
+    def incr(self, key: str) -> int:
+        now = time.time()
+        row = self._write(
+            "INSERT INTO cache_entries VALUES (?, '1', ?) ON CONFLICT (key) DO UPDATE "
+            "SET value = CASE WHEN cache_entries.expires > ? "
+            "THEN CAST(CAST(cache_entries.value AS INTEGER) + 1 AS TEXT) ELSE '1' END "
+            "RETURNING value",
+            (key, now + VERSION_TTL, now),
+        ).fetchone()
+        return int(row[0])
+
+    def publish(self, message: str) -> None:
+        self._write(
+            "INSERT INTO cache_messages (message, created) VALUES (?, ?)",
+            (message, time.time()),
+        )
+
+    def subscribe(self, subscriber: Subscriber) -> None:
+        last = (
+            self._connection()
+            .execute("SELECT coalesce(max(id), 0) FROM cache_messages")
+            .fetchone()[0]
+        )
+        threading.Thread(target=self._poll, args=(subscriber, last), daemon=True).start()
+
+    def _poll(self, subscriber: Subscriber, last: int) -> None:
+        while not self._stopped.wait(self.poll_interval):
+            try:
+                rows = (
+                    self._connection()
+                    .execute(
+                        "SELECT id, message FROM cache_messages WHERE id > ? ORDER BY id",
+                        (last,),
+                    )
+                    .fetchall()
+                )
+            except sqlite3.Error:
+                continue
+            for last, message in rows:
+                subscriber(message)
+
+    def close(self) -> None:
+        self._stopped.set()
+
+
+class RedisBackend(CacheBackend):
+    """
+    Values on a server speaking the Redis protocol (RESP), through one
+    connection per worker, and a second one subscribed to `channel`.
+    """
+
+    def __init__(
+        self, host: str, port: int = 6379, db: int = 0, channel: str = "cache"
+    ):
+        self.address = (host, port)
+        self.db = db
+        self.channel = channel
+        self._lock = threading.Lock()
+        self._socket: socket.socket | None = None
+        self._reader: Any = None
+        self._stopped = threading.Event()
+
+    def _connect(self) -> tuple[socket.socket, Any]:
+        connection = socket.create_connection(self.address, timeout=5)
+        reader = connection.makefile("rb")
+        if self.db:
+            connection.sendall(self._encode("SELECT", self.db))
+            self._reply(reader)
+        return connection, reader
+
+    @staticmethod
+    def _encode(*args: Any) -> bytes:
+        parts = [f"*{len(args)}\r\n".encode()]
+        for arg in args:
+            data = arg if isinstance(arg, bytes) else str(arg).encode()
+            parts.append(f"${len(data)}\r\n".encode() + data + b"\r\n")
+        return b"".join(parts)
+
+    @classmethod
+    def _reply(cls, reader: Any) -> Any:
+        line = reader.readline()
+        if not line:
+            raise ConnectionError("Connection closed by the cache server")
+        kind, rest = line[:1], line[1:-2]
+        if kind == b"+":
+            return rest.decode()
+        if kind == b"-":
+            raise ConnectionError(rest.decode())
+        if kind == b":":
+            return int(rest)
+        if kind == b"$":
+            length = int(rest)
+            return None if length < 0 else reader.read(length + 2)[:-2]
+        if kind == b"*":
+            length = int(rest)
+            return None if length < 0 else [cls._reply(reader) for _ in range(length)]
+        raise ConnectionError(f"Unexpected reply {line!r}")
+
+    def _command(self, *args: Any) -> Any:
+        with self._lock:
+            for attempt in (1, 2):
+                try:
+                    if self._socket is None:
+                        self._socket, self._reader = self._connect()
+                    self._socket.sendall(self._encode(*args))
+                    return self._reply(self._reader)
+                except OSError:
+                    # reconnect once, the server may have dropped an idle connection
+                    if self._socket is not None:
+                        self._socket.close()
+                    self._socket = None
+                    if attempt == 2:
+                        raise
+
+    def get(self, key: str) -> bytes | None:
+        return self._command("GET", key)
+
+    def set(self, key: str, value: bytes, ttl: float) -> None:
+        self._command("SET", key, value, "PX", max(int(ttl * 1000), 1))
+
+    def add(self, key: str, value: bytes, ttl: float) -> bool:
+        return self._command("SET", key, value, "PX", max(int(ttl * 1000), 1), "NX") == "OK"
+
+    def delete(self, key: str) -> None:
+        self._command("DEL", key)
+
+    def incr(self, key: str) -> int:
+        value = self._command("INCR", key)
+        if value == 1:
+            self._command("EXPIRE", key, VERSION_TTL)
+        return value
+
+    def publish(self, message: str) -> None:
+        self._command("PUBLISH", self.channel, message)
+
+    def subscribe(self, subscriber: Subscriber) -> None:
+        threading.Thread(target=self._listen, args=(subscriber,), daemon=True).start()
+
+    def _listen(self, subscriber: Subscriber) -> None:
+        while not self._stopped.is_set():
+            try:
+                connection, reader = self._connect()
+                connection.settimeout(None)
+                connection.sendall(self._encode("SUBSCRIBE", self.channel))
+                while not self._stopped.is_set():
+                    reply = self._reply(reader)
+                    if reply and reply[0] == b"message":
+                        subscriber(reply[2].decode())
+            except OSError:
+                # the messages missed meanwhile are covered by CACHE_VERSION_SECONDS
+                self._stopped.wait(1)
+
+    def close(self) -> None:
+        self._stopped.set()
+        with self._lock:
+            if self._socket is not None:
+                self._socket.close()
+                self._socket = None
+
+
+class Cache:
+    """
+    Typed values in versioned namespaces, see the module documentation.
+    """
+
+    def __init__(
+        self, backend: CacheBackend, version_ttl: float = 5, lock_ttl: float = 10
+    ):
+        self.backend = backend
+        self.version_ttl = version_ttl
+        self.lock_ttl = lock_ttl
+        self._versions: OrderedDict[str, tuple[float, int]] = OrderedDict()
+        self._flights: dict[str, list] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.waits = 0
+        self.errors = 0
+        backend.subscribe(self._on_message)
+
+    def _call(self, method: Callable[..., Any], *args: Any) -> Any:
+        try:
+            return method(*args)
+        except (OSError, sqlite3.Error) as error:
+            self.errors += 1
+            print(f"Cache backend error: {error}")
+            return None
+
+    def _remember(self, namespace: str, version: int) -> None:
+        with self._lock:
+            current = self._versions.get(namespace)
+            if current is not None and current[1] > version:
+                version = current[1]
+            self._versions[namespace] = (time.monotonic() + self.version_ttl, version)
+            self._versions.move_to_end(namespace)
+            while len(self._versions) > 10000:
+                self._versions.popitem(last=False)
+
+    def _on_message(self, message: str) -> None:
+        for line in message.splitlines():
+            namespace, _, version = line.rpartition(" ")
+            self._remember(namespace, int(version))
+
+    def version(self, namespace: str) -> int:
+        with self._lock:
+            cached = self._versions.get(namespace)
+        if cached is not None and cached[0] > time.monotonic():
+            return cached[1]
+        key = f"version:{namespace}"
+        value = self._call(self.backend.get, key)
+        if value is None:
+            # start from the clock, above any version the key had before it expired
+            self._call(self.backend.add, key, str(time.time_ns()).encode(), VERSION_TTL)
+            value = self._call(self.backend.get, key)
+        if value is None:
+            return 0
+        self._remember(namespace, int(value))
+        return int(value)
+
+    def invalidate(self, namespace: str) -> None:
+        """
+        Drop every key of the namespace, in all workers.
+        """
+        self.invalidate_many([namespace])
+
+    def invalidate_many(self, namespaces: Iterable[str]) -> None:
+        """
+        Drop every key of the namespaces, in all workers, with two backend
+        calls per namespace and one broadcast for all of them.
+        """
+        bumped = []
+        for namespace in namespaces:
+            key = f"version:{namespace}"
+            # seed a missing version from the clock, as `version` does
+            self._call(self.backend.add, key, str(time.time_ns()).encode(), VERSION_TTL)
+            version = self._call(self.backend.incr, key)
+            if version is not None:
+                self._remember(namespace, version)
+                bumped.append(f"{namespace} {version}")
+        if bumped:
+            self._call(self.backend.publish, "\n".join(bumped))
+
+    def _key(self, namespace: str, key: str) -> str:
+        return f"{namespace}@{self.version(namespace)}:{key}"
+
+    def get(self, namespace: str, key: str, type_: type[T]) -> T | None:
+        data = self._call(self.backend.get, self._key(namespace, key))
+        if data is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return TypeAdapter(type_).validate_json(data)
+
+    def set(self, namespace: str, key: str, value: T, ttl: float, type_: type[T]) -> None:
+        data = TypeAdapter(type_).dump_json(value)
+        self._call(self.backend.set, self._key(namespace, key), data, ttl)
+
+    def get_or_set(
+        self,
+        namespace: str,
+        key: str,
+        load: Callable[[], T | None],
+        ttl: float,
+        type_: type[T],
+    ) -> T | None:
+        """
+        The cached value, or the one `load` returns, stored unless None. The
+        version is read before loading: a value loaded across an invalidation
+        is stored under the old version and never served.
+        """
+        full_key = self._key(namespace, key)
+        adapter = TypeAdapter(type_)
+        data = self._call(self.backend.get, full_key)
+        if data is not None:
+            self.hits += 1
+            return adapter.validate_json(data)
+        self.misses += 1
+
+        with self._flight(full_key):
+            data = self._call(self.backend.get, full_key)
+            if data is not None:
+                # loaded by another thread while we queued
+                self.waits += 1
+                return adapter.validate_json(data)
+            lock_key = f"lock:{full_key}"
+            if self._call(self.backend.add, lock_key, b"1", self.lock_ttl) is False:
+                # another worker is loading it
+                deadline = time.monotonic() + self.lock_ttl
+                while time.monotonic() < deadline:
+                    time.sleep(0.05)
+                    data = self._call(self.backend.get, full_key)
+                    if data is not None:
+                        self.waits += 1
+                        return adapter.validate_json(data)
+            try:
+                value = load()
+                if value is not None:
+                    self._call(self.backend.set, full_key, adapter.dump_json(value), ttl)
+            finally:
+                self._call(self.backend.delete, lock_key)
+            return value
+
+    def _flight(self, key: str) -> "_Flight":
+        with self._lock:
+            flight = self._flights.setdefault(key, [threading.Lock(), 0])
+            flight[1] += 1
+        return _Flight(self, key, flight[0])
+
+    def _land(self, key: str) -> None:
+        with self._lock:
+            flight = self._flights[key]
+            flight[1] -= 1
+            if not flight[1]:
+                del self._flights[key]
+
+    def stats(self) -> dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "backend": type(self.backend).__name__,
+            "hits": self.hits,
+            "misses": self.misses,
+            "waits": self.waits,
+            "errors": self.errors,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+    def close(self) -> None:
+        self.backend.close()
+
+
+class _Flight:
+    def __init__(self, cache: Cache, key: str, lock: threading.Lock):
+        self.cache = cache
+        self.key = key
+        self.lock = lock
+
+    def __enter__(self) -> None:
+        self.lock.acquire()
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.lock.release()
+        self.cache._land(self.key)
+
+
+def backend_from_url(url: str) -> CacheBackend:
+    parsed = urlparse(url)
+    if parsed.scheme == "memory":
+        return MemoryBackend(get_settings().cache_max_entries)
+    if parsed.scheme == "sqlite":
+        return SQLiteBackend(parsed.path[1:] if url.startswith("sqlite:///") else parsed.path)
+    if parsed.scheme == "redis":
+        return RedisBackend(
+            parsed.hostname or "localhost",
+            parsed.port or 6379,
+            int(parsed.path.strip("/") or 0),
+        )
+    raise ValueError(f"Unsupported CACHE_URL {url!r}")
+
+
+@lru_cache
+def get_cache() -> Cache:
+    settings = get_settings()
+    return Cache(backend_from_url(settings.cache_url), settings.cache_version_seconds)
@@ -0,0 +1,106 @@
+from collections import OrderedDict
+from functools import lru_cache
+from threading import Lock
+from uuid import UUID
+from sqlmodel import Session
+from app import crud
+from app.config import get_settings
+from app.models import PublicProduct, SellerCounter
+
+
+class Catalog:
+    """
+    Snapshot of a seller's products at a catalog version, indexed by id and
+    by name. Products are detached `PublicProduct` copies.
+    """
+
+    def __init__(self, version: int, products: list[PublicProduct]):
+        self.version = version
+        self.products = products
+        self.by_id = {product.id: product for product in products}
+        self.by_name = {product.name: product for product in products}
+
+    def __len__(self) -> int:
+        return len(self.products)
+
+
+class CatalogCache:
+    """
+    Per-seller product catalogs kept in memory, LRU evicted once the total
+    number of cached products exceeds `max_products`.
+
+    Every read checks the seller's `catalog_version` counter (one primary key
+    lookup), which `crud.create_product` bumps in the same transaction as the
+    write, so a cached catalog is never served after a product change, even
+    one made by another worker.
+    """
+
+    def __init__(self, max_products: int):
+        self.max_products = max_products
+        self._catalogs: OrderedDict[UUID, Catalog] = OrderedDict()
+        self._size = 0
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, session: Session, seller_id: UUID) -> Catalog:
+        counter = session.get(SellerCounter, (seller_id, "catalog_version"))
+        version = counter.value if counter else 0
+        with self._lock:
+            catalog = self._catalogs.get(seller_id)
+            if catalog is not None and catalog.version == version:
+                self._catalogs.move_to_end(seller_id)
+                self.hits += 1
+                return catalog
+            self.misses += 1
+
+        products = crud.get_seller_product(session=session, seller_id=seller_id)
+        catalog = Catalog(
+            version, [PublicProduct.model_validate(product) for product in products]
+        )
+        self._store(seller_id, catalog)
+        return catalog
+
+    def _store(self, seller_id: UUID, catalog: Catalog) -> None:
+        with self._lock:
+            previous = self._catalogs.pop(seller_id, None)
+            if previous is not None:
+                self._size -= len(previous)
+            if previous is not None and previous.version > catalog.version:
+                catalog = previous
+            self._catalogs[seller_id] = catalog
+            self._size += len(catalog)
+            while self._size > self.max_products and len(self._catalogs) > 1:
+                _, evicted = self._catalogs.popitem(last=False)
+                self._size -= len(evicted)
+                self.evictions += 1
+
+    def invalidate(self, seller_id: UUID) -> None:
+        with self._lock:
+            catalog = self._catalogs.pop(seller_id, None)
+            if catalog is not None:
+                self._size -= len(catalog)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._catalogs.clear()
+            self._size = 0
+
+    def stats(self) -> dict[str, float | int]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "sellers": len(self._catalogs),
+                "products": self._size,
+                "max_products": self.max_products,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+@lru_cache
+def get_catalog_cache() -> CatalogCache:
+    return CatalogCache(get_settings().catalog_cache_max_products)
@@ -0,0 +1,130 @@
+"""
+Recompute the per-seller counters from the data and repair any drift.
+
+    python -m app.utils.counters [--every SECONDS]
+
+The migration fills the counters of existing sellers; run it periodically
+to repair drift from writes that bypass `app.crud`. Corrections are added,
+not overwritten, so writes landing during a run are kept.
+"""
+
+import argparse
+import time
+from uuid import UUID
+from sqlalchemy import (
+    Engine,
+    Integer,
+    case,
+    func,
+    literal,
+    or_,
+    select,
+    type_coerce,
+    union_all,
+)
+from sqlmodel import Session, col
+from app.crud import bump_counters, status_counter
+from app.db import database
+from app.models import (
+    InvoiceArchive,
+    InvoiceCreate,
+    InvoiceStatus,
+    Product,
+    SellerCounter,
+)
+
+
+def _count_deltas(session: Session) -> list[tuple[UUID, str, int]]:
+    """
+    (seller, counter, real count - stored value) of every count that is off,
+    read in one statement so both sides come from the same snapshot.
+    """
+    invoices = union_all(
+        select(  # type: ignore[call-overload]
+            InvoiceCreate.seller_id, type_coerce(InvoiceCreate.status, Integer).label("code")
+        ).where(InvoiceCreate.deleted_at.is_(None)),  # type: ignore[union-attr]
+        select(  # type: ignore[call-overload]
+            InvoiceArchive.seller_id, type_coerce(InvoiceArchive.status, Integer).label("code")
+        ),
+    ).cte("invoices")
+    # status counters are named after the member stored under each code
+    status_names = case(
+        {
+            code: status_counter(member)
+            for code, member in enumerate(InvoiceStatus, start=1)
+        },
+        value=invoices.c.code,
+    )
+    counts = union_all(
+        select(
+            invoices.c.seller_id, literal("invoices").label("name"), func.count()
+        ).group_by(invoices.c.seller_id),
+        select(invoices.c.seller_id, status_names, func.count())
+        .where(invoices.c.code.is_not(None))
+        .group_by(invoices.c.seller_id, invoices.c.code),
+        select(  # type: ignore[call-overload]
+            Product.seller_id, literal("products"), func.count()
+        ).group_by(Product.seller_id),
+        select(  # type: ignore[call-overload]
+            SellerCounter.seller_id, SellerCounter.name, -SellerCounter.value
+        ).where(
+            or_(
+                col(SellerCounter.name).in_(["invoices", "products"]),
+                col(SellerCounter.name).startswith("invoices:"),
+            )
+        ),
+    ).subquery()
+    delta = func.sum(counts.c[2])
+    return list(
+        session.execute(
+            select(counts.c.seller_id, counts.c.name, delta)
+            .group_by(counts.c.seller_id, counts.c.name)
+            .having(delta != 0)
+        ).tuples()
+    )
+
+
+def is_count(name: str) -> bool:
+    """
+    Counters derived from the rows; others (catalog_version) are left alone.
+    """
+    return name in ("invoices", "products") or name.startswith("invoices:")
+
+
+def reconcile_counters(engine: Engine) -> int:
+    """
+    Correct every count that differs from the real one. The corrections are
+    added with the same upserts as the crud writes, one transaction per
+    seller, so writes landing meanwhile are kept. Returns the number of
+    counters fixed.
+    """
+    with Session(engine) as session:
+        deltas = _count_deltas(session)
+    by_seller: dict[UUID, dict[str, int]] = {}
+    for seller_id, name, delta in deltas:
+        by_seller.setdefault(seller_id, {})[name] = delta
+    for seller_id, seller_deltas in by_seller.items():
+        with Session(engine) as session:
+            bump_counters(session, seller_id, seller_deltas)
+            session.commit()
+    return len(deltas)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="python -m app.utils.counters")
+    parser.add_argument(
+        "--every", type=int, default=0, help="repeat every N seconds (0 = run once)"
+    )
+    args = parser.parse_args()
+
+    while True:
+        for shard, engine in enumerate(database.router.engines):
+            fixed = reconcile_counters(engine)
+            print(f"Shard {shard}: fixed {fixed} counters")
+        if not args.every:
+            break
+        time.sleep(args.every)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,341 @@
+"""
+Bulk CSV imports of products and invoices.
+
+Uploads are read row by row from the spooled upload file, validated against
+the API models and written in chunks of `IMPORT_CHUNK_SIZE` rows, each one
+bulk inserted and committed on its own. A bad row is reported and skipped, it
+never fails the rest of the file.
+
+Products: one row per product, columns `name`, `price` and `description`.
+
+Invoices: one row per line item. Consecutive rows with the same `invoice`
+reference form one invoice, whose header (`customer_name`,
+`customer_phone_number`, `customer_email`, `customer_address`, `status`,
+`payment_mode`, `total_price`, `created_date`) is read from its first row.
+`product_id` or `product_name`, `quantity` and `item_total_price` describe the
+item; rows without a product give an invoice without items.
+
+An import given a progress key publishes its result so far to the shared
+cache after every chunk, where `get_progress` reads it while the upload is
+still being processed, from any worker.
+"""
+
+import csv
+import io
+from collections import Counter
+from typing import IO, Any, Callable, Iterator
+from uuid import UUID
+from pydantic import ValidationError
+from sqlalchemy import insert
+from sqlalchemy.exc import SQLAlchemyError
+from sqlmodel import Session
+from app import crud
+from app.config import get_settings
+from app.db import database
+from app.utils.invoice_numbers import get_invoice_numbers
+from app.models import (
+    ImportResult,
+    ImportRowError,
+    InputProduct,
+    InvoiceCreate,
+    InvoiceEvent,
+    InvoiceImport,
+    InvoiceItems,
+    Product,
+)
+from app.utils.cache import get_cache
+from app.utils.catalog import Catalog, get_catalog_cache
+
+Row = tuple[int, dict[str, str]]
+Progress = Callable[[ImportResult], None]
+
+# how long the progress of an import can be polled
+PROGRESS_TTL = 3600
+
+INVOICE_COLUMNS = [
+    "customer_name",
+    "customer_phone_number",
+    "customer_email",
+    "customer_address",
+    "status",
+    "payment_mode",
+    "total_price",
+    "created_date",
+]
+
+
+def read_csv(file: IO[bytes]) -> Iterator[Row]:
+    """
+    Yield (line number, row) pairs, decoding the upload as it is read. Blank
+    cells are left out of the row.
+    """
+    text = io.TextIOWrapper(file, encoding="utf-8-sig", newline="")
+    try:
+        reader = csv.DictReader(text)
+        for row in reader:
+            yield reader.line_num, {
+                column.strip(): value.strip()
+                for column, value in row.items()
+                if column and isinstance(value, str) and value.strip()
+            }
+    finally:
+        text.detach()
+
+
+def _describe(error: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in detail['loc'])}: {detail['msg']}"
+        for detail in error.errors()
+    )
+
+
+def _chunk_failed(result: ImportResult, lines: list[int], error: SQLAlchemyError) -> None:
+    """
+    Report a chunk the database rejected. The details (statement and
+    parameters) are logged, not sent back to the client.
+    """
+    print(f"Import chunk of lines {lines[0]}-{lines[-1]} not saved: {error}")
+    _fail(result, lines, "Chunk not saved: the database rejected it")
+
+
+def progress_reporter(seller_id: UUID, key: str) -> Progress:
+    """
+    Callback storing the result of an import under a progress key.
+    """
+    cache = get_cache()
+
+    def report(result: ImportResult) -> None:
+        cache.set(f"import:{seller_id}", key, result, PROGRESS_TTL, ImportResult)
+
+    return report
+
+
+def get_progress(seller_id: UUID, key: str) -> ImportResult | None:
+    return get_cache().get(f"import:{seller_id}", key, ImportResult)
+
+
+def _report(result: ImportResult, progress: Progress | None, done: bool = False) -> None:
+    result.done = done
+    if progress is not None:
+        progress(result)
+
+
+def _fail(result: ImportResult, lines: list[int], error: str) -> None:
+    result.failed += len(lines)
+    if len(result.errors) < get_settings().import_max_errors:
+        result.errors.append(ImportRowError(line=lines[0], error=error))
+
+
+def import_products(
+    session: Session,
+    seller_id: UUID,
+    file: IO[bytes],
+    chunk_size: int | None = None,
+    progress: Progress | None = None,
+) -> ImportResult:
+    """
+    Create the products of a CSV upload. Names the seller already has, or
+    that appear twice in the file, are reported as errors.
+    """
+    chunk_size = chunk_size or get_settings().import_chunk_size
+    result = ImportResult()
+    names = set(get_catalog_cache().get(session, seller_id).by_name)
+    chunk: list[tuple[int, dict[str, Any]]] = []
+    line = 1
+    try:
+        for line, row in read_csv(file):
+            result.rows += 1
+            try:
+                product = InputProduct.model_validate(row)
+            except ValidationError as error:
+                _fail(result, [line], _describe(error))
+                continue
+            if product.name in names:
+                _fail(result, [line], f"Product {product.name!r} already exists")
+                continue
+            names.add(product.name)
+            values = Product(**product.model_dump(), seller_id=seller_id).model_dump()
+            chunk.append((line, values))
+            if len(chunk) >= chunk_size:
+                _write_products(session, seller_id, chunk, result)
+                _report(result, progress)
+                chunk = []
+    except (UnicodeDecodeError, csv.Error) as error:
+        _fail(result, [line + 1], f"Unreadable CSV: {error}")
+    if chunk:
+        _write_products(session, seller_id, chunk, result)
+    _report(result, progress, done=True)
+    return result
+
+
+def _write_products(
+    session: Session,
+    seller_id: UUID,
+    chunk: list[tuple[int, dict[str, Any]]],
+    result: ImportResult,
+) -> None:
+    try:
+        session.execute(insert(Product), [values for _, values in chunk])
+        crud.bump_counters(
+            session, seller_id, {"products": len(chunk), "catalog_version": 1}
+        )
+        session.commit()
+    except SQLAlchemyError as error:
+        session.rollback()
+        _chunk_failed(result, [line for line, _ in chunk], error)
+        return
+    crud.seller_changed(seller_id)
+    result.imported += len(chunk)
+    result.chunks += 1
+
+
+def _invoice_groups(rows: Iterator[Row]) -> Iterator[list[Row]]:
+    """
+    Group consecutive rows sharing an `invoice` reference. Rows without one
+    are invoices on their own.
+    """
+    group: list[Row] = []
+    reference = None
+    for line, row in rows:
+        if group and (row.get("invoice") is None or row.get("invoice") != reference):
+            yield group
+            group = []
+        group.append((line, row))
+        reference = row.get("invoice")
+    if group:
+        yield group
+
+
+def _parse_invoice(
+    seller_id: UUID, group: list[Row], catalog: Catalog
+) -> tuple[InvoiceCreate, list[InvoiceItems]]:
+    """
+    Validate a group of rows as an invoice and build its table rows. Raises
+    ValueError (or ValidationError) when the rows are not a valid invoice.
+    """
+    first = group[0][1]
+    header = {column: first[column] for column in INVOICE_COLUMNS if column in first}
+    items = []
+    for line, row in group:
+        if "product_id" not in row and "product_name" not in row:
+            continue
+        product_id: Any = row.get("product_id")
+        if product_id is None:
+            product = catalog.by_name.get(row["product_name"])
+            if product is None:
+                raise ValueError(f"Line {line}: unknown product {row['product_name']!r}")
+            product_id = product.id
+        items.append(
+            {
+                "product_id": product_id,
+                "quantity": row.get("quantity"),
+                "total_price": row.get("item_total_price"),
+            }
+        )
+    invoice = InvoiceImport.model_validate({**header, "invoiceitems": items})
+    for item in invoice.invoiceitems:
+        if item.product_id not in catalog.by_id:
+            raise ValueError(f"Unknown product {item.product_id}")
+
+    values = invoice.model_dump(exclude={"invoiceitems"})
+    if values["created_date"] is None:
+        del values["created_date"]
+    db_invoice = InvoiceCreate(**values, seller_id=seller_id)
+    db_items = [
+        InvoiceItems(**item.model_dump(), invoice_id=db_invoice.id)
+        for item in invoice.invoiceitems
+    ]
+    return db_invoice, db_items
+
+
+def import_invoices(
+    session: Session,
+    seller_id: UUID,
+    file: IO[bytes],
+    chunk_size: int | None = None,
+    progress: Progress | None = None,
+) -> ImportResult:
+    """
+    Create the invoices of a CSV upload, products referenced by id or by name.
+    Counts in the result are CSV rows; an invalid invoice fails all its rows.
+    """
+    chunk_size = chunk_size or get_settings().import_chunk_size
+    result = ImportResult()
+    catalog = get_catalog_cache().get(session, seller_id)
+    chunk: list[tuple[list[int], InvoiceCreate, list[InvoiceItems]]] = []
+    chunk_rows = 0
+    lines = [1]
+    try:
+        for group in _invoice_groups(read_csv(file)):
+            lines = [line for line, _ in group]
+            result.rows += len(lines)
+            try:
+                invoice, items = _parse_invoice(seller_id, group, catalog)
+            except ValidationError as error:
+                _fail(result, lines, _describe(error))
+                continue
+            except ValueError as error:
+                _fail(result, lines, str(error))
+                continue
+            chunk.append((lines, invoice, items))
+            chunk_rows += len(lines)
+            if chunk_rows >= chunk_size:
+                _write_invoices(session, seller_id, chunk, result)
+                _report(result, progress)
+                chunk, chunk_rows = [], 0
+    except (UnicodeDecodeError, csv.Error) as error:
+        _fail(result, [lines[-1] + 1], f"Unreadable CSV: {error}")
+    if chunk:
+        _write_invoices(session, seller_id, chunk, result)
+    _report(result, progress, done=True)
+    return result
+
+
+def _write_invoices(
+    session: Session,
+    seller_id: UUID,
+    chunk: list[tuple[list[int], InvoiceCreate, list[InvoiceItems]]],
+    result: ImportResult,
+) -> None:
+    invoices = [invoice for _, invoice, _ in chunk]
+    items = [item for _, _, invoice_items in chunk for item in invoice_items]
+    lines = [line for invoice_lines, _, _ in chunk for line in invoice_lines]
+    counters = Counter(crud.status_counter(invoice.status) for invoice in invoices)
+    counters["invoices"] = len(invoices)
+    sales = crud.merge_sales(
+        *(
+            crud.invoice_sales(invoice.created_date, invoice_items)
+            for _, invoice, invoice_items in chunk
+        )
+    )
+    router = database.router
+    try:
+        years: dict[int, list[InvoiceCreate]] = {}
+        for invoice in invoices:
+            years.setdefault(invoice.created_date.year, []).append(invoice)
+        for year, year_invoices in years.items():
+            numbers = get_invoice_numbers().allocate(
+                session, seller_id, year, len(year_invoices)
+            )
+            for invoice, number in zip(year_invoices, numbers):
+                invoice.number = number
+        # index first: a dangling index entry is harmless, a missing one is not
+        router.index_invoices(
+            [invoice.id for invoice in invoices], router.shard_for_seller(seller_id)
+        )
+        session.execute(insert(InvoiceCreate), [row.model_dump() for row in invoices])
+        if items:
+            session.execute(insert(InvoiceItems), [row.model_dump() for row in items])
+        crud.bump_counters(session, seller_id, dict(counters))
+        crud.bump_sales(session, seller_id, sales)
+        session.commit()
+    except SQLAlchemyError as error:
+        session.rollback()
+        _chunk_failed(result, lines, error)
+        return
+    crud.seller_changed(
+        seller_id,
+        InvoiceEvent(type="imported", invoice_ids=[invoice.id for invoice in invoices]),
+    )
+    result.imported += len(lines)
+    result.chunks += 1
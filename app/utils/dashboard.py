@@ -0,0 +1,75 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from functools import lru_cache
+from typing import Any, Callable, TypeVar
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import Engine
+from sqlmodel import Session
+from app import crud
+from app.config import get_settings
+from app.db import database
+from app.models import CreateSeller, Dashboard, SellerProfile
+from app.utils.cache import get_cache
+
+T = TypeVar("T")
+
+RECENT_INVOICES = 5
+
+
+@lru_cache
+def get_dashboard_pool() -> ThreadPoolExecutor:
+    """
+    Threads running the dashboard queries, apart from the threadpool the
+    routes (and so the cache loaders waiting for these queries) run on.
+    """
+    return ThreadPoolExecutor(
+        get_settings().dashboard_threads, thread_name_prefix="dashboard"
+    )
+
+
+def _query(engine: Engine, read: Callable[..., T], **kwargs: Any) -> T:
+    with Session(engine) as session:
+        return read(session=session, **kwargs)
+
+
+def build_dashboard(seller: CreateSeller) -> Dashboard:
+    """
+    Assemble a seller's dashboard from three aggregate queries run at the
+    same time, each on its own session. It runs as the cache loader on a
+    threadpool thread, so the queries go to the dedicated pool: waiting for
+    the threadpool itself would deadlock once every thread holds a miss.
+    """
+    engine = database.router.engine_for_seller(seller.id)
+    pool = get_dashboard_pool()
+    counts = pool.submit(_query, engine, crud.get_seller_counts, seller_id=seller.id)
+    month = pool.submit(
+        _query, engine, crud.get_month_totals, seller_id=seller.id, month=date.today()
+    )
+    recent = pool.submit(
+        _query,
+        engine,
+        crud.get_recent_invoices,
+        seller_id=seller.id,
+        limit=RECENT_INVOICES,
+    )
+    return Dashboard(
+        profile=SellerProfile.model_validate(seller),
+        counts=counts.result(),
+        month=month.result(),
+        recent_invoices=recent.result(),
+    )
+
+
+async def get_dashboard(seller: CreateSeller) -> Dashboard:
+    """
+    The seller's dashboard from the shared cache. The crud writes invalidate
+    its `dashboard:<seller id>` namespace in every worker.
+    """
+    return await run_in_threadpool(
+        get_cache().get_or_set,
+        f"dashboard:{seller.id}",
+        "",
+        lambda: build_dashboard(seller),
+        get_settings().dashboard_ttl_seconds,
+        Dashboard,
+    )
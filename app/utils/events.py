@@ -0,0 +1,261 @@
+"""
+Live invoice events for `/user/events` (server-sent events) and
+`/user/events/ws` (WebSocket).
+
+The crud writes publish an `InvoiceEvent` through the worker's `EventHub`,
+which hands it to a broadcaster. The broadcaster carries it to every worker,
+and each worker's hub fans it out to the connections of that seller.
+
+- `local`: in-process only, enough for a single worker.
+- `postgres`: LISTEN/NOTIFY on the primary database, for several workers.
+
+Every connection reads from a bounded queue. A consumer that lets
+`EVENTS_QUEUE_SIZE` events pile up is dropped rather than buffered without
+end: its stream is closed and the client reconnects and refetches.
+"""
+
+import asyncio
+import json
+import select
+from functools import lru_cache
+from threading import Event, Lock, Thread
+from typing import AsyncIterator, Callable
+from uuid import UUID
+from sqlalchemy import Engine, text
+from app.config import get_settings
+from app.db import database
+from app.models import InvoiceEvent
+
+Deliver = Callable[[str], None]
+
+
+class Broadcaster:
+    """
+    Carries published messages to the hub of every worker, this one
+    included. This base class is the in-process broadcaster.
+    """
+
+    # invoice ids per message, None for no limit
+    max_ids: int | None = None
+
+    def start(self, deliver: Deliver) -> None:
+        self._deliver = deliver
+
+    def publish(self, message: str) -> None:
+        self._deliver(message)
+
+    def stop(self) -> None:
+        pass
+
+
+class PostgresBroadcaster(Broadcaster):
+    """
+    Broadcast through PostgreSQL NOTIFY on `channel`. Every worker listens
+    on its own connection from a background thread, reconnecting when it is
+    lost; events published meanwhile are not seen by that worker.
+    """
+
+    # NOTIFY payloads are limited to 8000 bytes, an id takes 39 in the JSON
+    max_ids = 150
+
+    def __init__(self, engine: Engine, channel: str = "invoice_events"):
+        self.engine = engine
+        self.channel = channel
+        self._stopped = Event()
+        self._thread: Thread | None = None
+
+    def start(self, deliver: Deliver) -> None:
+        self._stopped.clear()
+        self._thread = Thread(target=self._listen, args=(deliver,), daemon=True)
+        self._thread.start()
+
+    def publish(self, message: str) -> None:
+        with self.engine.connect() as connection:
+            connection.execute(
+                text("SELECT pg_notify(:channel, :message)"),
+                {"channel": self.channel, "message": message},
+            )
+            connection.commit()
+
+    def _listen(self, deliver: Deliver) -> None:
+        while not self._stopped.is_set():
+            try:
+                self._listen_once(deliver)
+            except Exception as error:
+                print(f"Event listener error, reconnecting: {error}")
+                self._stopped.wait(1)
+
+    def _listen_once(self, deliver: Deliver) -> None:
+        connection = self.engine.raw_connection()
+        try:
+            driver = connection.driver_connection
+            driver.autocommit = True  # type: ignore[union-attr]
+            with driver.cursor() as cursor:  # type: ignore[union-attr]
+                cursor.execute(f'LISTEN "{self.channel}"')
+            while not self._stopped.is_set():
+                if not select.select([driver], [], [], 1.0)[0]:
+                    continue
+                driver.poll()  # type: ignore[union-attr]
+                while driver.notifies:  # type: ignore[union-attr]
+                    deliver(driver.notifies.pop(0).payload)  # type: ignore[union-attr]
+        finally:
+            # the connection is left in LISTEN mode, do not pool it again
+            connection.invalidate()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+
+class Subscription:
+    """
+    One connection's queue of events, owned by the event loop serving it.
+    """
+
+    def __init__(self, hub: "EventHub", seller_id: UUID, queue_size: int):
+        self.hub = hub
+        self.seller_id = seller_id
+        self.loop = asyncio.get_running_loop()
+        self.queue: asyncio.Queue[str | None] = asyncio.Queue(queue_size)
+        self.dropped = False
+
+    def offer(self, data: str) -> None:
+        """
+        Queue an event, dropping the subscription when the consumer is too
+        far behind. Runs on the subscription's event loop.
+        """
+        if self.dropped:
+            return
+        try:
+            self.queue.put_nowait(data)
+        except asyncio.QueueFull:
+            self.dropped = True
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(None)
+            self.hub.unsubscribe(self)
+
+    def __enter__(self) -> "Subscription":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.hub.unsubscribe(self)
+
+    def __aiter__(self) -> AsyncIterator[str]:
+        return self
+
+    async def __anext__(self) -> str:
+        data = await self.queue.get()
+        if data is None:
+            raise StopAsyncIteration
+        return data
+
+
+class EventHub:
+    """
+    A worker's seller event channels. `publish` is thread safe, the crud
+    writes call it from the threadpool.
+    """
+
+    def __init__(self, broadcaster: Broadcaster, queue_size: int):
+        self.broadcaster = broadcaster
+        self.queue_size = queue_size
+        self._subscriptions: dict[UUID, set[Subscription]] = {}
+        self._lock = Lock()
+        self.published = 0
+        self.delivered = 0
+        self.dropped = 0
+        broadcaster.start(self._receive)
+
+    def subscribe(self, seller_id: UUID) -> Subscription:
+        subscription = Subscription(self, seller_id, self.queue_size)
+        with self._lock:
+            self._subscriptions.setdefault(seller_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.seller_id, set())
+            if subscription in subscriptions:
+                subscriptions.discard(subscription)
+                if subscription.dropped:
+                    self.dropped += 1
+            if not subscriptions:
+                self._subscriptions.pop(subscription.seller_id, None)
+
+    def publish(self, seller_id: UUID, event: InvoiceEvent) -> None:
+        """
+        Publish the event, split into several events of the same type when
+        it holds more invoice ids than a broadcaster message may carry.
+        """
+        size = self.broadcaster.max_ids or len(event.invoice_ids) or 1
+        for start in range(0, max(len(event.invoice_ids), 1), size):
+            part = event.model_copy(
+                update={"invoice_ids": event.invoice_ids[start : start + size]}
+            )
+            message = json.dumps(
+                {"seller_id": str(seller_id), "event": part.model_dump(mode="json")}
+            )
+            self.published += 1
+            self.broadcaster.publish(message)
+
+    def _receive(self, message: str) -> None:
+        payload = json.loads(message)
+        with self._lock:
+            subscriptions = list(
+                self._subscriptions.get(UUID(payload["seller_id"]), ())
+            )
+        data = json.dumps(payload["event"])
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.offer, data)
+                self.delivered += 1
+            except RuntimeError:
+                # its event loop is gone
+                self.unsubscribe(subscription)
+
+    def close(self) -> None:
+        self.broadcaster.stop()
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                "connections": sum(map(len, self._subscriptions.values())),
+                "published": self.published,
+                "delivered": self.delivered,
+                "dropped": self.dropped,
+            }
+
+
+@lru_cache
+def get_event_hub() -> EventHub:
+    settings = get_settings()
+    if settings.events_broadcaster == "postgres":
+        broadcaster: Broadcaster = PostgresBroadcaster(database.engine)
+    else:
+        broadcaster = Broadcaster()
+    return EventHub(broadcaster, settings.events_queue_size)
+
+
+async def sse_stream(
+    hub: EventHub, seller_id: UUID, heartbeat: float | None = None
+) -> AsyncIterator[str]:
+    """
+    Server-sent events of a seller, with a comment line every `heartbeat`
+    seconds to keep proxies from closing an idle stream. Ends when the
+    consumer is dropped.
+    """
+    heartbeat = heartbeat or get_settings().events_heartbeat_seconds
+    with hub.subscribe(seller_id) as subscription:
+        yield "retry: 3000\n\n"
+        while True:
+            try:
+                data = await asyncio.wait_for(anext(subscription), heartbeat)
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+                continue
+            except StopAsyncIteration:
+                return
+            yield f"event: invoice\ndata: {data}\n\n"
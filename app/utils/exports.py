@@ -0,0 +1,325 @@
+"""
+Run the queued invoice export jobs.
+
+    python -m app.utils.exports [--every SECONDS]
+
+Jobs are created by `POST /user/exports`. Each one streams the seller's
+invoices, archived ones included, and their items, oldest first, in batches
+of `EXPORT_BATCH_SIZE` into `EXPORT_DIR/<job id>.<format>.gz`. Every batch is
+appended as its own gzip member and then checkpointed, so a job whose worker
+died (no checkpoint for `EXPORT_LEASE_SECONDS`) is taken over by the next
+run, which truncates the file at the last checkpoint and carries on from
+there.
+
+A claim gives the job a new lease token. The worker renews its lease before
+writing each batch and checkpoints only while it still holds it, so a worker
+that was too slow and lost the job stops instead of writing over the one
+that took it over.
+
+CSV exports have one row per line item, in the format the CSV import reads.
+JSON exports are JSON Lines, one invoice with its items per line.
+"""
+
+import argparse
+import csv
+import gzip
+import io
+import os
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from uuid import UUID, uuid4
+from sqlalchemy import Engine, and_, or_, update
+from sqlmodel import Session, col, func, select
+from app.config import get_settings
+from app.db import database
+from app.models import (
+    ExportFormat,
+    ExportJob,
+    ExportStatus,
+    InvoiceArchive,
+    InvoiceCreate,
+    InvoiceItems,
+    InvoiceItemsArchive,
+    InvoicePublic,
+)
+
+Invoice = InvoiceCreate | InvoiceArchive
+
+CSV_COLUMNS = [
+    "invoice",
+    "customer_name",
+    "customer_phone_number",
+    "customer_email",
+    "customer_address",
+    "status",
+    "payment_mode",
+    "total_price",
+    "created_date",
+    "product_id",
+    "quantity",
+    "item_total_price",
+]
+
+
+def export_path(job: ExportJob) -> Path:
+    return Path(get_settings().export_dir) / f"{job.id}.{job.format.value}.gz"
+
+
+class LeaseLost(Exception):
+    """
+    The job was taken over by another worker.
+    """
+
+
+def _job_filters(job: ExportJob, model: type[Invoice] = InvoiceCreate) -> list:
+    conditions = [model.seller_id == job.seller_id]
+    if model is InvoiceCreate:
+        # archived invoices are never deleted ones
+        conditions.append(col(InvoiceCreate.deleted_at).is_(None))
+    if job.created_from is not None:
+        conditions.append(col(model.created_date) >= job.created_from)
+    if job.created_to is not None:
+        conditions.append(col(model.created_date) < job.created_to)
+    return conditions
+
+
+def _next_batch(session: Session, job: ExportJob, batch_size: int) -> list[Invoice]:
+    """
+    The next invoices after the checkpoint, from the hot table and the
+    archive merged in (created date, id) order.
+    """
+    invoices: list[Invoice] = []
+    for model in (InvoiceCreate, InvoiceArchive):
+        statement = select(model).where(*_job_filters(job, model))
+        if job.checkpoint_date is not None:
+            statement = statement.where(
+                or_(
+                    col(model.created_date) > job.checkpoint_date,
+                    and_(
+                        col(model.created_date) == job.checkpoint_date,
+                        col(model.id) > job.checkpoint_id,
+                    ),
+                )
+            )
+        statement = statement.order_by(col(model.created_date), col(model.id))
+        invoices.extend(session.exec(statement.limit(batch_size)).all())
+    invoices.sort(key=lambda invoice: (invoice.created_date, invoice.id))
+    return invoices[:batch_size]
+
+
+def _batch_items(
+    session: Session, invoices: list[Invoice]
+) -> dict[UUID, list[InvoiceItems]]:
+    items: dict[UUID, list[InvoiceItems]] = {
+        invoice.id: [] for invoice in invoices  # type: ignore[misc]
+    }
+    for item in session.exec(
+        select(InvoiceItems).where(col(InvoiceItems.invoice_id).in_(items))
+    ).all():
+        items[item.invoice_id].append(item)
+    for archived in session.exec(
+        select(InvoiceItemsArchive).where(col(InvoiceItemsArchive.invoice_id).in_(items))
+    ).all():
+        items[archived.invoice_id].append(InvoiceItems(**archived.model_dump()))
+    return items
+
+
+def _count(session: Session, job: ExportJob) -> int:
+    return sum(
+        session.exec(
+            select(func.count()).select_from(model).where(*_job_filters(job, model))
+        ).one()
+        for model in (InvoiceCreate, InvoiceArchive)
+    )
+
+
+def _fenced(session: Session, job_id: UUID, lease: UUID, **values: object) -> None:
+    """
+    Update the job only while `lease` still holds it, renewing the lease.
+    """
+    result = session.exec(
+        update(ExportJob)
+        .where(col(ExportJob.id) == job_id, col(ExportJob.lease) == lease)
+        .values(updated_at=datetime.now(), **values)
+    )  # type: ignore[call-overload]
+    session.commit()
+    if not result.rowcount:
+        raise LeaseLost(f"Export {job_id} was taken over by another worker")
+
+
+def _render(
+    job: ExportJob, invoices: list[Invoice], items: dict[UUID, list[InvoiceItems]]
+) -> bytes:
+    if job.format == ExportFormat.JSON:
+        return b"".join(
+            InvoicePublic.model_validate(
+                invoice, update={"invoiceitems": items[invoice.id]}
+            ).model_dump_json().encode()
+            + b"\n"
+            for invoice in invoices
+        )
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for invoice in invoices:
+        header = [
+            invoice.id,
+            invoice.customer_name,
+            invoice.customer_phone_number,
+            invoice.customer_email,
+            invoice.customer_address,
+            invoice.status.value if invoice.status else None,
+            invoice.payment_mode.value if invoice.payment_mode else None,
+            invoice.total_price,
+            invoice.created_date.isoformat(),
+        ]
+        for item in items[invoice.id] or [None]:
+            if item is None:
+                writer.writerow(header + [None, None, None])
+            else:
+                writer.writerow(
+                    header + [item.product_id, item.quantity, item.total_price]
+                )
+    return buffer.getvalue().encode()
+
+
+def run_export(
+    engine: Engine, job_id: UUID, lease: UUID, batch_size: int | None = None
+) -> None:
+    """
+    Export a job claimed with `lease`, starting from its checkpoint. Raises
+    `LeaseLost` as soon as another worker has taken the job over.
+    """
+    batch_size = batch_size or get_settings().export_batch_size
+    with Session(engine) as session:
+        job = session.get(ExportJob, job_id)
+        if job is None:
+            return
+        # still ours before the file is touched
+        if job.total is None:
+            _fenced(session, job_id, lease, total=_count(session, job))
+        else:
+            _fenced(session, job_id, lease)
+        session.refresh(job)
+
+        path = export_path(job)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "r+b" if path.exists() else "wb") as file:
+            # drop whatever a dead worker wrote after its last checkpoint
+            file.truncate(job.checkpoint_offset)
+            file.seek(job.checkpoint_offset)
+            if job.checkpoint_offset == 0 and job.format == ExportFormat.CSV:
+                buffer = io.StringIO()
+                csv.writer(buffer).writerow(CSV_COLUMNS)
+                file.write(gzip.compress(buffer.getvalue().encode()))
+
+            while True:
+                invoices = _next_batch(session, job, batch_size)
+                if not invoices:
+                    break
+                data = gzip.compress(_render(job, invoices, _batch_items(session, invoices)))
+
+                # renew the lease right before writing, the batch is written
+                # well within it
+                _fenced(session, job_id, lease)
+                file.write(data)
+                file.flush()
+                os.fsync(file.fileno())
+
+                _fenced(
+                    session,
+                    job_id,
+                    lease,
+                    checkpoint_date=invoices[-1].created_date,
+                    checkpoint_id=invoices[-1].id,
+                    checkpoint_offset=file.tell(),
+                    exported=job.exported + len(invoices),
+                )
+                session.expunge_all()
+                job = session.get(ExportJob, job_id)  # type: ignore[assignment]
+
+        _fenced(session, job_id, lease, status=ExportStatus.DONE)
+
+
+def claim_job(engine: Engine) -> tuple[UUID, UUID] | None:
+    """
+    Take the oldest queued job, or a running one whose worker stopped
+    checkpointing, and return its id with the new lease token. The
+    compare-and-set on `updated_at` lets only one worker win a job.
+    """
+    stalled = datetime.now() - timedelta(seconds=get_settings().export_lease_seconds)
+    with Session(engine) as session:
+        candidates = session.exec(
+            select(ExportJob)
+            .where(
+                or_(
+                    ExportJob.status == ExportStatus.QUEUED,
+                    and_(
+                        ExportJob.status == ExportStatus.RUNNING,
+                        col(ExportJob.updated_at) < stalled,
+                    ),
+                )
+            )
+            .order_by(col(ExportJob.created_at))
+            .limit(10)
+        ).all()
+        for job in candidates:
+            lease = uuid4()
+            claimed = session.exec(
+                update(ExportJob)
+                .where(
+                    col(ExportJob.id) == job.id,
+                    col(ExportJob.updated_at) == job.updated_at,
+                )
+                .values(
+                    status=ExportStatus.RUNNING, updated_at=datetime.now(), lease=lease
+                )
+            )  # type: ignore[call-overload]
+            session.commit()
+            if claimed.rowcount:
+                return job.id, lease  # type: ignore[return-value]
+    return None
+
+
+def process_jobs(engine: Engine, batch_size: int | None = None) -> int:
+    """
+    Run jobs until none is left to claim. Returns the number of jobs run.
+    """
+    done = 0
+    while (claim := claim_job(engine)) is not None:
+        job_id, lease = claim
+        try:
+            run_export(engine, job_id, lease, batch_size)
+        except LeaseLost as error:
+            print(error)
+        except Exception as error:
+            with Session(engine) as session:
+                try:
+                    _fenced(
+                        session, job_id, lease, status=ExportStatus.FAILED, error=str(error)
+                    )
+                except LeaseLost:
+                    pass
+        done += 1
+    return done
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="python -m app.utils.exports")
+    parser.add_argument(
+        "--every", type=int, default=0, help="poll every N seconds (0 = run once)"
+    )
+    args = parser.parse_args()
+
+    while True:
+        for shard, engine in enumerate(database.router.engines):
+            done = process_jobs(engine)
+            if done:
+                print(f"Shard {shard}: ran {done} export jobs")
+        if not args.every:
+            break
+        time.sleep(args.every)
+
+
+if __name__ == "__main__":
+    main()
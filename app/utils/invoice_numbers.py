@@ -0,0 +1,109 @@
+"""
+Human readable invoice numbers, sequential per seller and year:
+`INV-2026-000123`.
+
+The highest number handed out for a seller and year is kept in the seller's
+`invoice_numbers:<year>` counter. How numbers are taken from it is set by
+`INVOICE_NUMBER_POLICY`:
+
+- `blocks` (default): each worker reserves `INVOICE_NUMBER_BLOCK` numbers at
+  a time, in a short transaction of its own, and hands them out from memory.
+  Writers of a seller never wait on each other, but numbers from different
+  workers interleave, and the rest of a block is lost when the worker stops
+  or an invoice write fails.
+- `gapless`: the number is taken inside the invoice's transaction, so a
+  failed write gives it back. The counter row stays locked until the
+  invoice commits, which serializes the invoice writes of a seller.
+"""
+
+from functools import lru_cache
+from threading import Lock
+from uuid import UUID
+from sqlalchemy import Engine, select
+from sqlmodel import Session
+from app.config import get_settings
+from app.models import SellerCounter
+
+
+def counter_name(year: int) -> str:
+    return f"invoice_numbers:{year}"
+
+
+class InvoiceNumbers:
+    def __init__(self, prefix: str = "INV", policy: str = "blocks", block: int = 20):
+        if policy not in ("blocks", "gapless"):
+            raise ValueError(f"Unknown invoice number policy {policy!r}")
+        self.prefix = prefix
+        self.policy = policy
+        self.block = max(block, 1)
+        # (seller, year) -> [next number, last number] of this worker's block
+        self._blocks: dict[tuple[UUID, int], list[int]] = {}
+        # one lock per (seller, year), held across a refill, so a slow block
+        # reservation only holds up the writers of that seller and year
+        self._locks: dict[tuple[UUID, int], Lock] = {}
+        self._lock = Lock()
+
+    def format(self, year: int, value: int) -> str:
+        return f"{self.prefix}-{year}-{value:06d}"
+
+    @staticmethod
+    def _take(session: Session, seller_id: UUID, year: int, count: int) -> int:
+        """
+        Add `count` to the counter and return its new value, inside the
+        session's transaction.
+        """
+        from app.crud import bump_counters
+
+        bump_counters(session, seller_id, {counter_name(year): count})
+        return session.execute(
+            select(SellerCounter.value).where(
+                SellerCounter.seller_id == seller_id,
+                SellerCounter.name == counter_name(year),
+            )
+        ).scalar_one()
+
+    def allocate(
+        self, session: Session, seller_id: UUID, year: int, count: int = 1
+    ) -> list[str]:
+        """
+        The next `count` numbers of a seller for `year`. Call it before the
+        session writes anything: a block is reserved on another connection.
+        """
+        if self.policy == "gapless":
+            last = self._take(session, seller_id, year, count)
+            return [self.format(year, value) for value in range(last - count + 1, last + 1)]
+
+        engine: Engine = session.get_bind()  # type: ignore[assignment]
+        key = (seller_id, year)
+        with self._lock:
+            lock = self._locks.setdefault(key, Lock())
+        numbers = []
+        with lock:
+            while len(numbers) < count:
+                block = self._blocks.get(key)
+                if block is None or block[0] > block[1]:
+                    size = max(self.block, count - len(numbers))
+                    with Session(engine) as own:
+                        last = self._take(own, seller_id, year, size)
+                        own.commit()
+                    block = self._blocks[key] = [last - size + 1, last]
+                numbers.append(self.format(year, block[0]))
+                block[0] += 1
+        return numbers
+
+    def forget(self) -> None:
+        """
+        Drop the reserved blocks, their numbers are never used.
+        """
+        with self._lock:
+            self._blocks.clear()
+
+
+@lru_cache
+def get_invoice_numbers() -> InvoiceNumbers:
+    settings = get_settings()
+    return InvoiceNumbers(
+        settings.invoice_number_prefix,
+        settings.invoice_number_policy,
+        settings.invoice_number_block,
+    )
@@ -0,0 +1,206 @@
+"""
+Per-seller fair limiting of the expensive routes, so one seller running
+imports or exports cannot take every threadpool worker and connection.
+
+Each limited route has a cost (`LIMITER_ROUTE_COSTS`, by route name). A
+request runs once its cost fits both in the seller's share
+(`LIMITER_SELLER_CAPACITY`) and in what the worker has left
+(`LIMITER_CAPACITY`). Otherwise it waits in its seller's queue, and freed
+capacity goes to the sellers with waiting requests in turn, one request
+each, so a seller with many queued requests does not delay the others. A
+request that waits longer than `LIMITER_QUEUE_SECONDS` is turned away with
+429.
+
+The limits are per worker process.
+"""
+
+import asyncio
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from functools import lru_cache
+from threading import Lock
+from typing import Any, AsyncIterator
+from uuid import UUID
+from app.config import get_settings
+
+
+class QueueTimeout(Exception):
+    pass
+
+
+class _Waiter:
+    def __init__(self, seller_id: UUID, cost: int):
+        self.seller_id = seller_id
+        self.cost = cost
+        self.since = time.perf_counter()
+        self.future: asyncio.Future[None] = asyncio.get_running_loop().create_future()
+
+    def grant(self) -> None:
+        # the waiter may sit on another event loop (one per test client)
+        self.future.get_loop().call_soon_threadsafe(self._set)
+
+    def _set(self) -> None:
+        if not self.future.done():
+            self.future.set_result(None)
+
+
+class FairLimiter:
+    def __init__(
+        self,
+        capacity: int = 40,
+        seller_capacity: int = 8,
+        costs: dict[str, int] | None = None,
+        queue_seconds: float = 30,
+        history: int = 1000,
+    ):
+        self.capacity = max(capacity, 1)
+        self.seller_capacity = max(min(seller_capacity, self.capacity), 1)
+        self.costs = costs or {}
+        self.queue_seconds = queue_seconds
+        self.used = 0
+        self._seller_used: dict[UUID, int] = {}
+        # sellers with waiting requests, in the order they are served
+        self._queues: OrderedDict[UUID, deque[_Waiter]] = OrderedDict()
+        self._lock = Lock()
+        self.admitted = 0
+        self.queued = 0
+        self.timeouts = 0
+        self.max_wait = 0.0
+        self._waits: deque[float] = deque(maxlen=history)
+
+    def cost(self, route: str) -> int:
+        """
+        Cost of a route, 0 when it is not limited. Costs above the seller's
+        share are capped, so such a request runs alone.
+        """
+        return min(self.costs.get(route, 0), self.seller_capacity)
+
+    def _fits(self, seller_id: UUID, cost: int) -> bool:
+        return self._seller_used.get(seller_id, 0) + cost <= self.seller_capacity
+
+    def _take(self, seller_id: UUID, cost: int) -> None:
+        self.used += cost
+        self._seller_used[seller_id] = self._seller_used.get(seller_id, 0) + cost
+        self.admitted += 1
+
+    def _dispatch(self) -> None:
+        """
+        Admit the waiting requests that fit, one per seller in turn. A seller
+        at its share is skipped; the first request that does not fit in the
+        worker's capacity stops the round, so a costly request is not
+        starved by cheaper ones behind it.
+        """
+        progress = True
+        while progress and self._queues:
+            progress = False
+            for seller_id in list(self._queues):
+                queue = self._queues[seller_id]
+                waiter = queue[0]
+                if not self._fits(seller_id, waiter.cost):
+                    continue
+                if self.used + waiter.cost > self.capacity:
+                    return
+                queue.popleft()
+                self._take(seller_id, waiter.cost)
+                self._record(time.perf_counter() - waiter.since)
+                waiter.grant()
+                # served, to the back of the line
+                del self._queues[seller_id]
+                if queue:
+                    self._queues[seller_id] = queue
+                progress = True
+
+    def _record(self, wait: float) -> None:
+        self._waits.append(wait)
+        self.max_wait = max(self.max_wait, wait)
+
+    def _leave(self, waiter: _Waiter) -> None:
+        queue = self._queues.get(waiter.seller_id)
+        if queue is not None and waiter in queue:
+            queue.remove(waiter)
+            if not queue:
+                del self._queues[waiter.seller_id]
+
+    def release(self, seller_id: UUID, cost: int) -> None:
+        with self._lock:
+            self.used -= cost
+            left = self._seller_used[seller_id] - cost
+            if left:
+                self._seller_used[seller_id] = left
+            else:
+                del self._seller_used[seller_id]
+            self._dispatch()
+
+    async def acquire(self, seller_id: UUID, cost: int) -> None:
+        """
+        Wait for `cost` units of the seller's share, raising `QueueTimeout`
+        after `queue_seconds`.
+        """
+        with self._lock:
+            if (
+                not self._queues
+                and self._fits(seller_id, cost)
+                and self.used + cost <= self.capacity
+            ):
+                self._take(seller_id, cost)
+                self._record(0.0)
+                return
+            waiter = _Waiter(seller_id, cost)
+            self._queues.setdefault(seller_id, deque()).append(waiter)
+            self.queued += 1
+            self._dispatch()
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), self.queue_seconds)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as exc:
+            with self._lock:
+                granted = waiter not in self._queues.get(seller_id, ())
+                self._leave(waiter)
+            if granted:
+                # admitted just as we gave up, hand the units back
+                self.release(seller_id, cost)
+            if isinstance(exc, asyncio.TimeoutError):
+                self.timeouts += 1
+                raise QueueTimeout from None
+            raise
+
+    @asynccontextmanager
+    async def slot(self, seller_id: UUID, cost: int) -> AsyncIterator[None]:
+        await self.acquire(seller_id, cost)
+        try:
+            yield
+        finally:
+            self.release(seller_id, cost)
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            waits = sorted(self._waits)
+            waiting = sum(len(queue) for queue in self._queues.values())
+            sellers_waiting = len(self._queues)
+
+        def percentile(p: float) -> float:
+            return waits[min(int(len(waits) * p), len(waits) - 1)] if waits else 0.0
+
+        return {
+            "capacity": self.capacity,
+            "used": self.used,
+            "waiting": waiting,
+            "sellers_waiting": sellers_waiting,
+            "admitted": self.admitted,
+            "queued": self.queued,
+            "timeouts": self.timeouts,
+            "wait_p50_ms": percentile(0.5) * 1000,
+            "wait_p95_ms": percentile(0.95) * 1000,
+            "wait_max_ms": self.max_wait * 1000,
+        }
+
+
+@lru_cache
+def get_limiter() -> FairLimiter:
+    settings = get_settings()
+    return FairLimiter(
+        settings.limiter_capacity,
+        settings.limiter_seller_capacity,
+        settings.limiter_route_costs,
+        settings.limiter_queue_seconds,
+    )
@@ -0,0 +1,179 @@
+"""
+Turn requests away early, with 503 and `Retry-After`, when the worker is
+overloaded, rather than queueing every request until they all time out.
+
+The signal is the queueing delay of the threadpool, where the sync routes,
+their dependencies and so their database work run. While requests are in
+flight a probe hands a no-op to the threadpool every `SHED_INTERVAL_MS` and
+times how long it waits for a thread; a probe still waiting counts for as
+long as it has waited. Requests waiting for their response are counted too.
+
+- delay above `SHED_TARGET_MS`: the low priority routes
+  (`SHED_LOW_PRIORITY`: exports, listings, reports, imports) are shed.
+- delay above twice the target, or `SHED_MAX_IN_FLIGHT` requests waiting:
+  every API route is shed but the critical ones (`SHED_CRITICAL`: login and
+  the public invoice links).
+
+Paths outside the API prefix (health probes, docs) are never shed.
+"""
+
+import asyncio
+import time
+from functools import lru_cache
+from typing import Any
+import anyio
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from app.config import get_settings
+
+CRITICAL, NORMAL, LOW = "critical", "normal", "low"
+
+
+def _matches(path: str, prefixes: list[str]) -> bool:
+    return any(path == prefix or path.startswith(prefix + "/") for prefix in prefixes)
+
+
+class LoadShedder:
+    def __init__(
+        self,
+        target_ms: int = 100,
+        max_in_flight: int = 0,
+        interval_ms: int = 100,
+        retry_after: int = 2,
+        low_priority: list[str] | None = None,
+        critical: list[str] | None = None,
+        prefix: str = "/api/v1",
+    ):
+        self.target = target_ms / 1000
+        self.max_in_flight = max_in_flight
+        self.interval = interval_ms / 1000
+        self.retry_after = retry_after
+        self.low_priority = low_priority or []
+        self.critical = critical or []
+        self.prefix = prefix
+        self.in_flight = 0
+        self.delay = 0.0
+        self._probe_since: float | None = None
+        self._probing = False
+        self.shed = {LOW: 0, NORMAL: 0}
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.target or self.max_in_flight)
+
+    def priority(self, path: str) -> str:
+        if not path.startswith(self.prefix + "/"):
+            return CRITICAL
+        path = path[len(self.prefix) :]
+        if _matches(path, self.critical):
+            return CRITICAL
+        return LOW if _matches(path, self.low_priority) else NORMAL
+
+    def queueing_delay(self) -> float:
+        if self._probe_since is None:
+            return self.delay
+        return max(self.delay, time.perf_counter() - self._probe_since)
+
+    def overload(self) -> int:
+        """
+        0 when healthy, 1 to shed the low priority routes, 2 to shed all but
+        the critical ones.
+        """
+        delay = self.queueing_delay() if self.target else 0.0
+        if (self.target and delay > 2 * self.target) or (
+            self.max_in_flight and self.in_flight >= self.max_in_flight
+        ):
+            return 2
+        return 1 if self.target and delay > self.target else 0
+
+    def admit(self, path: str) -> bool:
+        priority = self.priority(path)
+        if priority == CRITICAL:
+            return True
+        level = self.overload()
+        if level == 2 or (level == 1 and priority == LOW):
+            self.shed[priority] += 1
+            return False
+        return True
+
+    async def _probe(self) -> None:
+        try:
+            while self.in_flight:
+                self._probe_since = time.perf_counter()
+                await anyio.to_thread.run_sync(lambda: None)
+                self.delay = time.perf_counter() - self._probe_since
+                self._probe_since = None
+                await asyncio.sleep(self.interval)
+        finally:
+            self._probe_since = None
+            self._probing = False
+            # nothing left in flight to queue behind
+            self.delay = 0.0
+
+    def start(self) -> None:
+        self.in_flight += 1
+        if self.target and not self._probing:
+            self._probing = True
+            asyncio.get_running_loop().create_task(self._probe())
+
+    def finish(self) -> None:
+        self.in_flight -= 1
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "in_flight": self.in_flight,
+            "queueing_delay_ms": self.queueing_delay() * 1000,
+            "level": self.overload(),
+            "shed_low": self.shed[LOW],
+            "shed_normal": self.shed[NORMAL],
+        }
+
+
+class LoadSheddingMiddleware:
+    def __init__(self, app: ASGIApp, shedder: LoadShedder | None = None):
+        self.app = app
+        self.shedder = shedder
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        shedder = self.shedder or get_load_shedder()
+        if scope["type"] != "http" or not shedder.enabled:
+            await self.app(scope, receive, send)
+            return
+        if not shedder.admit(scope["path"]):
+            response = JSONResponse(
+                {"detail": "Server overloaded, retry later"},
+                status_code=503,
+                headers={"Retry-After": str(shedder.retry_after)},
+            )
+            await response(scope, receive, send)
+            return
+
+        # counted until the response starts, so open event streams are not
+        waiting = True
+        shedder.start()
+
+        async def started(message: Message) -> None:
+            nonlocal waiting
+            if waiting and message["type"] == "http.response.start":
+                waiting = False
+                shedder.finish()
+            await send(message)
+
+        try:
+            await self.app(scope, receive, started)
+        finally:
+            if waiting:
+                shedder.finish()
+
+
+@lru_cache
+def get_load_shedder() -> LoadShedder:
+    settings = get_settings()
+    return LoadShedder(
+        settings.shed_target_ms,
+        settings.shed_max_in_flight,
+        settings.shed_interval_ms,
+        settings.shed_retry_seconds,
+        settings.shed_low_priority,
+        settings.shed_critical,
+    )
@@ -0,0 +1,79 @@
+"""
+Hard delete the soft deleted invoices once their retention period is over.
+
+    python -m app.utils.purge [--days N] [--batch-size N] [--every SECONDS]
+
+Tombstones are found through the partial `ix_invoicecreate_deleted_at`
+index and removed one committed batch at a time, each with a single DELETE:
+the items go with the ON DELETE CASCADE of their foreign key. Every shard is
+processed.
+"""
+
+import argparse
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import Connection, Engine, delete, select
+from app.config import get_settings
+from app.db import database
+from app.models import InvoiceCreate
+
+
+def purge_batch(conn: Connection, cutoff: datetime, batch_size: int) -> int:
+    """
+    Delete one batch of invoices tombstoned before `cutoff`. Returns the
+    number of invoices deleted.
+    """
+    ids = (
+        select(InvoiceCreate.id)  # type: ignore[call-overload]
+        .where(InvoiceCreate.deleted_at < cutoff)  # type: ignore[operator]
+        .limit(batch_size)
+    )
+    result = conn.execute(
+        delete(InvoiceCreate).where(InvoiceCreate.id.in_(ids.scalar_subquery()))  # type: ignore[union-attr]
+    )
+    return result.rowcount
+
+
+def purge_invoices(
+    engine: Engine,
+    retention_days: int | None = None,
+    batch_size: int | None = None,
+) -> int:
+    """
+    Purge every invoice soft deleted longer ago than the retention period,
+    one committed batch at a time. Returns the number of invoices deleted.
+    """
+    settings = get_settings()
+    if retention_days is None:
+        retention_days = settings.deleted_retention_days
+    batch_size = batch_size or settings.purge_batch_size
+    cutoff = datetime.now() - timedelta(days=retention_days)
+    purged = 0
+    while True:
+        with engine.begin() as conn:
+            count = purge_batch(conn, cutoff, batch_size)
+        purged += count
+        if count < batch_size:
+            return purged
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="python -m app.utils.purge")
+    parser.add_argument("--days", type=int)
+    parser.add_argument("--batch-size", type=int)
+    parser.add_argument(
+        "--every", type=int, default=0, help="repeat every N seconds (0 = run once)"
+    )
+    args = parser.parse_args()
+
+    while True:
+        for shard, engine in enumerate(database.router.engines):
+            purged = purge_invoices(engine, args.days, args.batch_size)
+            print(f"Shard {shard}: purged {purged} deleted invoices")
+        if not args.every:
+            break
+        time.sleep(args.every)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""
+Rebuild the per-product daily sales from the invoices and repair any drift.
+
+    python -m app.utils.sales [--every SECONDS]
+
+The migration fills the sales of existing invoices; run it periodically if
+writes ever bypass `app.crud` (manual SQL, restores). Corrections are added,
+not overwritten, so writes landing during a run are kept.
+"""
+
+import argparse
+import time
+from datetime import date
+from typing import Any
+from uuid import UUID
+from sqlalchemy import (
+    BigInteger,
+    Date,
+    Engine,
+    cast,
+    delete,
+    func,
+    literal,
+    or_,
+    select,
+    type_coerce,
+    union_all,
+)
+from sqlmodel import Session, col
+from app.crud import SalesDeltas, bump_sales
+from app.db import database
+from app.models import (
+    InvoiceArchive,
+    InvoiceCreate,
+    InvoiceItems,
+    InvoiceItemsArchive,
+    ProductDailySales,
+)
+
+
+def _day(session: Session, created_date: Any) -> Any:
+    """
+    Day of a timestamp in SQL; SQLite has no DATE type to cast to.
+    """
+    if session.get_bind().dialect.name == "sqlite":
+        return type_coerce(func.date(created_date), Date)
+    return cast(created_date, Date)
+
+
+def _sales_deltas(
+    session: Session,
+) -> list[tuple[UUID, date, UUID, int, int, int]]:
+    """
+    (seller, day, product, real - stored quantity, real - stored revenue in
+    cents, line items sold) of every daily sales row that is off, summed in
+    one statement from the hot and archived line items so both sides come
+    from the same snapshot and money is added in exact cents.
+    """
+    cents = BigInteger()
+    rows = union_all(
+        select(  # type: ignore[call-overload]
+            InvoiceCreate.seller_id,
+            _day(session, InvoiceCreate.created_date).label("day"),
+            InvoiceItems.product_id,
+            InvoiceItems.quantity,
+            type_coerce(InvoiceItems.total_price, cents).label("revenue"),
+            literal(1).label("sold"),
+        )
+        .join(InvoiceItems, InvoiceItems.invoice_id == InvoiceCreate.id)
+        .where(
+            InvoiceCreate.deleted_at.is_(None),  # type: ignore[union-attr]
+            InvoiceItems.product_id.is_not(None),  # type: ignore[union-attr]
+        ),
+        select(  # type: ignore[call-overload]
+            InvoiceArchive.seller_id,
+            _day(session, InvoiceArchive.created_date),
+            InvoiceItemsArchive.product_id,
+            InvoiceItemsArchive.quantity,
+            type_coerce(InvoiceItemsArchive.total_price, cents),
+            literal(1),
+        )
+        .join(InvoiceItemsArchive, InvoiceItemsArchive.invoice_id == InvoiceArchive.id)
+        .where(InvoiceItemsArchive.product_id.is_not(None)),  # type: ignore[union-attr]
+        select(  # type: ignore[call-overload]
+            ProductDailySales.seller_id,
+            ProductDailySales.day,
+            ProductDailySales.product_id,
+            -col(ProductDailySales.quantity),
+            -type_coerce(ProductDailySales.revenue, cents),
+            literal(0),
+        ),
+    ).subquery()
+    quantity = func.coalesce(func.sum(rows.c.quantity), 0)
+    revenue = func.coalesce(func.sum(rows.c.revenue), 0)
+    return list(
+        session.execute(
+            select(
+                rows.c.seller_id,
+                rows.c.day,
+                rows.c.product_id,
+                quantity,
+                revenue,
+                func.sum(rows.c.sold),
+            )
+            .group_by(rows.c.seller_id, rows.c.day, rows.c.product_id)
+            .having(or_(quantity != 0, revenue != 0))
+        ).tuples()
+    )
+
+
+def reconcile_sales(engine: Engine) -> int:
+    """
+    Correct every daily sales row that differs from the real one and remove
+    the ones without sales. The corrections are added with the same upserts
+    as the crud writes, one transaction per seller, so writes landing
+    meanwhile are kept. Returns the number of rows fixed.
+    """
+    with Session(engine) as session:
+        deltas = _sales_deltas(session)
+    by_seller: dict[UUID, SalesDeltas] = {}
+    for seller_id, day, product_id, quantity, revenue, _ in deltas:
+        by_seller.setdefault(seller_id, {})[(product_id, day)] = (quantity, revenue / 100)
+    for seller_id, seller_deltas in by_seller.items():
+        with Session(engine) as session:
+            bump_sales(session, seller_id, seller_deltas)
+            session.commit()
+    with Session(engine) as session:
+        emptied = session.exec(
+            delete(ProductDailySales).where(  # type: ignore[call-overload]
+                col(ProductDailySales.quantity) == 0,
+                type_coerce(ProductDailySales.revenue, BigInteger) == 0,
+            )
+        ).rowcount
+        session.commit()
+    # rows emptied by the corrections above were already counted
+    return len(deltas) + emptied - sum(1 for *_, sold in deltas if not sold)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="python -m app.utils.sales")
+    parser.add_argument(
+        "--every", type=int, default=0, help="repeat every N seconds (0 = run once)"
+    )
+    args = parser.parse_args()
+
+    while True:
+        for shard, engine in enumerate(database.router.engines):
+            fixed = reconcile_sales(engine)
+            print(f"Shard {shard}: fixed {fixed} daily product sales")
+        if not args.every:
+            break
+        time.sleep(args.every)
+
+
+if __name__ == "__main__":
+    main()
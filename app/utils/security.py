@@ -1,34 +1,62 @@
+import argparse
+import statistics
+import time
 from datetime import datetime, timedelta
-from typing import Any
-from dotenv import load_dotenv
-import os
+from functools import lru_cache
+from typing import TYPE_CHECKING, Any
 
 from fastapi import HTTPException, status
 import jwt
 from jwt.exceptions import InvalidTokenError
 from pydantic import ValidationError
-from passlib.context import CryptContext
 
-load_dotenv('.env')
+from app.config import get_settings
+from app.utils.tracing import span
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+if TYPE_CHECKING:
+    from passlib.context import CryptContext
 
 
-ALGORITHM = os.environ.get("ALGORITHM", "HS256")
-SECRET_KEY = os.environ.get("APP_SECRET_KEY")
-if not SECRET_KEY:
-    raise ValueError("APP_SECRET_KEY is not set in the environment variables")
+@lru_cache
+def get_pwd_context() -> "CryptContext":
+    """
+    Built on first use: importing passlib and loading the bcrypt backend is
+    one of the slowest parts of a cold start.
+
+    Hashes made with another cost than `BCRYPT_ROUNDS` need an update, they
+    are rehashed on the next successful login (see `crud.authenticate`).
+    """
+    from passlib.context import CryptContext
+
+    rounds = get_settings().bcrypt_rounds
+    return CryptContext(
+        schemes=["bcrypt"],
+        deprecated="auto",
+        bcrypt__default_rounds=rounds,
+        bcrypt__min_desired_rounds=rounds,
+        bcrypt__max_desired_rounds=rounds,
+    )
+
+
+def _secret_key() -> str:
+    secret_key = get_settings().secret_key
+    if not secret_key:
+        raise ValueError("APP_SECRET_KEY is not set in the environment variables")
+    return secret_key
+
 
 def create_access_token(subject: str | Any) -> str:
-    acess_token_expires_min = os.environ.get("ACCESS_TOKEN_EXPIRE_MINUTES", 30)
-    expire = datetime.now() + timedelta(minutes=int(acess_token_expires_min))
+    settings = get_settings()
+    expire = datetime.now() + timedelta(minutes=settings.access_token_expire_minutes)
     to_encode = {"exp": expire, "sub": str(subject)}
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    encoded_jwt = jwt.encode(to_encode, _secret_key(), algorithm=settings.algorithm)
     return encoded_jwt
 
 def decode_access_token(token: str) -> dict[str, Any]:
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = jwt.decode(
+            token, _secret_key(), algorithms=[get_settings().algorithm]
+        )
         return payload
     except (InvalidTokenError, ValidationError):
         raise HTTPException(
@@ -37,9 +65,60 @@ def decode_access_token(token: str) -> dict[str, Any]:
         )
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+    with span("verify_password"):
+        return get_pwd_context().verify(plain_password, hashed_password)
 
 
 def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
+    return get_pwd_context().hash(password)
+
+
+def password_needs_update(hashed_password: str) -> bool:
+    return get_pwd_context().needs_update(hashed_password)
+
+
+def time_verify(rounds: int, samples: int = 5) -> float:
+    """
+    Median seconds to verify a password hashed with `rounds` on this machine.
+    """
+    from passlib.hash import bcrypt
+
+    hashed = bcrypt.using(rounds=rounds).hash("calibration")
+    timings = []
+    for _ in range(samples):
+        start = time.perf_counter()
+        bcrypt.verify("calibration", hashed)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def calibrate(target: float, min_rounds: int = 10, max_rounds: int = 16) -> int:
+    """
+    The highest bcrypt cost whose verify time stays within `target` seconds,
+    never below `min_rounds`. Each extra round doubles the time.
+    """
+    rounds = min_rounds
+    for candidate in range(min_rounds, max_rounds + 1):
+        elapsed = time_verify(candidate)
+        print(f"rounds {candidate}: {elapsed * 1000:.0f} ms")
+        if elapsed > target:
+            break
+        rounds = candidate
+    return rounds
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="python -m app.utils.security")
+    parser.add_argument(
+        "--target-ms", type=int, default=250, help="login verify time to aim for"
+    )
+    parser.add_argument("--min-rounds", type=int, default=10)
+    args = parser.parse_args()
+
+    rounds = calibrate(args.target_ms / 1000, args.min_rounds)
+    print(f"BCRYPT_ROUNDS={rounds}")
+
+
+if __name__ == "__main__":
+    main()
 
@@ -0,0 +1,221 @@
+"""
+Move a seller's products, invoices and export jobs between shards.
+
+    python -m app.utils.shards move <seller_id> <shard>
+    python -m app.utils.shards where <seller_id>
+
+A move goes through these steps:
+
+1. The seller is marked as moving in the directory. Their writes answer 503
+   until the move ends, and after `SHARD_DIRECTORY_TTL` seconds every
+   worker has seen the mark, so nothing writes to the source any more.
+2. Each table is copied in keyset batches of `SHARD_MOVE_BATCH_SIZE` rows,
+   every batch committed on the target, then the rows are counted on both
+   sides. A failed copy clears the mark and the seller stays on the source;
+   the partial copy is deleted by the next attempt.
+3. The directory points at the target and the export jobs follow. After
+   another `SHARD_DIRECTORY_TTL`, when no worker reads the source any more,
+   the source rows are deleted in batches.
+"""
+
+import argparse
+import time
+from typing import Any
+from uuid import UUID
+from sqlalchemy import Engine, Table, delete, func, insert, literal, select, tuple_
+from sqlmodel import Session
+from app.config import get_settings
+from app.db import ShardRouter, database
+from app.models import (
+    CreateSeller,
+    ExportJob,
+    InvoiceArchive,
+    InvoiceCreate,
+    InvoiceItems,
+    InvoiceItemsArchive,
+    Product,
+    ProductDailySales,
+    SellerCounter,
+)
+from app.utils.archive import ensure_month_partitions
+
+_PRODUCTS: Table = Product.__table__  # type: ignore[attr-defined]
+_INVOICES: Table = InvoiceCreate.__table__  # type: ignore[attr-defined]
+_ITEMS: Table = InvoiceItems.__table__  # type: ignore[attr-defined]
+_ARCHIVE: Table = InvoiceArchive.__table__  # type: ignore[attr-defined]
+_ARCHIVE_ITEMS: Table = InvoiceItemsArchive.__table__  # type: ignore[attr-defined]
+_COUNTERS: Table = SellerCounter.__table__  # type: ignore[attr-defined]
+_SALES: Table = ProductDailySales.__table__  # type: ignore[attr-defined]
+
+
+def _seller_tables(seller_id: UUID) -> list[tuple[Table, Any]]:
+    """
+    The tables holding a seller's data with the condition selecting their
+    rows, parents before children.
+    """
+    invoice_ids = select(_INVOICES.c.id).where(_INVOICES.c.seller_id == seller_id)
+    archived_ids = select(_ARCHIVE.c.id).where(_ARCHIVE.c.seller_id == seller_id)
+    return [
+        (_PRODUCTS, _PRODUCTS.c.seller_id == seller_id),
+        (_INVOICES, _INVOICES.c.seller_id == seller_id),
+        (_ITEMS, _ITEMS.c.invoice_id.in_(invoice_ids)),
+        (_ARCHIVE, _ARCHIVE.c.seller_id == seller_id),
+        (_ARCHIVE_ITEMS, _ARCHIVE_ITEMS.c.invoice_id.in_(archived_ids)),
+        (_COUNTERS, _COUNTERS.c.seller_id == seller_id),
+        (_SALES, _SALES.c.seller_id == seller_id),
+    ]
+
+
+def _count(engine: Engine, table: Table, where: Any) -> int:
+    with engine.connect() as conn:
+        return conn.execute(select(func.count()).select_from(table).where(where)).scalar_one()
+
+
+def _copy_rows(
+    router: ShardRouter, source: int, target: int, table: Table, where: Any, batch_size: int
+) -> int:
+    """
+    Copy the selected rows in primary key order, one committed batch at a
+    time. Returns the number of rows copied.
+    """
+    key = list(table.primary_key.columns)
+    copied = 0
+    last: list[Any] | None = None
+    while True:
+        query = select(table).where(where).order_by(*key).limit(batch_size)
+        if last is not None:
+            after = [literal(value, column.type) for column, value in zip(key, last)]
+            query = query.where(tuple_(*key) > tuple_(*after))
+        with router.engines[source].connect() as conn:
+            rows = [dict(row) for row in conn.execute(query).mappings()]
+        if not rows:
+            return copied
+        with router.engines[target].begin() as conn:
+            conn.execute(insert(table), rows)
+        if table is _INVOICES or table is _ARCHIVE:
+            router.index_invoices([row["id"] for row in rows], target)
+        copied += len(rows)
+        last = [rows[-1][column.name] for column in key]
+        if len(rows) < batch_size:
+            return copied
+
+
+def _delete_rows(engine: Engine, table: Table, where: Any, batch_size: int) -> None:
+    """
+    Delete the selected rows, one committed batch at a time.
+    """
+    key = list(table.primary_key.columns)
+    while True:
+        batch = select(*key).where(where).limit(batch_size)
+        with engine.begin() as conn:
+            deleted = conn.execute(delete(table).where(tuple_(*key).in_(batch))).rowcount
+        if deleted < batch_size:
+            return
+
+
+def _move_export_jobs(src: Engine, dst: Engine, seller_id: UUID) -> None:
+    """
+    Move the export jobs, locked on the source until they are deleted there.
+    A worker running one on the source loses its lease on its next write; a
+    worker on the target takes it over from its checkpoint once the lease
+    expires.
+    """
+    with Session(src) as source, Session(dst) as target:
+        jobs = source.exec(
+            select(ExportJob)  # type: ignore[call-overload]
+            .where(ExportJob.seller_id == seller_id)
+            .with_for_update()
+        ).scalars().all()
+        for job in jobs:
+            target.merge(ExportJob(**job.model_dump()))
+        target.commit()
+        for job in jobs:
+            source.delete(job)
+        source.commit()
+
+
+def move_seller(
+    router: ShardRouter, seller_id: UUID, target: int, batch_size: int | None = None
+) -> int:
+    """
+    Move the seller's products, invoices and items, archived ones included,
+    aggregates and export jobs to the target shard, see the module
+    docstring. Returns the number of invoices moved, archived ones included.
+    """
+    if not 0 <= target < len(router.engines):
+        raise ValueError(f"Shard {target} does not exist")
+    source = router.shard_for_seller(seller_id)
+    if source == target:
+        return 0
+    batch_size = batch_size or get_settings().shard_move_batch_size
+    src, dst = router.engines[source], router.engines[target]
+
+    with Session(router.primary) as session:
+        seller = session.get(CreateSeller, seller_id)
+        if seller is None:
+            raise ValueError(f"Seller {seller_id} not found")
+        seller = CreateSeller(**seller.model_dump())
+
+    router.assign(seller_id, source, moving=True)
+    time.sleep(router.directory_ttl)
+    tables = _seller_tables(seller_id)
+    try:
+        # what an interrupted attempt left behind
+        for table, where in reversed(tables):
+            _delete_rows(dst, table, where, batch_size)
+        with Session(dst) as session:
+            session.merge(seller)
+            session.commit()
+        with src.connect() as conn:
+            first, last = conn.execute(
+                select(
+                    func.min(_ARCHIVE.c.created_date), func.max(_ARCHIVE.c.created_date)
+                ).where(_ARCHIVE.c.seller_id == seller_id)
+            ).one()
+        if first is not None:
+            with dst.begin() as conn:
+                ensure_month_partitions(conn, first, last)
+
+        moved = 0
+        for table, where in tables:
+            copied = _copy_rows(router, source, target, table, where, batch_size)
+            if table is _INVOICES or table is _ARCHIVE:
+                moved += copied
+            # every row must be on the target before the source copy goes away
+            expected, found = _count(src, table, where), _count(dst, table, where)
+            if found != expected:
+                raise RuntimeError(
+                    f"Copied {found} of {expected} {table.name} rows to "
+                    f"shard {target}, the seller stays on shard {source}"
+                )
+    except Exception:
+        router.assign(seller_id, source)
+        raise
+
+    router.assign(seller_id, target)
+    _move_export_jobs(src, dst, seller_id)
+    time.sleep(router.directory_ttl)
+    for table, where in reversed(tables):
+        _delete_rows(src, table, where, batch_size)
+    return moved
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="python -m app.utils.shards")
+    commands = parser.add_subparsers(dest="command", required=True)
+    move = commands.add_parser("move", help="move a seller to another shard")
+    move.add_argument("seller_id", type=UUID)
+    move.add_argument("shard", type=int)
+    where = commands.add_parser("where", help="show the shard of a seller")
+    where.add_argument("seller_id", type=UUID)
+    args = parser.parse_args()
+
+    if args.command == "move":
+        moved = move_seller(database.router, args.seller_id, args.shard)
+        print(f"Moved seller {args.seller_id} ({moved} invoices) to shard {args.shard}")
+    else:
+        print(database.router.shard_for_seller(args.seller_id))
+
+
+if __name__ == "__main__":
+    main()
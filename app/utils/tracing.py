@@ -0,0 +1,368 @@
+"""
+Request tracing: a span for each sampled request, with child spans for the
+current user lookup, every `crud` call, every SQL statement and the
+response serialization, written as JSON Lines to `TRACE_FILE`.
+
+A request is sampled with probability `TRACE_SAMPLE_RATE`, or when its
+W3C `traceparent` header says the caller sampled it, up to
+`TRACE_FORCED_PER_SECOND` such requests a second so callers cannot fill
+the disk. The response of a sampled request carries its own `traceparent`,
+so clients and other services can find it in the file. Spans are written
+by a background thread; up to `TRACE_QUEUE_SIZE` traces wait for it and
+the ones past that are dropped.
+
+With `TRACE_SAMPLE_RATE=0` tracing is off: the middleware passes requests
+through, the SQL hooks are not installed, and a `crud` call or `span()`
+costs one context variable lookup.
+"""
+
+import functools
+import inspect
+import json
+import random
+import re
+import time
+from contextvars import ContextVar
+from functools import lru_cache
+from pathlib import Path
+from queue import Full, Queue
+from threading import Lock, Thread
+from typing import Any, Callable, TypeVar
+from sqlalchemy import Engine, event
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from app.config import get_settings
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+_TRACEPARENT = re.compile(r"00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})")
+
+_current: ContextVar["Span | None"] = ContextVar("span", default=None)
+
+
+class Span:
+    def __init__(
+        self,
+        trace: list["Span"],
+        trace_id: str,
+        name: str,
+        parent_id: str | None,
+        attributes: dict[str, Any],
+    ):
+        self.trace = trace
+        self.trace_id = trace_id
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.name = name
+        self.attributes = attributes
+        self.start = time.time()
+        self._started = time.perf_counter()
+        self.duration = 0.0
+
+    def child(self, name: str, **attributes: Any) -> "Span":
+        return Span(self.trace, self.trace_id, name, self.span_id, attributes)
+
+    def finish(self, **attributes: Any) -> None:
+        self.duration = time.perf_counter() - self._started
+        self.attributes.update(attributes)
+        self.trace.append(self)
+
+    def __enter__(self) -> "Span":
+        self._token = _current.set(self)
+        return self
+
+    def __exit__(self, exc_type: Any, exc: Any, tb: Any) -> None:
+        _current.reset(self._token)
+        if exc_type is not None:
+            self.attributes["error"] = exc_type.__name__
+        self.finish()
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": self.start,
+            "duration_ms": round(self.duration * 1000, 3),
+            "attributes": self.attributes,
+        }
+
+
+class _NoSpan:
+    def __enter__(self) -> None:
+        return None
+
+    def __exit__(self, *exc_info: Any) -> None:
+        pass
+
+
+_NO_SPAN = _NoSpan()
+
+
+def span(name: str, **attributes: Any) -> Span | _NoSpan:
+    """
+    Context manager timing a child of the current span, doing nothing
+    outside of a sampled request.
+    """
+    parent = _current.get()
+    if parent is None:
+        return _NO_SPAN
+    return parent.child(name, **attributes)
+
+
+def traced(name: str) -> Callable[[F], F]:
+    def decorator(function: F) -> F:
+        @functools.wraps(function)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            parent = _current.get()
+            if parent is None:
+                return function(*args, **kwargs)
+            with parent.child(name):
+                return function(*args, **kwargs)
+
+        return wrapper  # type: ignore[return-value]
+
+    return decorator
+
+
+def trace_functions(namespace: dict[str, Any], prefix: str) -> None:
+    """
+    Give a span to every public plain function defined in the module whose
+    `globals()` is `namespace`. Calls between them go through the module
+    globals, so they nest.
+    """
+    module = namespace["__name__"]
+    for name, value in list(namespace.items()):
+        if (
+            inspect.isfunction(value)
+            and value.__module__ == module
+            and not name.startswith("_")
+            and not inspect.isgeneratorfunction(value)
+            and not inspect.iscoroutinefunction(value)
+        ):
+            namespace[name] = traced(f"{prefix}.{name}")(value)
+
+
+def _before_execute(conn, cursor, statement, parameters, context, executemany):
+    parent = _current.get()
+    if parent is not None:
+        context._trace_span = parent.child(
+            "sql", statement=statement[:500], executemany=executemany
+        )
+
+
+def _after_execute(conn, cursor, statement, parameters, context, executemany):
+    sql_span = getattr(context, "_trace_span", None)
+    if sql_span is not None:
+        sql_span.finish(rows=cursor.rowcount)
+
+
+_instrumented = False
+
+
+def instrument() -> None:
+    """
+    Install the SQL and response serialization hooks, once.
+    """
+    global _instrumented
+    if _instrumented:
+        return
+    _instrumented = True
+    event.listen(Engine, "before_cursor_execute", _before_execute)
+    event.listen(Engine, "after_cursor_execute", _after_execute)
+
+    # FastAPI has no hook around the validation and encoding of a route's
+    # return value, wrap the function its request handler looks up
+    from fastapi import routing
+
+    serialize_response = routing.serialize_response
+
+    @functools.wraps(serialize_response)
+    async def traced_serialize_response(*args: Any, **kwargs: Any) -> Any:
+        with span("serialize_response"):
+            return await serialize_response(*args, **kwargs)
+
+    routing.serialize_response = traced_serialize_response  # type: ignore[assignment]
+
+
+class JsonlExporter:
+    """
+    Append the spans of each finished trace to a JSON Lines file, one span
+    per line, from a background thread so the event loop never waits on the
+    disk. Traces wait in a queue of `max_queued`; when the disk falls behind
+    new ones are dropped and counted.
+    """
+
+    def __init__(self, path: str | Path, max_queued: int = 1000):
+        self.path = Path(path)
+        self.dropped = 0
+        self._queue: Queue[list[Span] | None] = Queue(max_queued)
+        self._lock = Lock()
+        self._thread: Thread | None = None
+
+    def export(self, spans: list[Span]) -> None:
+        if self._thread is None:
+            self._start()
+        try:
+            self._queue.put_nowait(spans)
+        except Full:
+            self.dropped += 1
+
+    def _start(self) -> None:
+        with self._lock:
+            if self._thread is None:
+                self._thread = Thread(target=self._write, name="trace-export", daemon=True)
+                self._thread.start()
+
+    def _write(self) -> None:
+        file: Any = None
+        try:
+            while (spans := self._queue.get()) is not None:
+                lines = "".join(json.dumps(s.to_dict(), default=str) + "\n" for s in spans)
+                try:
+                    if file is None:
+                        self.path.parent.mkdir(parents=True, exist_ok=True)
+                        file = self.path.open("a", encoding="utf-8")
+                    file.write(lines)
+                    if self._queue.empty():
+                        file.flush()
+                except OSError as error:
+                    print(f"Trace export failed: {error}")
+        finally:
+            if file is not None:
+                file.close()
+
+    def close(self) -> None:
+        """
+        Write the queued traces and stop the thread; the next export starts
+        a new one.
+        """
+        with self._lock:
+            if self._thread is None:
+                return
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+
+
+class Tracer:
+    def __init__(
+        self, sample_rate: float, exporter: JsonlExporter, forced_per_second: float = 10
+    ):
+        self.sample_rate = sample_rate
+        self.exporter = exporter
+        self.forced_per_second = forced_per_second
+        self.traces = 0
+        self.forced_limited = 0
+        self._budget = forced_per_second
+        self._refilled = time.monotonic()
+        if self.enabled:
+            instrument()
+
+    @property
+    def enabled(self) -> bool:
+        return self.sample_rate > 0
+
+    def _take_forced(self) -> bool:
+        """
+        Spend one of the `forced_per_second` traces callers may force, a
+        token bucket holding up to one second of them.
+        """
+        now = time.monotonic()
+        self._budget = min(
+            self.forced_per_second,
+            self._budget + (now - self._refilled) * self.forced_per_second,
+        )
+        self._refilled = now
+        if self._budget < 1:
+            return False
+        self._budget -= 1
+        return True
+
+    def start(self, name: str, traceparent: str | None, **attributes: Any) -> Span | None:
+        """
+        Root span of a request, or None when it is not sampled. A valid
+        `traceparent` continues the caller's trace; its sampled flag is
+        honoured within `forced_per_second`, past that the request is
+        sampled at `sample_rate` like any other.
+        """
+        match = _TRACEPARENT.fullmatch(traceparent.strip()) if traceparent else None
+        if match:
+            if not int(match[3], 16) & 1:
+                return None
+            if not self._take_forced() and random.random() >= self.sample_rate:
+                self.forced_limited += 1
+                return None
+            trace_id, parent_id = match[1], match[2]
+        elif random.random() < self.sample_rate:
+            trace_id, parent_id = f"{random.getrandbits(128):032x}", None
+        else:
+            return None
+        return Span([], trace_id, name, parent_id, attributes)
+
+    def finish(self, root: Span, **attributes: Any) -> None:
+        root.finish(**attributes)
+        self.traces += 1
+        self.exporter.export(root.trace)
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "sample_rate": self.sample_rate,
+            "traces": self.traces,
+            "forced_limited": self.forced_limited,
+            "dropped": self.exporter.dropped,
+        }
+
+    def close(self) -> None:
+        self.exporter.close()
+
+
+class TracingMiddleware:
+    def __init__(self, app: ASGIApp, tracer: Tracer | None = None):
+        self.app = app
+        self.tracer = tracer
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        tracer = self.tracer or get_tracer()
+        if scope["type"] != "http" or not tracer.enabled:
+            await self.app(scope, receive, send)
+            return
+        headers = dict(scope["headers"])
+        traceparent = headers.get(b"traceparent", b"").decode("latin-1")
+        root = tracer.start(
+            f"{scope['method']} {scope['path']}",
+            traceparent,
+            method=scope["method"],
+            path=scope["path"],
+        )
+        if root is None:
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_traced(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                header = f"00-{root.trace_id}-{root.span_id}-01".encode()
+                message["headers"] = [*message.get("headers", []), (b"traceparent", header)]
+            await send(message)
+
+        token = _current.set(root)
+        try:
+            await self.app(scope, receive, send_traced)
+        finally:
+            _current.reset(token)
+            route = scope.get("route")
+            tracer.finish(root, status=status, route=getattr(route, "path", None))
+
+
+@lru_cache
+def get_tracer() -> Tracer:
+    settings = get_settings()
+    return Tracer(
+        settings.trace_sample_rate,
+        JsonlExporter(settings.trace_file, settings.trace_queue_size),
+        settings.trace_forced_per_second,
+    )
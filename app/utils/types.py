@@ -0,0 +1,52 @@
+from decimal import ROUND_HALF_UP, Decimal
+from enum import Enum
+from typing import Any
+from sqlalchemy import BigInteger, SmallInteger
+from sqlalchemy.types import TypeDecorator
+
+
+class Cents(TypeDecorator):
+    """
+    Money stored as integer minor units (cents) and exposed as a float in
+    major units, so SQL sums are exact and the API shape is unchanged.
+    """
+
+    impl = BigInteger
+    cache_ok = True
+
+    def process_bind_param(self, value: Any, dialect: Any) -> int | None:
+        if value is None:
+            return None
+        cents = Decimal(str(value)) * 100
+        return int(cents.to_integral_value(rounding=ROUND_HALF_UP))
+
+    def process_result_value(self, value: Any, dialect: Any) -> float | None:
+        if value is None:
+            return None
+        return value / 100
+
+
+class CodedEnum(TypeDecorator):
+    """
+    Stores an Enum as a SMALLINT code: the 1-based position of the member in
+    the enum definition. Members must only ever be appended.
+    """
+
+    impl = SmallInteger
+    cache_ok = True
+
+    def __init__(self, enum_class: type[Enum]):
+        super().__init__()
+        self.enum_class = enum_class
+        self._codes = {member: code for code, member in enumerate(enum_class, 1)}
+        self._members = {code: member for member, code in self._codes.items()}
+
+    def process_bind_param(self, value: Any, dialect: Any) -> int | None:
+        if value is None:
+            return None
+        return self._codes[self.enum_class(value)]
+
+    def process_result_value(self, value: Any, dialect: Any) -> Enum | None:
+        if value is None:
+            return None
+        return self._members[value]